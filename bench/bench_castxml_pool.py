@@ -0,0 +1,71 @@
+""" Wall time of parsing many headers with castxml, one compiler process
+at a time versus a pool of them.
+
+usage: python bench/bench_castxml_pool.py [headers] [workers]
+
+Each generated header has 50 structs with a typedef and two functions.
+The speedup is bounded by the number of cpus: the castxml processes
+do the bulk of the work, the xml is parsed in this process while they
+run. `workers` defaults to the number of cpus.
+
+"""
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.frontends import castxml
+
+
+RECORDS = 50
+
+
+def generate_headers(directory, count):
+    paths = []
+    for h in xrange(count):
+        lines = []
+        for i in xrange(RECORDS):
+            name = 'h%d_rec%d' % (h, i)
+            lines.append('struct %s { int a; double b; char *c; };\n' % name)
+            lines.append('typedef struct %s %s_t;\n' % (name, name))
+            lines.append('int %s_init(%s_t *r, int flags);\n' % (name, name))
+            lines.append('void %s_free(%s_t *r);\n' % (name, name))
+        path = os.path.join(directory, 'header%d.h' % h)
+        with open(path, 'w') as fh:
+            fh.writelines(lines)
+        paths.append(path)
+    return paths
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(count, workers):
+    directory = tempfile.mkdtemp()
+    try:
+        paths = generate_headers(directory, count)
+        for size in (1, workers):
+            jobs = [castxml.castxml_job(path, []) for path in paths]
+            cpu = children_cpu()
+            t = time.time()
+            castxml.parse_headers(jobs, size)
+            elapsed = time.time() - t
+            cpu = children_cpu() - cpu
+            print '%d headers, %d workers: %.2f s wall, %.2f s castxml cpu' \
+                  % (count, size, elapsed, cpu)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else \
+        multiprocessing.cpu_count()
+    run(count, workers)
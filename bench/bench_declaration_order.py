@@ -0,0 +1,55 @@
+""" Time of ordering declarations after the declarations they use, for
+growing numbers of declarations.
+
+usage: python bench/bench_declaration_order.py [declarations]
+
+Half of the declarations are structs and half typedefs of them. Each
+struct holds the next struct by value and a pointer to the typedef of
+the previous one, so every struct is part of one big pointer cycle,
+and the items start out in the reverse of a valid order. The time
+should grow linearly with the number of declarations.
+
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.frontends.gccxml import c_ast, ast_transforms
+
+
+def generate_items(count):
+    int_t = c_ast.FundamentalType('int', 32, 32)
+    structs = [c_ast.Struct('s%d' % i, 32, [], None, [], 64)
+               for i in xrange(count // 2)]
+    typedefs = [c_ast.Typedef('s%d_t' % i, struct, None)
+                for i, struct in enumerate(structs)]
+    for i, struct in enumerate(structs):
+        if i + 1 < len(structs):
+            struct.members.append(
+                c_ast.Field('next', structs[i + 1], struct, None, 0))
+        pointer = c_ast.PointerType(typedefs[i - 1], 64, 64)
+        struct.members.append(c_ast.Field('prev', pointer, struct, None, 0))
+        struct.members.append(c_ast.Field('value', int_t, struct, None, 0))
+    items = []
+    for struct, typedef in zip(structs, typedefs):
+        items.append(typedef)
+        items.append(struct)
+    return items
+
+
+def run(count):
+    for size in (count // 4, count // 2, count):
+        items = generate_items(size)
+        t = time.time()
+        ordered = ast_transforms.order_declarations(items)
+        elapsed = time.time() - t
+        forward = sum(1 for item in ordered
+                      if isinstance(item, c_ast.ForwardDeclaration))
+        print '%6d declarations: %.2f s, %d forward declarations' % (
+            size, elapsed, forward)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,75 @@
+""" Time of flattening a wide struct with many nested unions, with the
+c_ast of the gccxml and the clang frontend.
+
+usage: python bench/bench_flatten.py [members] [nested]
+
+The struct has `members` fields; `nested` of them have the type of an
+anonymous union defined inside the struct, as in generated register
+maps.
+
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.frontends.gccxml import c_ast as gccxml_c_ast
+from cwrap.frontends.gccxml import ast_transforms as gccxml_transforms
+from cwrap.frontends.clang import c_ast as clang_c_ast
+from cwrap.frontends.clang import ast_transforms as clang_transforms
+
+
+def gccxml_struct(count, nested):
+    c_ast = gccxml_c_ast
+    int_t = c_ast.FundamentalType('int', 32, 32)
+    struct = c_ast.Struct('wide', 32, [], None, [], count * 32)
+    step = max(count // max(nested, 1), 1)
+    for i in xrange(count):
+        typ = int_t
+        if nested and i % step == 0 and i // step < nested:
+            typ = c_ast.Union('u%d' % i, 32, [], struct, [], 32)
+            typ.members.append(c_ast.Field('a', int_t, typ, None, 0))
+            struct.members.append(typ)
+        struct.members.append(c_ast.Field('f%d' % i, typ, struct, None,
+                                          i * 32))
+    return struct
+
+
+def clang_struct(count, nested):
+    c_ast = clang_c_ast
+    int_t = c_ast.FundamentalType('int')
+    struct = c_ast.Struct('wide', [])
+    step = max(count // max(nested, 1), 1)
+    for i in xrange(count):
+        typ = int_t
+        if nested and i % step == 0 and i // step < nested:
+            typ = c_ast.Union('u%d' % i, members=[], context=struct)
+            typ.members.append(c_ast.Field('a', int_t, typ))
+            struct.members.append(typ)
+        struct.members.append(c_ast.Field('f%d' % i, typ, struct))
+    return struct
+
+
+def run(count, nested):
+    for name, make, transforms in (
+            ('gccxml', gccxml_struct, gccxml_transforms),
+            ('clang', clang_struct, clang_transforms)):
+        struct = make(count, nested)
+        stdout = sys.stdout
+        # the clang frontend prints each removed member
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            t = time.time()
+            items = transforms.flatten_nested_containers([struct])
+            elapsed = time.time() - t
+        finally:
+            sys.stdout = stdout
+        print '%-7s %d members, %d nested: %d items, %.3f s' % (
+            name, count, nested, len(items), elapsed)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    nested = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    run(count, nested)
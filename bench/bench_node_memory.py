@@ -0,0 +1,90 @@
+""" Memory held by the c_ast nodes of a large generated SDK header.
+
+usage: python bench/bench_node_memory.py [records]
+
+The header has `records` structs of 8 fields, each with a typedef and
+two functions taking a pointer to it, spread over several included
+headers. The bytes are those of the node objects themselves (and of
+their __dict__ where there is one); the values they refer to are not
+counted.
+
+"""
+import gc
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.frontends.clang import clang_parser, c_ast
+
+
+FILES = 16
+
+
+def generate_sdk(directory, count):
+    per_file = count // FILES
+    main = []
+    for f in xrange(FILES):
+        lines = []
+        for i in xrange(f * per_file, (f + 1) * per_file):
+            lines.append('struct rec%d {\n' % i)
+            for j in xrange(8):
+                lines.append('    %s f%d;\n' % (('int', 'double', 'char *',
+                                                 'unsigned long')[j % 4], j))
+            lines.append('};\n')
+            lines.append('typedef struct rec%d rec%d_t;\n' % (i, i))
+            lines.append('int rec%d_init(rec%d_t *r, int flags);\n' % (i, i))
+            lines.append('void rec%d_free(rec%d_t *r);\n' % (i, i))
+        name = 'part%d.h' % f
+        with open(os.path.join(directory, name), 'w') as fh:
+            fh.writelines(lines)
+        main.append('#include "%s"\n' % name)
+    path = os.path.join(directory, 'sdk.h')
+    with open(path, 'w') as fh:
+        fh.writelines(main)
+    return path
+
+
+def node_bytes():
+    count = 0
+    size = 0
+    for obj in gc.get_objects():
+        if isinstance(obj, c_ast.C_ASTNode):
+            count += 1
+            size += sys.getsizeof(obj)
+            d = getattr(obj, '__dict__', None)
+            if d is not None:
+                size += sys.getsizeof(d)
+    return count, size
+
+
+def run(count):
+    directory = tempfile.mkdtemp()
+    try:
+        path = generate_sdk(directory, count)
+        parser = clang_parser.ClangParser()
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            t = time.time()
+            parser.parse(path, [directory], '')
+            elapsed = time.time() - t
+        finally:
+            sys.stdout = stdout
+    finally:
+        shutil.rmtree(directory)
+
+    nodes, size = node_bytes()
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print '%d records: %d nodes, %.1f MB in nodes (%.0f bytes/node), ' \
+          '%.1f MB maxrss, %.2f s' % (count, nodes, size / 1048576.,
+                                      float(size) / nodes, maxrss / 1024.,
+                                      elapsed)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
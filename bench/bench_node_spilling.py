@@ -0,0 +1,56 @@
+""" Memory of parsing the xml of a header that includes a large SDK,
+with all nodes in memory versus a SpillingNodeStore.
+
+usage: python bench/bench_node_spilling.py [records] [cache size]
+
+Needs castxml. Uses the SDK and header of bench_xml_pruning.py; both
+runs prune the included files. Each measurement runs in a fresh
+process, so that maxrss is the peak of that parse alone.
+
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.frontends.gccxml import gccxml_parser, node_store
+
+from bench_xml_pruning import generate_xml
+
+
+def measure(xml, cache_size):
+    store = None
+    if cache_size:
+        store = node_store.SpillingNodeStore(cache_size)
+    t = time.time()
+    items = gccxml_parser.parse(xml, ['bench.h'], store)
+    elapsed = time.time() - t
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print '%-16s %5d items, %6.1f MB maxrss, %.2f s' % (
+        'spilled (%d)' % cache_size if cache_size else 'in memory',
+        len(items), maxrss / 1024., elapsed)
+
+
+def run(count, cache_size):
+    directory = tempfile.mkdtemp()
+    try:
+        xml = generate_xml(directory, count)
+        print 'xml: %.1f MB' % (os.path.getsize(xml) / 1048576.)
+        for size in (0, cache_size):
+            subprocess.check_call([sys.executable, __file__, xml, str(size)])
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+        measure(sys.argv[1], int(sys.argv[2]))
+    else:
+        count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+        cache_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+        run(count, cache_size)
@@ -0,0 +1,80 @@
+""" Time of transforming and rendering a header with many declarations,
+without the render cache and with a cold and a warm one, and after one
+function changed.
+
+usage: python bench/bench_render_cache.py [declarations]
+
+A third of the declarations are structs, a third typedefs of them and
+a third functions that take a pointer to the typedef. The c_ast items
+are built directly, so only the transformation and the rendering are
+timed. With a warm cache only the changed function is transformed and
+rendered, the time that is left is mostly hashing the declarations.
+
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.backend import render_cache
+from cwrap.backend.renderer import ASTRenderer
+from cwrap.frontends.gccxml import c_ast, ast_transforms
+
+
+HEADER = 'big.h'
+
+
+def generate_items(count, changed=False):
+    int_t = c_ast.FundamentalType('int', 32, 32)
+    double_t = c_ast.FundamentalType('double', 64, 64)
+    items = []
+    for i in xrange(count // 3):
+        struct = c_ast.Struct('s%d' % i, 32, [], None, [], 128)
+        struct.members.append(c_ast.Field('a', int_t, struct, None, 0))
+        struct.members.append(c_ast.Field('b', double_t, struct, None, 64))
+        typedef = c_ast.Typedef('s%d_t' % i, struct, None)
+        func = c_ast.Function('f%d' % i, int_t, None, None, True)
+        func.add_argument(c_ast.Argument(c_ast.PointerType(typedef, 64, 64),
+                                         's'))
+        if changed and i == 0:
+            func.add_argument(c_ast.Argument(int_t, 'flags'))
+        for line, item in enumerate((struct, typedef, func)):
+            item.location = (HEADER, 3 * i + line + 1)
+            items.append(item)
+    return items
+
+
+def render(items, cache=None):
+    container = ast_transforms.CAstContainer(items, HEADER, '_big', 'big')
+    transformer = ast_transforms.CAstTransformer([container], cache)
+    return [ASTRenderer().render(ast.module)
+            for ast in transformer.transform()]
+
+
+def run(count):
+    directory = tempfile.mkdtemp()
+    try:
+        t = time.time()
+        full = render(generate_items(count))
+        print '%d declarations, no cache: %.2f s' % (count, time.time() - t)
+
+        for label, changed in (('cold cache', False), ('warm cache', False),
+                               ('one changed', True)):
+            items = generate_items(count, changed)
+            cache = render_cache.RenderCache(directory)
+            t = time.time()
+            code = render(items, cache)
+            elapsed = time.time() - t
+            if not changed:
+                assert code == full
+            print '%d declarations, %s: %.2f s (%s)' % (
+                count, label, elapsed, cache.stats)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 30000)
@@ -0,0 +1,83 @@
+""" Memory of the c_ast of a large C API with and without interning of
+fundamental and cv-qualified types.
+
+usage: python bench/bench_type_interning.py [functions]
+
+Each mode runs in a fresh interpreter so that ru_maxrss is not shared
+between them. In the `plain` mode `intern` is replaced by a call to
+the class, which is what the parser did before the types were
+interned.
+
+"""
+import gc
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.frontends.clang import clang_parser, c_ast
+from cwrap.frontends.clang import ast_transforms as transforms
+
+
+TYPES = ['int', 'unsigned int', 'char', 'const char', 'double', 'float',
+         'long', 'unsigned long', 'short', 'const int']
+
+
+def generate_header(count):
+    lines = []
+    for i in xrange(count):
+        ret = TYPES[i % len(TYPES)]
+        args = ', '.join('%s a%d' % (TYPES[(i + j) % len(TYPES)], j)
+                         for j in range(4))
+        lines.append('%s f%d(%s);\n' % (ret, i, args))
+    return ''.join(lines)
+
+
+def count_type_nodes():
+    types = (c_ast.FundamentalType, c_ast.CvQualifiedType)
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, types))
+
+
+def run(mode, count):
+    if mode == 'plain':
+        c_ast.Flyweight.intern = classmethod(lambda cls, *key: cls(*key))
+
+    source = generate_header(count)
+    parser = clang_parser.ClangParser()
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        t = time.time()
+        parser.parse('api.h', [], '', unsaved_files=[('api.h', source)])
+        items = parser.get_result()
+        parsed = time.time() - t
+
+        t = time.time()
+        items = transforms.apply_c_ast_transformations(items)
+        container = transforms.CAstContainer(items, 'api.h', '_api', 'api')
+        transformer = transforms.CAstTransformer([container])
+        for module in transformer.transform():
+            pass
+        translated = time.time() - t
+    finally:
+        sys.stdout = stdout
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print '%-6s %10d %10.1f MB %8.2f s %8.2f s' % (
+        mode, count_type_nodes(), maxrss / 1024., parsed, translated)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        run(sys.argv[1], int(sys.argv[2]))
+        sys.exit(0)
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print '%d functions' % count
+    print '%-6s %10s %13s %10s %10s' % ('mode', 'type nodes', 'maxrss',
+                                        'parse', 'transform')
+    for mode in ('plain', 'intern'):
+        subprocess.check_call([sys.executable, __file__, mode, str(count)])
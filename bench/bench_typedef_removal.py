@@ -0,0 +1,48 @@
+""" Scaling of the clang parser with the number of anonymous typedef'd
+structs in a header, as found in generated register maps. Every
+`typedef struct {...} name;` removes the anonymous struct from the
+members of the file, which must not make the parse quadratic.
+
+usage: python bench/bench_typedef_removal.py [max-typedefs]
+
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.frontends.clang import clang_parser
+
+
+def generate_header(count):
+    decl = 'typedef struct {\n    unsigned int ctrl;\n    unsigned int status;\n} reg%d_t;\n'
+    return ''.join(decl % i for i in xrange(count))
+
+
+def run(count):
+    source = generate_header(count)
+    parser = clang_parser.ClangParser()
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        t = time.time()
+        parser.parse('regs.h', [], '', unsaved_files=[('regs.h', source)])
+        elapsed = time.time() - t
+    finally:
+        sys.stdout = stdout
+    typedefs = [node for node in parser.get_result()
+                if isinstance(node, clang_parser.c_ast.Typedef)]
+    return elapsed, len(typedefs)
+
+
+if __name__ == '__main__':
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    counts = [c for c in (1000, 2000, 5000, 10000, 20000, 50000, 100000)
+              if c <= limit]
+    print '%8s %10s %14s %8s' % ('typedefs', 'seconds', 'us / typedef',
+                                 'parsed')
+    for count in counts:
+        elapsed, parsed = run(count)
+        print '%8d %10.2f %14.1f %8d' % (count, elapsed, 1e6 * elapsed / count,
+                                         parsed)
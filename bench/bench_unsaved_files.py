@@ -0,0 +1,92 @@
+""" Peak memory of passing a large header to libclang through
+`unsaved_files`, either read into a string or memory mapped.
+
+usage: python bench/bench_unsaved_files.py [size-in-MB]
+
+Each mode runs in a fresh interpreter so that ru_maxrss is not
+shared between them. Mapped pages of the header count towards the
+resident set but can be dropped by the kernel at any time, so the
+anonymous (heap) memory is reported as well where /proc is available.
+
+"""
+import mmap
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def generate_header(path, size):
+    """ Writes a header of about `size` bytes. Most of it is comments,
+    which keeps the libclang side of the measurement small.
+
+    """
+    comment = '/* ' + 'x' * 1000 + ' */\n'
+    decl = 'typedef struct s%d { int a; double b; } s%d_t;\n'
+    with open(path, 'w') as f:
+        written = 0
+        i = 0
+        while written < size:
+            chunk = comment * 64 + decl % (i, i)
+            f.write(chunk)
+            written += len(chunk)
+            i += 1
+
+
+def anonymous_memory():
+    """ Returns the resident anonymous memory in kB, or None.
+
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+
+def run(mode, path):
+    from cwrap.frontends.clang import clang
+
+    options = clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+    f = open(path, 'rb')
+    if mode == 'read':
+        contents = f.read()
+    elif mode == 'mmap':
+        contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        contents = f
+
+    t = time.time()
+    index = clang.cindex.Index.create()
+    tu = index.parse('input.h', unsaved_files=[('input.h', contents)],
+                     options=options)
+    elapsed = time.time() - t
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    anon = anonymous_memory()
+    anon = '%8.1f MB anon' % (anon / 1024.) if anon is not None else ''
+    print '%-5s %8.1f MB maxrss %s %6.2f s' % (mode, maxrss / 1024., anon,
+                                               elapsed)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        run(sys.argv[1], sys.argv[2])
+        sys.exit(0)
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    fd, path = tempfile.mkstemp(suffix='.h')
+    os.close(fd)
+    try:
+        generate_header(path, size * 1024 * 1024)
+        print 'header: %d MB' % (os.path.getsize(path) / 1024 / 1024)
+        for mode in ('read', 'mmap', 'file'):
+            subprocess.check_call([sys.executable, __file__, mode, path])
+    finally:
+        os.remove(path)
@@ -0,0 +1,51 @@
+""" Parsing many headers with castxml with a cold and a warm xml cache.
+
+usage: python bench/bench_xml_cache.py [headers]
+
+Uses the headers of bench_castxml_pool.py. The cold run runs castxml
+and stores its xml, the warm run parses the cached xml.
+
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.cache import Cache
+from cwrap.frontends import castxml
+from cwrap.frontends.gccxml import xml_cache
+
+from bench_castxml_pool import generate_headers
+
+
+def cache_bytes(directory):
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        for name in filenames:
+            size += os.path.getsize(os.path.join(dirpath, name))
+    return size
+
+
+def run(count):
+    directory = tempfile.mkdtemp()
+    try:
+        paths = generate_headers(directory, count)
+        cache_dir = os.path.join(directory, 'cache')
+        for label in ('cold', 'warm'):
+            cache = Cache(cache_dir, xml_cache.SUFFIX)
+            jobs = [castxml.castxml_job(path, []) for path in paths]
+            t = time.time()
+            castxml.parse_headers(jobs, None, cache)
+            elapsed = time.time() - t
+            print '%d headers, %s cache: %.2f s (%s), %.1f MB on disk' % (
+                count, label, elapsed, cache.stats,
+                cache_bytes(cache_dir) / 1048576.)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
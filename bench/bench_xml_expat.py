@@ -0,0 +1,71 @@
+""" Time of reading the xml of a large SDK with the expat handlers of
+GCCXMLParser versus cElementTree.iterparse, which GCCXMLParser.parse
+used before.
+
+usage: python bench/bench_xml_expat.py [records | xml file] [runs]
+
+Needs castxml unless an xml file is given. The SDK is the one of
+bench_xml_pruning.py, 20000 records give about 40 MB of xml, 500000
+about 1 GB. Only the reading is timed, not get_result.
+
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from xml.etree import cElementTree
+
+from cwrap.frontends.gccxml import gccxml_parser
+
+from bench_xml_pruning import generate_xml
+
+
+def parse_iterparse(parser, xml):
+    for event, node in cElementTree.iterparse(xml, events=('start', 'end')):
+        if event == 'start':
+            parser.start_element(node.tag, dict(node.items()))
+        else:
+            if node.text:
+                parser.visit_Characters(node.text)
+            parser.end_element(node.tag)
+            node.clear()
+
+
+def parse_expat(parser, xml):
+    parser.parse(xml)
+
+
+def best_time(parse, xml, runs):
+    best = None
+    for i in xrange(runs):
+        parser = gccxml_parser.GCCXMLParser()
+        t = time.time()
+        parse(parser, xml)
+        elapsed = time.time() - t
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run(xml, runs):
+    print 'xml: %.1f MB' % (os.path.getsize(xml) / 1048576.)
+    for name, parse in (('iterparse', parse_iterparse),
+                        ('expat', parse_expat)):
+        print '%-10s %.2f s' % (name, best_time(parse, xml, runs))
+
+
+if __name__ == '__main__':
+    arg = sys.argv[1] if len(sys.argv) > 1 else '20000'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    if not arg.isdigit():
+        run(arg, runs)
+    else:
+        directory = tempfile.mkdtemp()
+        try:
+            run(generate_xml(directory, int(arg)), runs)
+        finally:
+            shutil.rmtree(directory)
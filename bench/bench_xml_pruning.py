@@ -0,0 +1,76 @@
+""" Memory of parsing the xml of a header that includes a large SDK,
+with and without pruning the included files.
+
+usage: python bench/bench_xml_pruning.py [records]
+
+Needs castxml. The SDK has `records` structs of 8 fields, each with a
+typedef and two functions, spread over several included headers. The
+header itself declares a few functions and structs that refer to a
+handful of the SDK types. Each measurement runs in a fresh process, so
+that maxrss is the peak of that parse alone.
+
+"""
+import gc
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cwrap.frontends.gccxml import c_ast, gccxml_parser
+
+from bench_node_memory import generate_sdk
+
+
+OWN = '''
+#include "sdk.h"
+struct conn { int fd; rec0_t *state; struct rec1 last; };
+typedef struct conn conn_t;
+int conn_open(conn_t *c, const char *host, rec2_t *opts);
+void conn_close(conn_t *c);
+'''
+
+
+def generate_xml(directory, count):
+    generate_sdk(directory, count)
+    header = os.path.join(directory, 'bench.h')
+    with open(header, 'w') as f:
+        f.write(OWN)
+    xml = os.path.join(directory, 'bench.xml')
+    subprocess.check_call(['castxml', '--castxml-gccxml', '-o', xml, header])
+    return xml
+
+
+def measure(xml, prune):
+    main_files = ['bench.h'] if prune else None
+    t = time.time()
+    items = gccxml_parser.parse(xml, main_files)
+    elapsed = time.time() - t
+    gc.collect()
+    nodes = sum(1 for obj in gc.get_objects()
+                if isinstance(obj, c_ast.C_ASTNode))
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print '%-10s %7d nodes kept, %6.1f MB maxrss, %.2f s' % (
+        'pruned' if prune else 'unpruned', nodes, maxrss / 1024., elapsed)
+
+
+def run(count):
+    directory = tempfile.mkdtemp()
+    try:
+        xml = generate_xml(directory, count)
+        print 'xml: %.1f MB' % (os.path.getsize(xml) / 1048576.)
+        for prune in ('', 'prune'):
+            subprocess.check_call([sys.executable, __file__, xml, prune])
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+        measure(sys.argv[1], len(sys.argv) > 2 and sys.argv[2] == 'prune')
+    else:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -1210,9 +1210,9 @@ class alias(CWAN):
 
     """
     def init(self, name, asname):
-        assert_str(name)
+        assert_str(name, 'name')
         if asname:
-            assert_str(asname)
+            assert_str(asname, 'asname')
         self.name = name
         self.asname = asname
 
@@ -1388,6 +1388,42 @@ class UnionDef(stmt):
         self.body = body
 
 
+class StructDecl(stmt):
+    """ A struct declaration without a body, i.e. a forward
+    declaration. Inherits stmt.
+
+    name : a string.
+
+    """
+    def init(self, name):
+        assert_str(name, 'name')
+        self.name = name
+
+
+class UnionDecl(stmt):
+    """ A union declaration without a body, i.e. a forward
+    declaration. Inherits stmt.
+
+    name : a string.
+
+    """
+    def init(self, name):
+        assert_str(name, 'name')
+        self.name = name
+
+
+class Verbatim(stmt):
+    """ Code that was rendered before, e.g. taken from the render
+    cache. It is written as is. Inherits stmt.
+
+    code : a string.
+
+    """
+    def init(self, code):
+        assert_str(code, 'code')
+        self.code = code
+
+
 class EnumDef(stmt):
     """ An enum definition. Inherits stmt.
 
@@ -0,0 +1,201 @@
+""" A cache of the rendered pxd code of single declarations.
+
+Regenerating a large header whose declarations mostly stayed the same
+transforms and renders all of them again. The render cache maps the
+structural hash of every toplevel declaration (see cwrap.hashing) to
+the code that was rendered for it inside the `cdef extern from` block.
+A transformer that has a render cache only transforms and renders the
+declarations that are new or changed, and splices the cached code of
+the others into the module as Verbatim nodes. The result is the same
+code a full regeneration writes.
+
+All entries are kept in a single pickle file in the cache directory.
+It is rewritten with the entries that were used by the last run, so
+entries of declarations that are gone don't pile up.
+
+With `verify` the cached declarations are transformed and rendered
+anyway, and a RenderCacheError is raised if the code differs from the
+cached code or if the spliced module differs from the module a full
+regeneration renders.
+
+All frontends take the render cache from the config: the
+`render_cache` option is the directory of the cache, and with the
+`verify_render_cache` option the cache is verified. The `cache_stats`
+option prints its hit rates.
+
+"""
+import cPickle
+import os
+
+from . import cw_ast
+from .renderer import ASTRenderer
+from .. import version
+from ..cache import CacheStats, hash_key
+from ..hashing import structural_hash
+
+
+# bump when the way the code is cached changes
+FORMAT_VERSION = 1
+
+FILENAME = 'render.cache'
+
+
+class RenderCacheError(Exception):
+    """ Raised when the verification of the render cache fails.
+
+    """
+    pass
+
+
+def from_config(config):
+    """ Returns the RenderCache of the `render_cache` option of the
+    config, or None.
+
+    """
+    directory = config.metadata.get('render_cache')
+    if directory is None:
+        return None
+    return RenderCache(directory,
+                       config.metadata.get('verify_render_cache', False),
+                       config.metadata.get('cache_stats', False))
+
+
+class RenderCache(object):
+    """ The render cache in `directory`. The `namespace` of the keys
+    separates the entries of transformers that render the same c_ast
+    differently, e.g. those of different frontends. With `print_stats`
+    the hit rates are printed when the cache is saved.
+
+    """
+    def __init__(self, directory, verify=False, print_stats=False):
+        self.directory = os.path.abspath(directory)
+        self.path = os.path.join(self.directory, FILENAME)
+        self.verify = verify
+        self.print_stats = print_stats
+        self.stats = CacheStats()
+        self.entries = self._read()
+        # the entries used by this run, which are the ones saved
+        self.used = {}
+
+    #--------------------------------------------------------------------------
+    # Public interface
+    #--------------------------------------------------------------------------
+    def key(self, item, namespace):
+        """ Returns the key of the code of the toplevel c_ast `item`.
+
+        """
+        return hash_key(['render', FORMAT_VERSION, version.version(),
+                         namespace, structural_hash(item)])
+
+    def lookup(self, key):
+        """ Returns the cached code for `key`, or None.
+
+        """
+        code = self.entries.get(key)
+        if code is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self.used[key] = code
+        return code
+
+    def store(self, key, code):
+        if self.entries.get(key) != code:
+            self.stats.stores += 1
+        self.entries[key] = code
+        self.used[key] = code
+
+    def render(self, stmts):
+        """ Returns the code of the pxd stmt nodes of one declaration,
+        as rendered inside the extern block.
+
+        """
+        return ASTRenderer().render_stmts(stmts, 1)
+
+    def splice(self, transformer, item, namespace):
+        """ Appends the pxd code of `item` to `transformer.pxd_nodes`,
+        as a Verbatim node. The code is taken from the cache, or else
+        `transformer.visit(item)` appends the pxd nodes of `item` to
+        `transformer.pxd_nodes`, which are rendered and stored. With
+        `verify`, the nodes are returned, or None if the code came
+        from the cache.
+
+        """
+        key = self.key(item, namespace)
+        code = self.lookup(key)
+        nodes = None
+        if code is None or self.verify:
+            pxd_nodes = transformer.pxd_nodes
+            start = len(pxd_nodes)
+            transformer.visit(item)
+            nodes = pxd_nodes[start:]
+            del pxd_nodes[start:]
+            fresh = self.render(nodes)
+            if code is not None and code != fresh:
+                msg = ('The cached code of `%s` differs from its '
+                       'regeneration:\n%s\n---\n%s' % (item.name, code, fresh))
+                raise RenderCacheError(msg)
+            code = fresh
+            self.store(key, code)
+        transformer.pxd_nodes.append(cw_ast.Verbatim(code))
+        return nodes
+
+    def transform(self, transformer, items, namespace, make_module):
+        """ Splices the pxd code of the toplevel `items` of a module
+        into `transformer.pxd_nodes`, which the caller has emptied, and
+        returns the module `make_module(pxd_nodes)` makes of it. With
+        `verify`, the module is checked against the one made of the
+        regenerated pxd nodes.
+
+        """
+        full_nodes = []
+        for item in items:
+            nodes = self.splice(transformer, item, namespace)
+            if nodes is not None:
+                full_nodes.extend(nodes)
+        module = make_module(transformer.pxd_nodes)
+        if self.verify:
+            self.check(module, make_module(full_nodes))
+        return module
+
+    def check(self, module, full_module):
+        """ Raises a RenderCacheError unless the module with the spliced
+        code renders the same code as `full_module`.
+
+        """
+        code = ASTRenderer().render(module)
+        full_code = ASTRenderer().render(full_module)
+        if code != full_code:
+            raise RenderCacheError('The spliced code differs from a full '
+                                   'regeneration')
+
+    def save(self):
+        """ Writes the entries used by this run to the cache file,
+        atomically.
+
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        data = cPickle.dumps(self.used, 2)
+        tmp_path = self.path + '.%d.tmp' % os.getpid()
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.rename(tmp_path, self.path)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self.print_stats:
+            print 'Render cache: %s' % self.stats
+
+    #--------------------------------------------------------------------------
+    # Helpers
+    #--------------------------------------------------------------------------
+    def _read(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return cPickle.load(f)
+        except Exception:
+            # a missing or corrupt cache file is just empty
+            return {}
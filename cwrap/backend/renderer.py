@@ -44,6 +44,9 @@ class Code(object):
         res = CODE_HEADER + self._io.getvalue()
         return res
 
+    def getbody(self):
+        return self._io.getvalue()
+
 
 class ASTRenderer(object):
 
@@ -64,6 +67,19 @@ class ASTRenderer(object):
         self.visit(module)
         return self.code.getvalue()
 
+    def render_stmts(self, stmts, indent=0):
+        """ Returns the code of a list of stmt nodes at the given indent
+        level, without the header. Rendering the stmts of a body one by
+        one and joining the results gives the code of the whole body.
+
+        """
+        self.code = Code()
+        self.code.indent(indent)
+        self.cdef_stmt_context = []
+        for stmt in stmts:
+            self.visit(stmt)
+        return self.code.getbody()
+
     def visit(self, node):
         method_name = 'visit_' + node.__class__.__name__
         visitor = getattr(self, method_name, self.unhandled_visitor)
@@ -590,6 +606,29 @@ class ASTRenderer(object):
 
         self.code.newline()
 
+    def visit_StructDecl(self, struct_decl):
+        name = struct_decl.name
+        if self.cdef_stmt_context:
+            mod = self.cdef_stmt_context.pop()
+            head = '%s struct %s' % (mod, name)
+        else:
+            head = 'struct %s' % name
+        self.code.write_i(head)
+        self.code.newline()
+
+    def visit_UnionDecl(self, union_decl):
+        name = union_decl.name
+        if self.cdef_stmt_context:
+            mod = self.cdef_stmt_context.pop()
+            head = '%s union %s' % (mod, name)
+        else:
+            head = 'union %s' % name
+        self.code.write_i(head)
+        self.code.newline()
+
+    def visit_Verbatim(self, verbatim):
+        self.code.write(verbatim.code)
+
     def visit_EnumDef(self, enum_def):
         name = enum_def.name
         if self.cdef_stmt_context:
@@ -0,0 +1,101 @@
+""" The base class of the c_ast nodes of all the frontends, the
+interning of their locations, and the forward declarations the
+shared transformations insert.
+
+"""
+import threading
+
+
+#------------------------------------------------------------------------------
+# Locations
+#------------------------------------------------------------------------------
+# A location is stored on the nodes as an interned (file id, line) pair,
+# so that the file names are kept only once. File ids are only valid in
+# this process; pickled nodes carry the decoded (file name, line).
+_file_ids = {}
+_file_names = []
+_locations = {}
+_files_lock = threading.Lock()
+
+def _file_id(fname):
+    file_id = _file_ids.get(fname)
+    if file_id is None:
+        with _files_lock:
+            file_id = _file_ids.get(fname)
+            if file_id is None:
+                file_id = len(_file_names)
+                _file_names.append(fname)
+                _file_ids[fname] = file_id
+    return file_id
+
+def encode_location(location):
+    if location is None:
+        return None
+    fname, line = location
+    key = (_file_id(fname), line)
+    return _locations.setdefault(key, key)
+
+def decode_location(location):
+    if location is None:
+        return None
+    file_id, line = location
+    return (_file_names[file_id], line)
+
+
+def _slot_names(cls):
+    names = cls.__dict__.get('_all_slots')
+    if names is None:
+        names = []
+        for klass in reversed(cls.__mro__):
+            names.extend(klass.__dict__.get('__slots__', ()))
+        cls._all_slots = names
+    return names
+
+
+class C_ASTNode(object):
+
+    # `_hash` caches the structural hash, see cwrap.hashing
+    __slots__ = ('name', '_location', '_hash')
+
+    def __init__(self, name=''):
+        self.name = name
+        self._location = None
+        self._hash = None
+
+    def _get_location(self):
+        return decode_location(self._location)
+
+    def _set_location(self, location):
+        self._location = encode_location(location)
+
+    location = property(_get_location, _set_location)
+
+    def __getstate__(self):
+        state = {}
+        for name in _slot_names(type(self)):
+            if hasattr(self, name):
+                state[name] = getattr(self, name)
+        state['_location'] = self.location
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            if name != '_location':
+                setattr(self, name, value)
+        self.location = state.get('_location')
+
+
+class ForwardDeclaration(C_ASTNode):
+    """ A forward declaration of the struct or union `decl`. Inserted
+    by `cwrap.c_ast_transforms.order_declarations` where declarations
+    that refer to each other through pointers can't all be ordered
+    after what they use, and in place of the nodes the parser made for
+    declarations of `decl` without its members.
+
+    """
+    __slots__ = ('decl',)
+
+    def __init__(self, decl):
+        C_ASTNode.__init__(self, decl.name)
+        self.decl = decl
+        self._location = decl._location
@@ -0,0 +1,413 @@
+""" The c_ast transformations that are the same for all the frontends.
+
+The frontends have c_ast modules of their own, so the functions that
+create or recognize nodes take the c_ast module of the frontend as
+their first argument. Where a frontend refers to declarations in a way
+of its own, e.g. the clang frontend refers to typedefs by name, it
+passes in a hook that resolves the references.
+
+"""
+import hashlib
+import os
+
+from .c_ast_base import C_ASTNode, ForwardDeclaration
+
+
+#------------------------------------------------------------------------------
+# Flattening of nested structs and unions
+#------------------------------------------------------------------------------
+# Mangled names of nested definitions are the names of all enclosing
+# definitions joined together. A parent name longer than this is
+# replaced by a hash of it, so that the names of deeply nested
+# definitions stay short but are still the same on every run.
+MAX_MANGLED_PREFIX = 64
+
+
+def mangle(parent_name, name):
+    """ Returns the mangled name of the nested definition `name` in
+    the struct or union `parent_name`.
+
+    """
+    if parent_name and len(parent_name) > MAX_MANGLED_PREFIX:
+        parent_name = '_h' + hashlib.sha1(parent_name).hexdigest()[:16]
+    return '__%s_%s' % (parent_name, name)
+
+
+def _nested_containers(c_ast, container):
+    """ Yields the (index, member) pairs of the structs and unions
+    defined inside `container`.
+
+    """
+    for i, field in enumerate(container.members):
+        if isinstance(field, (c_ast.Struct, c_ast.Union)):
+            yield i, field
+
+
+def _replace_nested(c_ast, container, mod_context):
+    """ Removes the nested definitions in `mod_context`, a list of
+    (index, nested container, typedef) tuples, from the members of
+    `container` and replaces any fields that reference them with the
+    typedefs. The members are rebuilt in one pass, nested definitions
+    are looked up by identity.
+
+    """
+    if not mod_context:
+        return
+    removed = set()
+    typedefs = {}
+    for idx, field, typedef in mod_context:
+        removed.add(idx)
+        typedefs[id(field)] = typedef
+    members = []
+    for i, member in enumerate(container.members):
+        if i in removed:
+            continue
+        if isinstance(member, c_ast.Field):
+            typedef = typedefs.get(id(member.typ))
+            if typedef is not None:
+                member.typ = typedef
+        members.append(member)
+    container.members[:] = members
+
+
+def flatten_container(c_ast, container, items=None):
+    """ Given a struct or union, replaces nested structs or unions
+    with toplevel struct/unions and a typdef'd member. This will
+    expand everything nested, however deep, using an explicit stack
+    rather than recursion. The `items` argument is used internally.
+    Returns a list of flattened nodes.
+
+    """
+    if items is None:
+        items = []
+
+    # each frame is a container being expanded: the container, its
+    # remaining nested definitions, the (index, nested container,
+    # typedef) tuples of the ones already expanded, and the typedef
+    # of the container itself.
+    stack = [(container, _nested_containers(c_ast, container), [], None)]
+    while stack:
+        parent, nested, mod_context, parent_typedef = stack[-1]
+        # an anonymous container is named by the typedef of it, if
+        # the frontend knows that name
+        parent_name = parent.name
+        if not parent_name and getattr(parent, 'typedef_name', None):
+            parent_name = parent.typedef_name
+        for i, field in nested:
+            # Create the necessary mangled names
+            mangled_name = mangle(parent_name, field.name)
+            mangled_typename = mangled_name + '_t'
+
+            # Change the name of the nested item to the mangled
+            # item the context to the parent context
+            field.name = mangled_name
+            field.context = parent.context
+
+            # Create a typedef for the mangled name with the parent_context
+            typedef = c_ast.Typedef(mangled_typename, field, parent.context)
+
+            # Add the necessary information to the mod_context so
+            # we can modify the list of members at the end.
+            mod_context.append((i, field, typedef))
+
+            # Expand any nested definitions for this container
+            # before going on with the parent.
+            stack.append((field, _nested_containers(c_ast, field), [],
+                          typedef))
+            break
+        else:
+            stack.pop()
+            _replace_nested(c_ast, parent, mod_context)
+            items.append(parent)
+            # the typedef of a nested container follows its expansion
+            if parent_typedef is not None:
+                items.append(parent_typedef)
+
+    return items
+
+
+#------------------------------------------------------------------------------
+# Tree shaking
+#------------------------------------------------------------------------------
+# attributes through which a c_ast node refers to other nodes. The
+# `context` of a node is not followed, it would keep everything.
+_reference_attrs = ('typ', 'returns', 'arguments', 'members', 'bases')
+
+
+def references(node):
+    """ Yields the c_ast nodes `node` refers to.
+
+    """
+    for attr in _reference_attrs:
+        value = getattr(node, attr, None)
+        if isinstance(value, C_ASTNode):
+            yield value
+        elif isinstance(value, list):
+            for ref in value:
+                yield ref
+
+
+def shake_tree(items, header_name, roots=None, resolve=None):
+    """ Drops the toplevel items the declarations of the header don't
+    need. Starting from the items located in the header, or from the
+    items named in `roots` if given, the declarations referred to
+    through fields, arguments, return types and typedef targets are
+    kept, transitively. `resolve`, if given, returns the declarations
+    a node refers to by name, for the frontends that don't refer to
+    declarations by identity. Returns a new list of items in the
+    original order.
+
+    """
+    if roots is not None:
+        roots = set(roots)
+        stack = [item for item in items if item.name in roots]
+    else:
+        suffix = os.sep + header_name
+        stack = [item for item in items if item.location is not None and
+                 (item.location[0] == header_name or
+                  item.location[0].endswith(suffix))]
+
+    kept = set()
+    seen = set()
+    toplevel = set(id(item) for item in items)
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if id(node) in toplevel:
+            kept.add(id(node))
+        if isinstance(node, ForwardDeclaration):
+            stack.append(node.decl)
+        if resolve is not None:
+            stack.extend(resolve(node))
+        for ref in references(node):
+            if id(ref) not in seen:
+                stack.append(ref)
+
+    # the forward declarations of the kept declarations are kept
+    return [item for item in items if id(item) in kept or
+            (isinstance(item, ForwardDeclaration) and id(item.decl) in kept)]
+
+
+#------------------------------------------------------------------------------
+# Declaration order
+#------------------------------------------------------------------------------
+def _uses(c_ast, item):
+    """ Yields the (node, by_value) pairs of the declarations `item`
+    uses. `by_value` is False for uses through a pointer and for the
+    struct or union a typedef names, which only need the name to be
+    declared.
+
+    """
+    stack = []
+    if isinstance(item, (c_ast.Struct, c_ast.Union)):
+        stack.extend((member, True) for member in item.members)
+    elif isinstance(item, c_ast.Typedef):
+        typ = item.typ
+        if isinstance(typ, (c_ast.Struct, c_ast.Union)) and typ.name:
+            yield typ, False
+        else:
+            stack.append((typ, True))
+    else:
+        stack.append((item, True))
+
+    seen = set()
+    while stack:
+        node, by_value = stack.pop()
+        if node is None or (id(node), by_value) in seen:
+            continue
+        seen.add((id(node), by_value))
+        if node is not item and (
+                isinstance(node, (c_ast.Typedef, c_ast.Enumeration,
+                                  c_ast.FundamentalType)) or
+                (isinstance(node, (c_ast.Struct, c_ast.Union)) and node.name)):
+            yield node, by_value
+            continue
+        if isinstance(node, c_ast.PointerType):
+            by_value = False
+        for ref in references(node):
+            stack.append((ref, by_value))
+
+
+def _strongly_connected(edges):
+    """ Returns the strongly connected components of the graph with
+    the adjacency lists `edges`, in the order Tarjan's algorithm finds
+    them: a component comes after the ones it has edges to. Nodes are
+    visited in index order. Runs in O(V+E), without recursion.
+
+    """
+    count = len(edges)
+    index = [None] * count
+    lowlink = [0] * count
+    on_stack = [False] * count
+    stack = []
+    components = []
+    counter = 0
+    for root in xrange(count):
+        if index[root] is not None:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, i = work[-1]
+            if i == 0:
+                index[node] = lowlink[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            succs = edges[node]
+            while i < len(succs):
+                succ = succs[i]
+                i += 1
+                if index[succ] is None:
+                    work[-1] = (node, i)
+                    work.append((succ, 0))
+                    break
+                elif on_stack[succ] and index[succ] < lowlink[node]:
+                    lowlink[node] = index[succ]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    component.sort()
+                    components.append(component)
+    return components
+
+
+def _declarations_ahead(c_ast, items):
+    """ Replaces the structs and unions without members that have a
+    definition among the `items` with ForwardDeclarations of it. The
+    frontends that make a node per declaration make such a node e.g.
+    for `struct list;`, which would be rendered as an empty definition.
+    Of several declarations of the same definition only the first is
+    kept. Returns a new list of items.
+
+    """
+    definitions = {}
+    for item in items:
+        if isinstance(item, (c_ast.Struct, c_ast.Union)) and item.members:
+            definitions.setdefault((type(item), item.name), item)
+
+    res_items = []
+    declared = set()
+    for item in items:
+        if isinstance(item, (c_ast.Struct, c_ast.Union)) and not item.members:
+            key = (type(item), item.name)
+            decl = definitions.get(key)
+            if decl is not None:
+                if key not in declared:
+                    declared.add(key)
+                    forward = ForwardDeclaration(decl)
+                    forward._location = item._location
+                    res_items.append(forward)
+                continue
+        res_items.append(item)
+    return res_items
+
+
+def order_declarations(c_ast, items, resolve=None):
+    """ Orders the toplevel items so that every declaration follows
+    the declarations it uses, and returns a new list of items. Items
+    that already are in such an order keep it. Declarations that use
+    each other in a cycle can only do so through pointers; the structs
+    and unions in such a cycle that are used through a pointer get a
+    ForwardDeclaration ahead of the cycle, unless they are declared
+    ahead of their definition already. `resolve`, if given, returns
+    the declarations a node refers to by name, for the uses that
+    aren't the toplevel items themselves. Runs in O(V+E) of the
+    dependency graph.
+
+    """
+    items = _declarations_ahead(c_ast, items)
+    index_of = dict((id(item), i) for i, item in enumerate(items))
+    forward_of = {}
+    for i, item in enumerate(items):
+        if isinstance(item, ForwardDeclaration):
+            forward_of[id(item.decl)] = i
+
+    # `strong` are the uses that need the used declaration itself,
+    # `weak` the ones a forward declaration is enough for. The uses
+    # of a definition that has a forward declaration among the items
+    # already need that one only, and it precedes the definition.
+    strong = []
+    weak = []
+    for i, item in enumerate(items):
+        item_strong = []
+        item_weak = []
+        if id(item) in forward_of:
+            item_strong.append(forward_of[id(item)])
+        for node, by_value in _uses(c_ast, item):
+            if id(node) in index_of:
+                targets = [index_of[id(node)]]
+            elif resolve is not None:
+                targets = [index_of[id(decl)] for decl in resolve(node)
+                           if id(decl) in index_of]
+            else:
+                targets = ()
+            for j in targets:
+                if j == i:
+                    continue
+                if by_value or not isinstance(items[j], (c_ast.Struct,
+                                                         c_ast.Union)):
+                    item_strong.append(j)
+                elif id(items[j]) in forward_of:
+                    item_strong.append(forward_of[id(items[j])])
+                else:
+                    item_weak.append(j)
+        strong.append(item_strong)
+        weak.append(item_weak)
+
+    edges = [strong[i] + weak[i] for i in xrange(len(items))]
+    res_items = []
+    for component in _strongly_connected(edges):
+        if len(component) == 1:
+            res_items.append(items[component[0]])
+            continue
+        # forward declare what the cycle uses through pointers, then
+        # order it by the uses that need the declaration itself
+        members = set(component)
+        declared = set()
+        for i in component:
+            for j in weak[i]:
+                if j in members:
+                    declared.add(j)
+        for j in sorted(declared):
+            res_items.append(ForwardDeclaration(items[j]))
+        res_items.extend(items[i] for i in
+                         _post_order(component, strong, members))
+    return res_items
+
+
+def _post_order(nodes, edges, members):
+    """ Returns `nodes` in depth first post order of the `edges`
+    between `members`, starting from the nodes in the given order.
+
+    """
+    order = []
+    visited = set()
+    for root in nodes:
+        if root in visited:
+            continue
+        visited.add(root)
+        work = [(root, iter(edges[root]))]
+        while work:
+            node, succs = work[-1]
+            for succ in succs:
+                if succ in members and succ not in visited:
+                    visited.add(succ)
+                    work.append((succ, iter(edges[succ])))
+                    break
+            else:
+                work.pop()
+                order.append(node)
+    return order
@@ -0,0 +1,167 @@
+""" An on-disk cache for the expensive intermediate products of the
+frontends, e.g. preprocessed sources.
+
+Products are found in two steps. The inputs that are known up front
+(the header and the command line) are hashed into a manifest key. The
+manifest stores, for every product made from these inputs, the files
+that were read while making it together with their content hashes. If
+all of those files are unchanged the product is reused. This way the
+include closure of a header is part of the key without having to
+compute it before the lookup.
+
+"""
+import cPickle
+import hashlib
+import os
+import tempfile
+
+
+# number of dependency sets remembered per manifest
+MAX_MANIFEST_ENTRIES = 16
+
+
+def hash_key(parts):
+    """ Returns a hex digest for a sequence of key parts, which must
+    have a stable repr (strings, numbers, tuples and lists of them).
+
+    """
+    return hashlib.sha1(repr(tuple(parts))).hexdigest()
+
+
+def hash_file(path):
+    """ Returns the sha1 hex digest of the contents of `path`.
+
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CacheStats(object):
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def __str__(self):
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return '%d hits, %d misses (%.0f%% hit rate), %d stored' % (
+            self.hits, self.misses, rate, self.stores)
+
+
+class Cache(object):
+    """ A cache rooted at `directory`. Products are stored as files
+    named after their key with the given `suffix`.
+
+    """
+    def __init__(self, directory, suffix=''):
+        self.directory = os.path.abspath(directory)
+        self.suffix = suffix
+        self.stats = CacheStats()
+        # (path, size, mtime) -> content hash, valid for this process
+        self._file_hashes = {}
+
+    #--------------------------------------------------------------------------
+    # Public interface
+    #--------------------------------------------------------------------------
+    def lookup(self, key_parts):
+        """ Returns the cached product for `key_parts`, or None.
+
+        """
+        manifest_key = hash_key(key_parts)
+        for depends, result_key in self._read_manifest(manifest_key):
+            if self._depends_unchanged(depends):
+                data = self._read(self._path(result_key, self.suffix))
+                if data is not None:
+                    self.stats.hits += 1
+                    return data
+        self.stats.misses += 1
+        return None
+
+    def store(self, key_parts, depends, data):
+        """ Stores `data` for `key_parts`. `depends` lists the files
+        that were read to make it.
+
+        """
+        manifest_key = hash_key(key_parts)
+        depends = sorted(set(depends))
+        hashes = [(path, self._file_hash(path)) for path in depends]
+        result_key = hash_key([manifest_key] + hashes)
+        self._write(self._path(result_key, self.suffix), data)
+
+        entries = [entry for entry in self._read_manifest(manifest_key)
+                   if entry[1] != result_key]
+        entries.insert(0, (hashes, result_key))
+        del entries[MAX_MANIFEST_ENTRIES:]
+        self._write(self._path(manifest_key, '.manifest'),
+                    cPickle.dumps(entries, 2))
+        self.stats.stores += 1
+
+    #--------------------------------------------------------------------------
+    # Helpers
+    #--------------------------------------------------------------------------
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key[2:] + suffix)
+
+    def _file_hash(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stat_key = (path, st.st_size, st.st_mtime)
+        digest = self._file_hashes.get(stat_key)
+        if digest is None:
+            digest = hash_file(path)
+            self._file_hashes[stat_key] = digest
+        return digest
+
+    def _depends_unchanged(self, depends):
+        for path, digest in depends:
+            if self._file_hash(path) != digest:
+                return False
+        return True
+
+    def _read_manifest(self, manifest_key):
+        data = self._read(self._path(manifest_key, '.manifest'))
+        if data is None:
+            return []
+        try:
+            return cPickle.loads(data)
+        except Exception:
+            # a corrupt manifest is just a miss
+            return []
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def _write(self, path, data):
+        """ Writes atomically, so that concurrent runs never see
+        partial files.
+
+        """
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(tmp_path, path)
+        except:
+            os.remove(tmp_path)
+            raise
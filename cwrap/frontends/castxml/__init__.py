@@ -0,0 +1,154 @@
+#------------------------------------------------------------------------------
+# CastXML frontend
+#------------------------------------------------------------------------------
+# castxml writes the same xml as gccxml when run with --castxml-gccxml,
+# so the parser, c_ast and transformations of the gccxml frontend are
+# reused. The xml is parsed straight from the stdout pipes of the
+# castxml processes while they are still writing it, for several
+# headers at once (see gccxml/process_pool.py). With the `xml_cache`
+# option the xml is cached (see gccxml/xml_cache.py).
+
+# Stdlib imports
+import os
+import shlex
+
+# CWrap imports
+from ..gccxml import ast_transforms as transforms
+from ..gccxml import process_pool
+from ..gccxml import xml_cache
+from ...backend import render_cache
+from ...cache import Cache
+
+
+DEFAULT_CASTXML = ['castxml']
+
+
+class CastXMLError(Exception):
+    """ Raised when castxml fails on a header.
+
+    """
+    pass
+
+
+def castxml_command(command):
+    """ Normalizes the `castxml` option, which may be a string or a
+    list, into an argument list.
+
+    """
+    if not command:
+        return list(DEFAULT_CASTXML)
+    if isinstance(command, basestring):
+        return shlex.split(command)
+    return list(command)
+
+
+def castxml_job(header_path, include_dirs, castxml=None, cc=None,
+                spill_nodes=None):
+    """ Returns the XMLJob that runs castxml on the given header. The
+    include dirs are passed along to castxml. `cc` optionally names the
+    compiler castxml should emulate, as a (compiler id, compiler
+    command) pair, e.g. ('gnu', 'gcc'). See XMLJob for `spill_nodes`.
+
+    """
+    cmds = castxml_command(castxml)
+    cmds.extend(['--castxml-gccxml', '-o', '-'])
+    if cc is not None:
+        cc_id, cc_cmd = cc
+        cmds.extend(['--castxml-cc-' + cc_id, cc_cmd])
+    for inc_dir in include_dirs:
+        cmds.append('-I' + inc_dir)
+    cmds.append(header_path)
+    # only what the header itself needs is kept of the included files
+    main_files = [os.path.split(header_path)[-1]]
+    return process_pool.XMLJob(header_path, cmds,
+                               cache_key=xml_cache.cache_key(cmds),
+                               main_files=main_files,
+                               spill_nodes=spill_nodes)
+
+
+def parse_headers(jobs, workers=None, cache=None):
+    """ Runs the castxml jobs in a pool of `workers` processes and
+    returns their c_ast items, in the order of `jobs`. The xml is
+    taken from and stored in `cache`, if given. Raises a CastXMLError
+    for the first header that failed.
+
+    """
+    results = process_pool.ProcessPool(workers, cache).parse(jobs)
+    for result in results:
+        if result.failed:
+            raise CastXMLError(result.error)
+    return [result.items for result in results]
+
+
+def gen_c_ast(header_path, include_dirs, castxml=None, cc=None):
+    """ Parse the given header file into a C style ast which can be
+    transformed into a CWrap ast. See `castxml_job` for the arguments.
+
+    """
+    job = castxml_job(header_path, include_dirs, castxml, cc)
+    return parse_headers([job], 1)[0]
+
+
+def generate_asts(config):
+    """ Returns an iterable of ASTContainer objects.
+
+    With the `tree_shaking` option, only the declarations of a header
+    and those they refer to are emitted; `shake_roots` optionally
+    names the declarations to start from instead.
+
+    The `render_cache` options are those of cwrap.backend.render_cache.
+
+    """
+    castxml = config.metadata.get('castxml')
+    cc = config.metadata.get('castxml_cc')
+    include_dirs = config.metadata.get('include_dirs', [])
+    workers = config.metadata.get('parse_workers')
+    spill_nodes = config.metadata.get('spill_nodes')
+    cache = None
+    cache_dir = config.metadata.get('xml_cache')
+    if cache_dir is not None:
+        cache = Cache(cache_dir, xml_cache.SUFFIX)
+
+    # castxml runs for all headers at once, `parse_workers` at a time
+    paths = [header_file.path for header_file in config.files]
+    for path in paths:
+        print 'Parsing %s' % path
+    jobs = [castxml_job(path, include_dirs, castxml, cc, spill_nodes)
+            for path in paths]
+    all_items = parse_headers(jobs, workers, cache)
+    if cache is not None and config.metadata.get('cache_stats'):
+        print 'XML cache: %s' % cache.stats
+
+    c_ast_containers = []
+    for header_file, ast_items in zip(config.files, all_items):
+        # read the header info and create the extern and implemenation
+        # module names
+        path = header_file.path
+        header_name = os.path.split(path)[-1]
+        extern_name = header_file.metadata.get('extern_name')
+        implementation_name = header_file.metadata.get('implementation_name')
+        if extern_name is None:
+            extern_name = '_' + os.path.splitext(header_name)[0]
+        if implementation_name is None:
+            implementation_name = os.path.splitext(header_name)[0]
+
+        # Apply the transformations to the ast items
+        trans_items = transforms.apply_c_ast_transformations(ast_items)
+
+        # Drop what the declarations of the header don't need
+        if config.metadata.get('tree_shaking'):
+            trans_items = transforms.shake_tree(
+                trans_items, header_name, config.metadata.get('shake_roots'))
+
+        # Create the CAstContainer for these items
+        container = transforms.CAstContainer(trans_items, header_name,
+                                             extern_name, implementation_name)
+
+        # Add the container to the list
+        c_ast_containers.append(container)
+
+    # Now we can create an ast transformer and transform the list
+    # of containers into a generator that can be rendered into code
+    ast_transformer = transforms.CAstTransformer(
+        c_ast_containers, render_cache.from_config(config))
+    return ast_transformer.transform()
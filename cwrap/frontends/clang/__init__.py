@@ -6,24 +6,141 @@ import tempfile
 # Local package imports
 from . import  ast_transforms as transforms
 from . import  clang_parser
+from . import  dtypes
+from . import  preprocess
+from . import  worker_pool
+from ...backend import render_cache
+from ...cache import Cache
 
 
-def gen_c_ast(header_path, include_dirs, language):
+def gen_c_ast(header_path, include_dirs, language, export_macros=False,
+              preprocessor=None, cache=None, index=None, namespaces=None):
     """ Parse the given header file into a C style ast which can be
     transformed into a CWrap ast. The include dirs are passed along to 
-    gccxml.
+    gccxml. If `export_macros` is True, the macro constants defined in
+    the header are exported as well.
+
+    If a `preprocessor` command or a `cache` is given, the header is
+    preprocessed by that command (clang -E by default) first and the
+    output, possibly taken from the cache, is parsed instead.
+
+    C++ namespaces and classes from other headers are only converted
+    when the header refers to them, unless their namespace is listed
+    in `namespaces`.
 
     """
-    c_ast = clang_parser.parse(header_path, include_dirs, language)
+    if preprocessor is None and cache is None:
+        cfile = header_path
+    else:
+        text = preprocess.preprocessed_source(header_path, include_dirs,
+                                              language, preprocessor,
+                                              export_macros, cache)
+        cfile = [(preprocess.unsaved_name(header_path, language), text)]
+        language = preprocess.preprocessed_language(language)
+
+    c_ast = clang_parser.parse(cfile, include_dirs, language,
+                               export_macros=export_macros,
+                               main_files=[header_path], index=index,
+                               namespaces=namespaces)
     return c_ast
 
 
+def parse_headers(config):
+    """ Parses the headers of `config` and returns a list of
+    (header_file, ast_items) pairs in the order of `config.files`.
+
+    If the `parse_workers` option is set, the headers are parsed in
+    that many worker processes, each bounded by the `parse_timeout`
+    (seconds) and `parse_memory_limit` (bytes) options. Headers that
+    fail to parse are reported and left out of the result.
+
+    Setting the `preprocessor` command or the `preprocess_cache`
+    directory enables the preprocessing stage, see gen_c_ast.
+
+    """
+    include_dirs = config.metadata.get('include_dirs', [])
+    language = config.metadata.get('language', '')
+    export_macros = config.metadata.get('export_macros', False)
+    preprocessor = config.metadata.get('preprocessor')
+    cache_dir = config.metadata.get('preprocess_cache')
+    namespaces = config.metadata.get('namespaces')
+
+    workers = config.metadata.get('parse_workers')
+    if not workers:
+        cache = None
+        if cache_dir is not None:
+            cache = Cache(cache_dir, '.i')
+        parsed = []
+        for header_file in config.files:
+            path = header_file.path
+            print 'Parsing %s' % path
+            ast_items = gen_c_ast(path, include_dirs, language, export_macros,
+                                  preprocessor, cache, namespaces=namespaces)
+            parsed.append((header_file, ast_items))
+        if cache is not None:
+            print 'Preprocess cache: %s' % cache.stats
+        return parsed
+
+    timeout = config.metadata.get('parse_timeout')
+    memory_limit = config.metadata.get('parse_memory_limit')
+    jobs = [(header_file.path, include_dirs, language, export_macros,
+             preprocessor, cache_dir, namespaces)
+            for header_file in config.files]
+
+    print 'Parsing %d headers in %d workers' % (len(jobs), workers)
+    with worker_pool.ParserPool(workers, timeout, memory_limit) as pool:
+        results = pool.parse(jobs)
+
+    parsed = []
+    failed = []
+    for header_file, result in zip(config.files, results):
+        if result.failed:
+            print 'Failed to parse %s: %s' % (result.path, result.error)
+            failed.append(result.path)
+        else:
+            parsed.append((header_file, result.items))
+    if failed:
+        print '%d of %d headers failed to parse' % (len(failed), len(jobs))
+    return parsed
+
+
+def write_dtype_module(config, header_file, items, implementation_name):
+    """ Writes the module with the NumPy dtypes of the structs and
+    unions of a header to the save directory of `config`. It is named
+    after the `dtype_name` option of the file, by default the
+    implementation name with a `_dtypes` suffix.
+
+    """
+    name = header_file.metadata.get('dtype_name')
+    if name is None:
+        name = implementation_name + '_dtypes'
+    header_name = os.path.split(header_file.path)[-1]
+    save_path = os.path.join(config.save_dir, name + '.py')
+    print 'Writing dtypes %s' % save_path
+    with open(save_path, 'wb') as f:
+        f.write(dtypes.generate_dtype_module(items, header_name))
+
+
 def generate_asts(config):
     """ Returns an iterable of ASTContainer objects.
 
+    With the `numpy_dtypes` option, a module with NumPy dtypes of the
+    structs and unions is written for every header as well.
+
+    With the `tree_shaking` option, only the declarations of a header
+    and those they refer to are emitted; `shake_roots` optionally
+    names the declarations to start from instead.
+
+    With the `share_declarations` option, declarations that several
+    headers include are emitted once, by the module of the header
+    that defines them or else the first one, and cimported by the
+    others.
+
+    The `render_cache` options are those of cwrap.backend.render_cache.
+
     """
     c_ast_containers = []
-    for header_file in config.files:
+    for header_file, ast_items in parse_headers(config):
         # read the header info and create the extern and implemenation
         # module names
         path = header_file.path
@@ -35,14 +152,6 @@ def generate_asts(config):
         if implementation_name is None:
             implementation_name = os.path.splitext(header_name)[0]
 
-        # generate the c_ast for the header 
-        include_dirs = config.metadata.get('include_dirs', [])
-
-        language = config.metadata.get('language', '')
-        
-        print 'Parsing %s' % path
-        ast_items = gen_c_ast(path, include_dirs, language) 
-
         print 'in __init__/generate_asts()'
         print 'file parsed'
         print 'AST:', ast_items
@@ -51,6 +160,15 @@ def generate_asts(config):
         
         # Apply the transformations to the ast items 
         trans_items = transforms.apply_c_ast_transformations(ast_items)
+
+        # Drop what the declarations of the header don't need
+        if config.metadata.get('tree_shaking'):
+            trans_items = transforms.shake_tree(
+                trans_items, header_name, config.metadata.get('shake_roots'))
+
+        if config.metadata.get('numpy_dtypes'):
+            write_dtype_module(config, header_file, trans_items,
+                               implementation_name)
         
         # Create the CAstContainer for these items
         container = transforms.CAstContainer(trans_items, header_name, 
@@ -61,5 +179,7 @@ def generate_asts(config):
 
     # Now we can create an ast transformer and transform the list 
     # of containers into a generator that can be rendered into code
-    ast_transformer = transforms.CAstTransformer(c_ast_containers)
+    share = config.metadata.get('share_declarations', False)
+    ast_transformer = transforms.CAstTransformer(
+        c_ast_containers, share, render_cache.from_config(config))
     return ast_transformer.transform()
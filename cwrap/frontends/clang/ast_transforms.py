@@ -1,9 +1,16 @@
+# Stdlib imports
+import collections
+
 # CWrap imports
 from ...backend import cw_ast
+from ...c_ast_transforms import flatten_container
+from ... import c_ast_transforms
 from ...config import ASTContainer 
+from ...hashing import hash_cons
 
 # Local package imports
 import c_ast
+import macros
 
 
 def find_toplevel_items(items):
@@ -42,68 +49,6 @@ def sort_toplevel_items(items):
     return sorted(items, key=key)
 
 
-def _flatten_container(container, items=None): #, context_name=None):
-    """ Given a struct or union, replaces nested structs or unions
-    with toplevel struct/unions and a typdef'd member. This will 
-    recursively expand everything nested. The `items` and `context_name`
-    arguments are used internally. Returns a list of flattened nodes.
-
-    """
-    #print '_flatten_container_start', container.__class__.__name__, container.name
-    #print [(m.__class__.__name__, m.name) for m in container.members]
-
-
-    if items is None:
-        items = []
-
-    parent_context = container.context
-    parent_name = container.name
-    if not parent_name:
-        parent_name = container.typedef_name
-
-    mod_context = []
-    for i, field in enumerate(container.members):
-        if isinstance(field, (c_ast.Struct, c_ast.Union)):
-            # Create the necessary mangled names
-            mangled_name = '__%s_%s' % (parent_name, field.name)
-            mangled_typename = mangled_name + '_t'
-            
-            # Change the name of the nested item to the mangled
-            # item the context to the parent context
-            field.name = mangled_name
-            field.context = parent_context
-            
-            # Expand any nested definitions for this container.
-            _flatten_container(field, items) #, parent_name)
-            
-            # Create a typedef for the mangled name with the parent_context
-            typedef = c_ast.Typedef(mangled_typename, field, parent_context)
-                
-            # Add the typedef to the list of items
-            items.append(typedef)
-
-            # Add the necessary information to the mod_context so 
-            # we can modify the list of members at the end.
-            mod_context.append((i, field, typedef))
-
-    # Use the mod_context to remove the nest definitions and replace 
-    # any fields that reference them with the typedefs.
-    for idx, field, typedef in reversed(mod_context):
-        r = container.members.pop(idx) #TODO????
-        print 'removed member', r.name
-        for member in container.members:
-            if isinstance(member, c_ast.Field):
-                if member.typ is field:
-                    member.typ = typedef
-
-    items.append(container) #removed for typedef???
-
-    #print '_flatten_container_end: items', [(item.__class__.__name__, item.name) for item in items]
-
-
-    return items
-
-
 def flatten_nested_containers(items):
     """ Searches for Struct/Union nodes with nested Struct/Union 
     definitions, when it finds them, it creates a similar definition
@@ -115,19 +60,18 @@ def flatten_nested_containers(items):
     res_items = []
     for node in items:
         if isinstance(node, (c_ast.Struct, c_ast.Union)):
-            res_items.extend(_flatten_container(node))
+            res_items.extend(flatten_container(c_ast, node))
         elif isinstance(node, c_ast.Typedef):
-            #print 'found Typedef', node.typ
-            r = flatten_nested_containers([node.typ])
-            #print 'flattened typedef type:', r
-            # When the flatting didn't introduce any change, just append
-            # the original node, as it was. An example is:
-            # 'typedef struct foo bar'
-            if len(r) == 1 and node.typ == r[0]:
-                res_items.append(node)
-            else:
-                res_items.extend(r[:-1])
-                res_items.append(node)
+            # Follow chains of typedefs down to the type they name. The
+            # flattened definitions nested in it precede the typedef,
+            # which takes the place of the type itself. An example
+            # without any change is 'typedef struct foo bar'.
+            typ = node.typ
+            while isinstance(typ, c_ast.Typedef):
+                typ = typ.typ
+            if isinstance(typ, (c_ast.Struct, c_ast.Union)):
+                res_items.extend(flatten_container(c_ast, typ)[:-1])
+            res_items.append(node)
         else:
             res_items.append(node)
     return res_items
@@ -172,6 +116,8 @@ def apply_c_ast_transformations(c_ast_items):
         2) sort the toplevel items into the order they appear
         3) extract and replace nested structs and unions
         4) get rid of any c_ast.Ignored nodes
+        5) order the items after the declarations they use
+        6) share one instance of the structurally identical types
 
     """
     items = find_toplevel_items(c_ast_items)
@@ -183,9 +129,55 @@ def apply_c_ast_transformations(c_ast_items):
     #items = sort_toplevel_items(items)
     items = flatten_nested_containers(items)
     #items = filter_ignored(items)
+    items = order_declarations(items)
+    # after the passes that change nodes, hashes are cached on them
+    hash_cons(items)
     return items
 
 
+def _resolver(items):
+    """ Returns the function that resolves a node to the toplevel
+    `items` it refers to by name.
+
+    """
+    # The parser makes a node per declaration, so a struct that is
+    # declared several times is several nodes; all declarations of a
+    # name are resolved to. Uses of typedefs are interned
+    # FundamentalTypes of their name.
+    declarations = {}
+    for item in items:
+        if item.name:
+            declarations.setdefault((type(item), item.name), []).append(item)
+
+    def resolve(node):
+        if isinstance(node, c_ast.FundamentalType):
+            return declarations.get((c_ast.Typedef, node.name), ())
+        elif node.name:
+            return declarations.get((type(node), node.name), ())
+        return ()
+    return resolve
+
+
+def shake_tree(items, header_name, roots=None):
+    """ Drops the toplevel items the declarations of the header don't
+    need, see cwrap.c_ast_transforms.shake_tree. Returns a new list of
+    items in the original order.
+
+    """
+    return c_ast_transforms.shake_tree(items, header_name, roots,
+                                       _resolver(items))
+
+
+def order_declarations(items):
+    """ Orders the toplevel items after the declarations they use, see
+    cwrap.c_ast_transforms.order_declarations. Returns a new list of
+    items.
+
+    """
+    return c_ast_transforms.order_declarations(c_ast, items,
+                                               _resolver(items))
+
+
 class CAstContainer(object):
     """ A container object that holds a list of ast items, and the
     names of the modules they should be rendered to.
@@ -198,39 +190,104 @@ class CAstContainer(object):
         self.implementation_name = implementation_name
 
 
+def _declaration_key(item):
+    """ Returns what identifies the declaration `item` across the
+    parses of several headers, or None if it is never shared.
+
+    """
+    name = item.name or getattr(item, 'typedef_name', None)
+    if not name or item.location is None:
+        return None
+    return (item.__class__.__name__, name, item.location[0])
+
+
 class CAstTransformer(object):
 
-    def __init__(self, ast_containers):
+    def __init__(self, ast_containers, share_declarations=False,
+                 render_cache=None):
         # XXX - work out the symbols
         self.ast_containers = ast_containers
         self.pxd_nodes = []
         self.modifier_stack = []
+        # translations of interned c_ast types, shared by all uses
+        self.flyweight_translations = {}
+        # With `share_declarations`, a declaration that several headers
+        # include is only emitted by one module, the others cimport it.
+        # `owners` maps the declaration keys to that module's container.
+        self.share_declarations = share_declarations
+        self.owners = {}
+        # a cwrap.backend.render_cache.RenderCache or None
+        self.render_cache = render_cache
+
+    def assign_owners(self):
+        """ Assigns every declaration to the container of the header
+        that defines it, if that container has it, and otherwise to
+        the first container that has it.
+
+        """
+        holders = {}
+        for container in self.ast_containers:
+            for item in container.items:
+                key = _declaration_key(item)
+                if key is not None:
+                    holders.setdefault(key, [])
+                    if container not in holders[key]:
+                        holders[key].append(container)
+
+        self.owners = {}
+        for key, containers in holders.iteritems():
+            owner = containers[0]
+            for container in containers:
+                if macros.file_selected(key[2], [container.header_name]):
+                    owner = container
+                    break
+            self.owners[key] = owner
 
     def transform(self):
+        if self.share_declarations:
+            self.assign_owners()
+
         for container in self.ast_containers:
-            items = container.items
             self.pxd_nodes = []
             self.modifier_stack = []
             header_name = container.header_name
-
-            for item in items:
-                # only transform items for this header (not #include'd
-                # or other __builtin__ stuff)
-                if item.location is not None:
-                    #if not item.location[0].endswith(header_name):
-                    #    continue
-                    pass #include everythin
-                self.visit(item)
-                #TODO: debug only
-                #print self.pxd_nodes
-                #print
-       
-            extern = cw_ast.ExternFrom(container.header_name, self.pxd_nodes)
-            cdef_decl = cw_ast.CdefDecl([], extern)
-            mod = cw_ast.Module([cdef_decl])
-            
+            # the names to cimport from the other modules, by module
+            cimports = collections.OrderedDict()
+
+            # All items are transformed, the #include'd ones as well,
+            # except those another module owns and which are cimported.
+            items = []
+            for item in container.items:
+                owner = self.owners.get(_declaration_key(item), container)
+                if owner is not container:
+                    names = cimports.setdefault(owner.extern_name, [])
+                    if item.name and item.name not in names:
+                        names.append(item.name)
+                    continue
+                items.append(item)
+
+            body = []
+            for module, names in cimports.iteritems():
+                if names:
+                    aliases = [cw_ast.alias(name, None) for name in names]
+                    body.append(cw_ast.CImportFrom(module, aliases, None))
+
+            def make_module(pxd_nodes):
+                extern = cw_ast.ExternFrom(header_name, pxd_nodes)
+                return cw_ast.Module(body + [cw_ast.CdefDecl([], extern)])
+
+            if self.render_cache is None:
+                for item in items:
+                    self.visit(item)
+                mod = make_module(self.pxd_nodes)
+            else:
+                mod = self.render_cache.transform(self, items, __name__,
+                                                  make_module)
             yield ASTContainer(mod, container.extern_name + '.pxd')
 
+        if self.render_cache is not None:
+            self.render_cache.save()
+
     def visit(self, node):
         visitor_name = 'visit_' + node.__class__.__name__
         visitor = getattr(self, visitor_name, self.generic_visit)
@@ -277,6 +334,14 @@ class CAstTransformer(object):
         cdef = cw_ast.CdefDecl([], union_def)
         self.pxd_nodes.append(cdef)
 
+    def visit_ForwardDeclaration(self, forward):
+        if isinstance(forward.decl, c_ast.Union):
+            decl = cw_ast.UnionDecl(forward.name)
+        else:
+            decl = cw_ast.StructDecl(forward.name)
+        cdef = cw_ast.CdefDecl([], decl)
+        self.pxd_nodes.append(cdef)
+
     def visit_Enumeration(self, enum):
         name = enum.name
         body = []
@@ -378,6 +443,15 @@ class CAstTransformer(object):
     # render nodes
     #--------------------------------------------------------------------------
     def visit_translate(self, node):
+        if isinstance(node, c_ast.Flyweight) and node._frozen:
+            res = self.flyweight_translations.get(node)
+            if res is None:
+                res = self.flyweight_translations[node] = \
+                    self._dispatch_translate(node)
+            return res
+        return self._dispatch_translate(node)
+
+    def _dispatch_translate(self, node):
         name = 'translate_' + node.__class__.__name__
         res = getattr(self, name, lambda arg: None)(node)
         if res is None:
@@ -402,7 +476,7 @@ class CAstTransformer(object):
 
     def translate_Struct(self, struct):
         name = struct.name
-        if not name and hasattr(struct, 'typedef_name'):
+        if not name and struct.typedef_name is not None:
             name = struct.typedef_name
         return cw_ast.TypeName(cw_ast.Name(name, cw_ast.Param))
 
@@ -432,8 +506,9 @@ class CAstTransformer(object):
     
     def translate_CvQualifiedType(self, qual):
         # The `const` and `volatile` attributes are defined for `TypeName`
-        # and `Pointer`
-        cvtype = self.visit_translate(qual.typ)
+        # and `Pointer`. The translation of an interned type is shared,
+        # so it is translated afresh here instead of being modified.
+        cvtype = self._dispatch_translate(qual.typ)
         cvtype.const = qual.const
         cvtype.volatile = qual.volatile
         return cvtype
@@ -449,7 +524,8 @@ class CAstTransformer(object):
         for arg in func_type.arguments:
             # This case happens e.g. when an enum is used as function
             # parameter
-            if not arg.typ.name and hasattr(arg.typ, 'typedef_name'):
+            if not arg.typ.name and \
+                    getattr(arg.typ, 'typedef_name', None) is not None:
                 arg.typ.name = arg.typ.typedef_name
             args.append(self.visit_translate(arg))
         args = cw_ast.arguments(args, None, None, [])
@@ -1,44 +1,97 @@
-class C_ASTNode(object):
-
-    def __init__(self, *args, **kwargs):
-        self.location = None
-        #self.render_hints = {}
-        self.name = ''
-        self.init(*args, **kwargs)
-       
-    def init(self, *args, **kwargs):
-        pass
-  
-    
+# the base class, the locations and the forward declarations are
+# shared by all frontends
+from ...c_ast_base import C_ASTNode, ForwardDeclaration
+
+
 class Typedef(C_ASTNode):
 
-    def init(self, name, typ, context):
-        self.name = name
+    __slots__ = ('typ', 'context')
+
+    def __init__(self, name, typ, context):
+        C_ASTNode.__init__(self, name)
         self.typ = typ
         self.context = context
 
-class FundamentalType(C_ASTNode):
+def _intern(cls, key):
+    # module level, since classmethods can't be pickled
+    return cls.intern(*key)
+
+
+class Flyweight(object):
+    """ Mixin for node types of which a shared, immutable instance
+    per distinct value can be obtained with `intern`. Nodes created
+    by calling the class directly stay ordinary mutable nodes.
+    Subclasses need a `_frozen` slot.
+
+    """
+    __slots__ = ()
+
+    @classmethod
+    def intern(cls, *key):
+        table = cls.__dict__.get('_interned')
+        if table is None:
+            table = cls._interned = {}
+        node = table.get(key)
+        if node is None:
+            node = cls(*key)
+            node._frozen = True
+            table[key] = node
+        return node
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError('interned %s is immutable' %
+                                 self.__class__.__name__)
+        object.__setattr__(self, name, value)
+
+    def __reduce_ex__(self, protocol):
+        # interned nodes are interned again when unpickled, e.g. when
+        # the results come back from a worker process
+        if self._frozen:
+            return (_intern, (self.__class__, self.intern_key()))
+        return object.__reduce_ex__(self, protocol)
+
+
+class FundamentalType(Flyweight, C_ASTNode):
 
-    def init(self, name):
-        self.name = name
+    __slots__ = ('_frozen',)
 
-class CvQualifiedType(C_ASTNode):
+    def __init__(self, name):
+        self._frozen = False
+        C_ASTNode.__init__(self, name)
 
-    def init(self, typ, const, volatile):
+    def intern_key(self):
+        return (self.name,)
+
+class CvQualifiedType(Flyweight, C_ASTNode):
+    """ Only qualified types of interned types should be interned,
+    as the key holds the qualified type by identity.
+
+    """
+    __slots__ = ('typ', 'const', 'volatile', '_frozen')
+
+    def __init__(self, typ, const, volatile):
+        self._frozen = False
+        C_ASTNode.__init__(self)
         self.typ = typ
         self.const = const
         self.volatile = volatile
 
+    def intern_key(self):
+        return (self.typ, self.const, self.volatile)
+
 class Ignored(C_ASTNode):
 
-    def init(self, name):
-        self.name = name
+    __slots__ = ('arguments',)
+
+    def __init__(self, name):
+        C_ASTNode.__init__(self, name)
         self.arguments = []
 
     def fixup_argtypes(self, typemap):
         for arg in self.arguments:
             arg.typ = typemap[arg.typ]
-            
+
     def add_argument(self, argument):
         if argument is not None:
             self.arguments.append(argument)
@@ -46,22 +99,36 @@ class Ignored(C_ASTNode):
     add_child = add_argument
 
 
+# Layout: sizes and alignments are in bytes, field offsets in bits (as
+# reported by libclang). All of them are None where they are not known,
+# e.g. for incomplete types. `bits` is the width of a bitfield, None for
+# ordinary fields.
+
 class Field(C_ASTNode):
-    
-    def init(self, name, typ, context, bits=None, offset=None):
-        self.name = name
+
+    __slots__ = ('typ', 'context', 'bits', 'offset')
+
+    def __init__(self, name, typ, context, bits=None, offset=None):
+        C_ASTNode.__init__(self, name)
         self.typ = typ
         self.context = context
-        #self.bits = bits
-        #self.offset = offset
-   
+        self.bits = bits
+        self.offset = offset
+
 
 class Struct(C_ASTNode):
-    
-    def init(self, name, members = None, context = None):
-        self.name = name
+
+    # `typedef_name` is the name of the typedef of an anonymous struct,
+    # e.g. `typedef struct {...} name;`, or None
+    __slots__ = ('members', 'context', 'typedef_name', 'size', 'align')
+
+    def __init__(self, name, members = None, context = None, size = None, align = None):
+        C_ASTNode.__init__(self, name)
         self.members = members if members is not None else []
         self.context = context
+        self.typedef_name = None
+        self.size = size
+        self.align = align
 
     @property
     def opaque(self):
@@ -73,16 +140,22 @@ class Struct(C_ASTNode):
 
     add_child = add_member
 
+    def remove_member(self, member):
+        self.members.remove(member)
+
 
 class Union(C_ASTNode):
-    
-    def init(self, name, align = None, members = None, context = None, bases = None, size = None):
-        self.name = name
-        #self.align = align
+
+    __slots__ = ('members', 'context', 'typedef_name', 'size', 'align')
+
+    def __init__(self, name, align = None, members = None, context = None, bases = None, size = None):
+        C_ASTNode.__init__(self, name)
+        self.align = align
         self.members = members if members is not None else []
         self.context = context
+        self.typedef_name = None
         #self.bases = bases
-        #self.size = size
+        self.size = size
 
     @property
     def opaque(self):
@@ -93,38 +166,56 @@ class Union(C_ASTNode):
             self.members.append(member)
 
     add_child = add_member
-            
+
+    def remove_member(self, member):
+        self.members.remove(member)
+
 class EnumValue(C_ASTNode):
 
-    def init(self, name, value):
-        self.name = name
+    __slots__ = ('value',)
+
+    def __init__(self, name, value):
+        C_ASTNode.__init__(self, name)
         self.value = value
-    
+
 
 class Enumeration(C_ASTNode):
-    
-    def init(self, name, context):
-        self.name = name
+
+    # `signed` tells whether the underlying integer type is signed,
+    # None if it is not known
+    __slots__ = ('context', 'values', 'typedef_name', 'size', 'align',
+                 'signed')
+
+    def __init__(self, name, context, size = None, align = None,
+                 signed = None):
+        C_ASTNode.__init__(self, name)
         self.context = context
         self.values = []
+        self.typedef_name = None
+        self.size = size
+        self.align = align
+        self.signed = signed
 
     def add_value(self, val):
         self.values.append(val)
 
     add_child = add_value
-        
+
     @property
     def opaque(self):
         return len(self.values) == 1
-    
+
 
 class PointerType(C_ASTNode):
 
-    def init(self, typ, size, align):
+    __slots__ = ('typ', 'size', 'align')
+
+    def __init__(self, typ, size, align):
+        C_ASTNode.__init__(self)
         self.typ = typ
         self.size = size
         self.align = align
-    
+
     @property
     def refs(self):
         return [self.typ]
@@ -132,23 +223,30 @@ class PointerType(C_ASTNode):
 
 class ArrayType(C_ASTNode):
 
-    def init(self, typ, min, max):
+    __slots__ = ('typ', 'min', 'max')
+
+    def __init__(self, typ, min, max):
+        C_ASTNode.__init__(self)
         self.typ = typ
         self.min = min
         self.max = max
-    
+
 
 class Argument(C_ASTNode):
 
-    def init(self, name, typ):
+    __slots__ = ('typ',)
+
+    def __init__(self, name, typ):
+        C_ASTNode.__init__(self, name)
         self.typ = typ
-        self.name = name
 
 
 class Function(C_ASTNode):
 
-    def init(self, name, returns, context=None, attributes=None, extern=None):
-        self.name = name
+    __slots__ = ('returns', 'context', 'attributes', 'extern', 'arguments')
+
+    def __init__(self, name, returns, context=None, attributes=None, extern=None):
+        C_ASTNode.__init__(self, name)
         self.returns = returns
         self.context = context
         self.attributes = attributes
@@ -158,7 +256,7 @@ class Function(C_ASTNode):
     def fixup_argtypes(self, typemap):
         for arg in self.arguments:
             arg.typ = typemap[arg.typ]
-            
+
     def add_argument(self, argument):
         if argument is not None:
             self.arguments.append(argument)
@@ -168,7 +266,10 @@ class Function(C_ASTNode):
 
 class FunctionType(C_ASTNode):
 
-    def init(self, returns, attributes):
+    __slots__ = ('returns', 'attributes', 'arguments')
+
+    def __init__(self, returns, attributes):
+        C_ASTNode.__init__(self)
         self.returns = returns
         self.attributes = attributes
         self.arguments = []
@@ -176,17 +277,19 @@ class FunctionType(C_ASTNode):
     def fixup_argtypes(self, typemap):
         for arg in self.arguments:
             arg.typ = typemap[arg.typ]
-            
+
     def add_argument(self, argument):
         self.arguments.append(argument)
-    
+
     add_child = add_argument
 
 
 class OperatorFunction(C_ASTNode):
 
-    def init(self, name, returns, context, attributes, extern):
-        self.name = name
+    __slots__ = ('returns', 'context', 'attributes', 'extern', 'arguments')
+
+    def __init__(self, name, returns, context, attributes, extern):
+        C_ASTNode.__init__(self, name)
         self.returns = returns
         self.context = context
         self.attributes = attributes
@@ -196,7 +299,7 @@ class OperatorFunction(C_ASTNode):
     def fixup_argtypes(self, typemap):
         for arg in self.arguments:
             arg.typ = typemap[arg.typ]
-            
+
     def add_argument(self, argument):
         if argument is not None:
             self.arguments.append(argument)
@@ -206,51 +309,107 @@ class OperatorFunction(C_ASTNode):
 
 class Macro(C_ASTNode):
 
-    def init(self, name, args, body):
-        self.name = name
+    __slots__ = ('args', 'body')
+
+    def __init__(self, name, args, body):
+        C_ASTNode.__init__(self, name)
         self.args = args
         self.body = body
 
 
 class Alias(C_ASTNode):
 
-    def init(self, name, value, typ=None):
-        self.name = name
+    __slots__ = ('value', 'typ')
+
+    def __init__(self, name, value, typ=None):
+        C_ASTNode.__init__(self, name)
         self.value = value
         self.typ = typ
-    
 
-class File(C_ASTNode):
 
-    def init(self, name, members = None):
-        self.name = name
+class Scope(C_ASTNode):
+    # Files and namespaces can have a huge number of members, e.g. the
+    # structs of a generated register map. Members are indexed by
+    # identity, so that removing one doesn't need a linear search.
+    # A removed member leaves a tombstone behind, which is dropped
+    # the next time `members` is read.
+
+    __slots__ = ('_members', '_index', '_removed')
+
+    _tombstone = None
+
+    def __init__(self, name, members = None):
+        C_ASTNode.__init__(self, name)
         self.members = members if members is not None else []
 
-    def add_member(self, member):
-        if member is not None:
-            self.members.append(member)
+    def _get_members(self):
+        if self._removed:
+            self._members = [m for m in self._members
+                             if m is not self._tombstone]
+            self._reindex()
+        return self._members
 
-    add_child = add_member
-        
-        
+    def _set_members(self, members):
+        self._members = members
+        self._reindex()
 
-class Namespace(C_ASTNode):
+    members = property(_get_members, _set_members)
+
+    def _reindex(self):
+        self._index = dict((id(m), i) for i, m in enumerate(self._members))
+        self._removed = 0
 
-    def init(self, name, members = None):
-        self.name = name
-        self.members = members if members is not None else []
-        
     def add_member(self, member):
         if member is not None:
-            self.members.append(member)
-    
+            self._index[id(member)] = len(self._members)
+            self._members.append(member)
+
     add_child = add_member
 
+    def remove_member(self, member):
+        """ Removes `member` in constant time. Raises ValueError if it
+        is not a member.
+
+        """
+        idx = self._index.get(id(member))
+        if idx is None or idx >= len(self._members) or \
+                self._members[idx] is not member:
+            # the list was modified in place, e.g. by a transformation
+            self._reindex()
+            idx = self._index.get(id(member))
+            if idx is None:
+                raise ValueError('%r is not a member of %r' % (member, self))
+        del self._index[id(member)]
+        self._members[idx] = self._tombstone
+        self._removed += 1
+
+    def __getstate__(self):
+        # ids are meaningless in another process
+        state = C_ASTNode.__getstate__(self)
+        state['_members'] = self.members
+        del state['_index']
+        del state['_removed']
+        return state
+
+    def __setstate__(self, state):
+        C_ASTNode.__setstate__(self, state)
+        self._reindex()
+
+
+class File(Scope):
+    __slots__ = ()
+
+
+class Namespace(Scope):
+    __slots__ = ()
+
 
 class Variable(C_ASTNode):
 
-    def init(self, name, typ, context, init):
-        self.name = name
+    __slots__ = ('typ', 'context', 'init')
+
+    def __init__(self, name, typ, context, init):
+        C_ASTNode.__init__(self, name)
         self.typ = typ
         self.context = context
         self.init = init
@@ -260,32 +419,36 @@ class Variable(C_ASTNode):
 #-----------------
 
 class Class(C_ASTNode):
-    
-    def init(self, name, members = None, context = None):
-        self.name = name
+
+    __slots__ = ('members', 'context', 'template_params')
+
+    def __init__(self, name, members = None, context = None):
+        C_ASTNode.__init__(self, name)
         self.members = members if members is not None else []
         self.context = context
-        
+        #TODO: own class for ClassTemplate ????
+        self.template_params = []
+
     def add_member(self, member):
         if member is not None:
             self.members.append(member)
 
     add_child = add_member
 
-    #TODO: own class for ClassTemplate ????
-    template_params = []
+    def remove_member(self, member):
+        self.members.remove(member)
+
     def add_template_parameter(self, template_param):
         self.template_params.append(template_param)
 
 class ClassTemplate(Class):
-    
-    template_params = []
-    def add_template_parameter(self, template_param):
-        self.template_params.append(template_param)
+    __slots__ = ()
 
 class RefType(C_ASTNode):
     #C++ reference type
-    def init(self, typ):
-        self.typ = typ
 
+    __slots__ = ('typ',)
 
+    def __init__(self, typ):
+        C_ASTNode.__init__(self)
+        self.typ = typ
@@ -64,6 +64,9 @@ call is efficient.
 
 from ctypes import *
 import collections
+import mmap
+import sys
+import os
 
 #import clang.enumerations
 from . import enumerations
@@ -164,6 +167,7 @@ class SourceLocation(Structure):
     """
     _fields_ = [("ptr_data", c_void_p * 2), ("int_data", c_uint)]
     _data = None
+    _presumed = None
 
     def _get_instantiation(self):
         if self._data is None:
@@ -215,6 +219,19 @@ class SourceLocation(Structure):
         """Get the file offset represented by this source location."""
         return self._get_instantiation()[3]
 
+    @property
+    def presumed(self):
+        """Get the (filename, line, column) of this source location as
+        adjusted by #line directives and line markers. filename is None
+        if the location is invalid."""
+        if self._presumed is None:
+            f, l, c = _CXString(), c_uint(), c_uint()
+            conf.lib.clang_getPresumedLocation(self, byref(f), byref(l),
+                                               byref(c))
+            name = conf.lib.clang_getCString(f) or None
+            self._presumed = (name, int(l.value), int(c.value))
+        return self._presumed
+
     def __eq__(self, other):
         return conf.lib.clang_equalLocations(self, other)
 
@@ -1039,6 +1056,26 @@ CursorKind.INCLUSION_DIRECTIVE = CursorKind(503)
 
 ### Cursors ###
 
+class ChildVisit(object):
+    """
+    Return values of a clang_visitChildren visitor (CXChildVisitResult).
+    """
+    Break = 0
+    Continue = 1
+    Recurse = 2
+
+def _cursor_matcher(predicate):
+    """Turns a find predicate into a callable: None matches everything,
+    a CursorKind or a collection of kinds matches by kind."""
+    if predicate is None:
+        return lambda cursor: True
+    if isinstance(predicate, CursorKind):
+        return lambda cursor: cursor._kind_id == predicate.value
+    if isinstance(predicate, (list, tuple, set, frozenset)):
+        ids = set(kind.value for kind in predicate)
+        return lambda cursor: cursor._kind_id in ids
+    return predicate
+
 class Cursor(Structure):
     """
     The Cursor class represents a reference to an element within the AST. It
@@ -1074,6 +1111,25 @@ class Cursor(Structure):
         """
         return conf.lib.clang_CXXMethod_isStatic(self)
 
+    def is_bitfield(self):
+        """
+        Check if the field is a bitfield.
+        """
+        return conf.lib.clang_Cursor_isBitField(self)
+
+    def get_bitfield_width(self):
+        """
+        Retrieve the width of a bitfield.
+        """
+        return conf.lib.clang_getFieldDeclBitWidth(self)
+
+    def get_field_offsetof(self):
+        """
+        Returns the offsetof the FIELD_DECL pointed by this Cursor, in
+        bits. Negative values are CXTypeLayoutError codes.
+        """
+        return conf.lib.clang_Cursor_getOffsetOfField(self)
+
     def get_definition(self):
         """
         If the cursor is a reference to a declaration or a declaration of
@@ -1296,6 +1352,81 @@ class Cursor(Structure):
             children)
         return iter(children)
 
+    def _visit(self, visitor):
+        """Runs clang_visitChildren with visitor(child, parent), which
+        returns a ChildVisit value. Exceptions raised by the visitor stop
+        the traversal and are re-raised."""
+        error = []
+        def callback(child, parent, data):
+            child._tu = self._tu
+            try:
+                return visitor(child, parent)
+            except Exception:
+                error.append(sys.exc_info())
+                return ChildVisit.Break
+        conf.lib.clang_visitChildren(self, callbacks['cursor_visit'](callback),
+            None)
+        if error:
+            raise error[0][0], error[0][1], error[0][2]
+
+    def find_first(self, predicate=None, recurse=False):
+        """Return the first child matching predicate, or None.
+
+        predicate is a callable taking a cursor, a CursorKind or a
+        collection of CursorKinds. The traversal stops at the first match.
+        If recurse is True all descendants are searched, in pre-order.
+        """
+        match = _cursor_matcher(predicate)
+        found = []
+        miss = ChildVisit.Recurse if recurse else ChildVisit.Continue
+        def visitor(child, parent):
+            if match(child):
+                found.append(child)
+                return ChildVisit.Break
+            return miss
+        self._visit(visitor)
+        return found[0] if found else None
+
+    def find_all(self, predicate=None, recurse=False, limit=None):
+        """Return an iterator over the children matching predicate (see
+        find_first). The traversal stops once limit matches are found."""
+        match = _cursor_matcher(predicate)
+        found = []
+        step = ChildVisit.Recurse if recurse else ChildVisit.Continue
+        def visitor(child, parent):
+            if match(child):
+                found.append(child)
+                if limit is not None and len(found) >= limit:
+                    return ChildVisit.Break
+            return step
+        if limit is None or limit > 0:
+            self._visit(visitor)
+        return iter(found)
+
+    def walk(self, max_depth=None, predicate=None):
+        """Return an iterator over (cursor, depth) pairs for the
+        descendants of this cursor in pre-order, where the children have
+        depth 1. Descendants deeper than max_depth are not visited, nor are
+        those of cursors for which predicate (see find_first) is false."""
+        match = _cursor_matcher(predicate)
+        found = []
+        # the chain of ancestors of the cursor being visited
+        stack = [self]
+        def visitor(child, parent):
+            while stack[-1] != parent:
+                stack.pop()
+            if not match(child):
+                return ChildVisit.Continue
+            depth = len(stack)
+            found.append((child, depth))
+            if max_depth is not None and depth >= max_depth:
+                return ChildVisit.Continue
+            stack.append(child)
+            return ChildVisit.Recurse
+        if max_depth is None or max_depth > 0:
+            self._visit(visitor)
+        return iter(found)
+
     def get_tokens(self):
         """Obtain Token instances formulating that compose this Cursor.
 
@@ -1629,6 +1760,27 @@ class Type(Structure):
         """
         return conf.lib.clang_getArraySize(self)
 
+    def get_size(self):
+        """
+        Retrieve the size of the record, in bytes. Negative values are
+        CXTypeLayoutError codes, e.g. for incomplete types.
+        """
+        return conf.lib.clang_Type_getSizeOf(self)
+
+    def get_align(self):
+        """
+        Retrieve the alignment of the record, in bytes. Negative values
+        are CXTypeLayoutError codes.
+        """
+        return conf.lib.clang_Type_getAlignOf(self)
+
+    def get_offset(self, fieldname):
+        """
+        Retrieve the offset of a field in the record, in bits. Negative
+        values are CXTypeLayoutError codes.
+        """
+        return conf.lib.clang_Type_getOffsetOf(self, fieldname)
+
     def __eq__(self, other):
         if type(other) != type(self):
             return False
@@ -1661,6 +1813,86 @@ class _CXUnsavedFile(Structure):
     """Helper for passing unsaved file arguments."""
     _fields_ = [("name", c_char_p), ("contents", c_char_p), ('length', c_ulong)]
 
+_as_read_buffer = pythonapi.PyObject_AsReadBuffer
+_as_read_buffer.argtypes = [py_object, POINTER(c_void_p), POINTER(c_ssize_t)]
+_as_read_buffer.restype = c_int
+
+def _buffer_address(contents):
+    """Returns the (address, length) of the memory exposed by a buffer
+    protocol object such as an mmap, without copying it."""
+    try:
+        # writable buffers (e.g. mmaps opened with ACCESS_WRITE/COPY)
+        length = len(contents)
+        return addressof((c_char * length).from_buffer(contents)), length
+    except (TypeError, ValueError):
+        pass
+    address = c_void_p()
+    length = c_ssize_t()
+    _as_read_buffer(contents, byref(address), byref(length))
+    return address.value, length.value
+
+def _map_file(f):
+    """Maps the rest of the file object f into memory, or returns None
+    if f is not backed by a regular file."""
+    try:
+        fileno = f.fileno()
+        offset = f.tell()
+        size = os.fstat(fileno).st_size
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+    if size <= offset:
+        return None
+    try:
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError):
+        return None
+    # leave the file at EOF, like read() would
+    f.seek(0, os.SEEK_END)
+    return mapped, offset
+
+def _unsaved_files_array(unsaved_files):
+    """Builds the _CXUnsavedFile array for unsaved_files.
+
+    The contents may be str, unicode (which is passed UTF-8 encoded),
+    mmap or other buffer protocol objects, or file objects. Regular
+    files are memory mapped and, like buffers, are handed to libclang by
+    address instead of being copied into a Python string. Returns the
+    array and the list of objects that must be kept alive while libclang
+    uses it.
+    """
+    unsaved_array = (_CXUnsavedFile * len(unsaved_files))()
+    keepalive = []
+    for i, (name, contents) in enumerate(unsaved_files):
+        offset = 0
+        if hasattr(contents, "read") and not isinstance(contents, mmap.mmap):
+            mapped = _map_file(contents)
+            if mapped is None:
+                contents = contents.read()
+            else:
+                contents, offset = mapped
+
+        unsaved_array[i].name = name
+        if isinstance(contents, unicode):
+            contents = contents.encode('utf-8')
+        if isinstance(contents, str):
+            unsaved_array[i].contents = contents
+            unsaved_array[i].length = len(contents)
+            continue
+
+        try:
+            address, length = _buffer_address(contents)
+        except TypeError:
+            raise TypeError('Unexpected unsaved file contents.')
+        if address is None:
+            # an empty buffer has no address
+            unsaved_array[i].contents = ''
+            unsaved_array[i].length = 0
+            continue
+        keepalive.append(contents)
+        unsaved_array[i].contents = cast(address + offset, c_char_p)
+        unsaved_array[i].length = length - offset
+    return unsaved_array, keepalive
+
 class CompletionChunk:
     class Kind:
         def __init__(self, name):
@@ -1875,7 +2107,7 @@ class Index(ClangObject):
         In-memory contents for files can be provided by passing a list of pairs
         to as unsaved_files, the first item should be the filenames to be mapped
         and the second should be the contents to be substituted for the
-        file. The contents may be passed as strings or file objects.
+        file. The contents may be passed as strings, buffers or file objects.
 
         If an error was encountered during parsing, a TranslationUnitLoadError
         will be raised.
@@ -1937,9 +2169,11 @@ class TranslationUnit(ClangObject):
         In-memory file content can be provided via unsaved_files. This is an
         iterable of 2-tuples. The first element is the str filename. The
         second element defines the content. Content can be provided as str
-        source code or as file objects (anything with a read() method). If
-        a file object is being used, content will be read until EOF and the
-        read cursor will not be reset to its original position.
+        source code, as mmap or other buffer objects, or as file objects
+        (anything with a read() method). If a file object is being used,
+        content will be read until EOF and the read cursor will not be reset
+        to its original position. Buffers and regular files are passed to
+        libclang without being copied into a Python string.
 
         options is a bitwise or of TranslationUnit.PARSE_XXX flags which will
         control parsing behavior.
@@ -1979,14 +2213,7 @@ class TranslationUnit(ClangObject):
 
         unsaved_array = None
         if len(unsaved_files) > 0:
-            unsaved_array = (_CXUnsavedFile * len(unsaved_files))()
-            for i, (name, contents) in enumerate(unsaved_files):
-                if hasattr(contents, "read"):
-                    contents = contents.read()
-
-                unsaved_array[i].name = name
-                unsaved_array[i].contents = contents
-                unsaved_array[i].length = len(contents)
+            unsaved_array, keepalive = _unsaved_files_array(unsaved_files)
 
         ptr = conf.lib.clang_parseTranslationUnit(index, filename, args_array,
                                     len(args), unsaved_array,
@@ -2150,25 +2377,14 @@ class TranslationUnit(ClangObject):
         In-memory contents for files can be provided by passing a list of pairs
         as unsaved_files, the first items should be the filenames to be mapped
         and the second should be the contents to be substituted for the
-        file. The contents may be passed as strings or file objects.
+        file. The contents may be passed as strings, buffers or file objects.
         """
         if unsaved_files is None:
             unsaved_files = []
 
         unsaved_files_array = 0
         if len(unsaved_files):
-            unsaved_files_array = (_CXUnsavedFile * len(unsaved_files))()
-            for i,(name,value) in enumerate(unsaved_files):
-                if not isinstance(value, str):
-                    # FIXME: It would be great to support an efficient version
-                    # of this, one day.
-                    value = value.read()
-                    print value
-                if not isinstance(value, str):
-                    raise TypeError,'Unexpected unsaved file contents.'
-                unsaved_files_array[i].name = name
-                unsaved_files_array[i].contents = value
-                unsaved_files_array[i].length = len(value)
+            unsaved_files_array, keepalive = _unsaved_files_array(unsaved_files)
         ptr = conf.lib.clang_reparseTranslationUnit(self, len(unsaved_files),
                 unsaved_files_array, options)
 
@@ -2203,7 +2419,7 @@ class TranslationUnit(ClangObject):
         In-memory contents for files can be provided by passing a list of pairs
         as unsaved_files, the first items should be the filenames to be mapped
         and the second should be the contents to be substituted for the
-        file. The contents may be passed as strings or file objects.
+        file. The contents may be passed as strings, buffers or file objects.
         """
         options = 0
 
@@ -2221,18 +2437,7 @@ class TranslationUnit(ClangObject):
 
         unsaved_files_array = 0
         if len(unsaved_files):
-            unsaved_files_array = (_CXUnsavedFile * len(unsaved_files))()
-            for i,(name,value) in enumerate(unsaved_files):
-                if not isinstance(value, str):
-                    # FIXME: It would be great to support an efficient version
-                    # of this, one day.
-                    value = value.read()
-                    print value
-                if not isinstance(value, str):
-                    raise TypeError,'Unexpected unsaved file contents.'
-                unsaved_files_array[i].name = name
-                unsaved_files_array[i].contents = value
-                unsaved_files_array[i].length = len(value)
+            unsaved_files_array, keepalive = _unsaved_files_array(unsaved_files)
         ptr = conf.lib.clang_codeCompleteAt(self, path, line, column,
                 unsaved_files_array, len(unsaved_files), options)
         if ptr:
@@ -2930,6 +3135,9 @@ functionList = [
    Type,
    Type.from_result),
 
+  ("clang_getPresumedLocation",
+   [SourceLocation, POINTER(_CXString), POINTER(c_uint), POINTER(c_uint)]),
+
   ("clang_getRange",
    [SourceLocation, SourceLocation],
    SourceRange),
@@ -3135,7 +3343,31 @@ functionList = [
   ("clang_TextComment_getText",
    [Comment],
    _CXString,
-   _CXString.from_result)
+   _CXString.from_result),
+
+  ("clang_Cursor_getOffsetOfField",
+   [Cursor],
+   c_longlong),
+
+  ("clang_Cursor_isBitField",
+   [Cursor],
+   bool),
+
+  ("clang_getFieldDeclBitWidth",
+   [Cursor],
+   c_int),
+
+  ("clang_Type_getAlignOf",
+   [Type],
+   c_longlong),
+
+  ("clang_Type_getOffsetOf",
+   [Type, c_char_p],
+   c_longlong),
+
+  ("clang_Type_getSizeOf",
+   [Type],
+   c_longlong),
      
 ]
 
@@ -12,6 +12,7 @@ import sys
 import re
 
 import c_ast
+import macros
 
 from . import clang
 from .clang.cindex import CursorKind, TypeKind
@@ -45,6 +46,11 @@ def MAKE_NAME(name):
 
 WORDPAT = re.compile('^[a-zA-Z_][a-zA-Z0-9_]*$')
 
+# underlying types of enumerations that make them unsigned
+UNSIGNED_TYPE_KINDS = (TypeKind.CHAR_U, TypeKind.UCHAR, TypeKind.CHAR16,
+                       TypeKind.CHAR32, TypeKind.USHORT, TypeKind.UINT,
+                       TypeKind.ULONG, TypeKind.ULONGLONG, TypeKind.UINT128)
+
 
 def CHECK_NAME(name):
     """ Checks if `name` is a valid Python identifier. Returns
@@ -71,6 +77,13 @@ class ClangParser(object):
     #                       'OperatorFunction', 'Method', 'Constructor',
     #                       'Destructor', 'OperatorMethod'])
 
+    # The kinds of nodes that are part of the result. The interesting
+    # nodes are not necessarily all nodes, but rather the ones that may
+    # need to be modified by the transformations applied later on.
+    result_types = (c_ast.File, c_ast.Namespace, c_ast.Struct, c_ast.Union,
+                    c_ast.Enumeration, c_ast.Class, c_ast.Typedef,
+                    c_ast.Function, c_ast.Variable)
+
     def __init__(self, *args):
         # `context` acts like stack where parent nodes are pushed
         # before visiting children
@@ -82,11 +95,25 @@ class ClangParser(object):
         # hook up dependent nodes.
         self.all = {}
 
-        ## collected nodes in parse order
-        #self.nodes = []
+        # `order` lists the keys of the nodes in `all` that are part
+        # of the result, in the order they were first parsed. It is
+        # filled during the traversal by `record`.
+        self.order = []
+
+        # `stubs` maps the cursor hashes of C++ namespaces and classes
+        # that were recorded without descending into them to their
+        # cursors. They are expanded on demand, see `expand_stub`.
+        self.stubs = {}
 
-        # XXX - what does this do?
-        self.cpp_data = {}
+        # `main_files` and the `namespaces` allowlist decide which
+        # namespaces and classes are expanded right away.
+        self.main_files = []
+        self.namespaces = []
+
+        # `macro_definitions` collects the MACRO_DEFINITION cursors in
+        # the order they are visited. They are only reported by libclang
+        # when the detailed processing record is enabled.
+        self.macro_definitions = []
 
         # `cdata` is used as temporary storage while elements
         # are being processed.
@@ -98,32 +125,82 @@ class ClangParser(object):
     #--------------------------------------------------------------------------
     # Parsing entry points
     #--------------------------------------------------------------------------
-    def parse(self, cfile, include_dirs, language, unsaved_files=None):
+    def parse(self, cfile, include_dirs, language, unsaved_files=None,
+              export_macros=False, main_files=None, index=None,
+              namespaces=None):
         """ Parsing entry point. `cfile` is a filename or a file
         object.
 
+        A long-lived `index` can be passed in to avoid creating a new
+        one for every header.
+
+        `main_files` are the files that are being wrapped, by default
+        the parsed file itself. C++ namespaces and classes declared
+        elsewhere are only expanded when a parsed declaration refers
+        to them, or when their namespace is listed in `namespaces`.
+
+        If `export_macros` is True, the object-like macro constants
+        defined in `main_files` are added to the translation unit.
+        Only then does libclang have to keep a detailed preprocessing
+        record.
+
         """
         args_include_dirs = ['-I'+d for d in include_dirs]
         args_language = ['-x'+language if language else '']
+
+        options = clang.cindex.TranslationUnit.PARSE_INCOMPLETE + \
+            clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+        if export_macros:
+            options += clang.cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
                 
-        index = clang.cindex.Index.create()
+        if index is None:
+            index = clang.cindex.Index.create()
         tu = index.parse(cfile,
                          args = args_include_dirs + args_language, 
                          #args = ['-I/usr/include/c++/4.2.1',],
-                         options = clang.cindex.TranslationUnit.PARSE_INCOMPLETE + \
-                             clang.cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD + \
-                             clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES,
+                         options = options,
                          unsaved_files = unsaved_files
                          )
 
         for d in tu.diagnostics:
             self.print_diag_info(d)
+
+        if main_files is None:
+            main_files = [tu.spelling]
+        self.main_files = main_files
+        self.namespaces = namespaces or []
         
         #UGLY: first element is TRANSLATION_UNIT, parse children
-        self.parse_element(tu.cursor) 
+        container = self.parse_element(tu.cursor) 
         #for c in tu.cursor.get_children():
         #    self.parse_element(c)
 
+        if export_macros:
+            self.parse_macros(tu, container, main_files)
+
+        # the cursors must not outlive the translation unit
+        self.stubs.clear()
+
+    def parse_macros(self, tu, container, macro_files):
+        """ Adds the macro constants of `macro_files` to the members
+        of the translation unit `container`.
+
+        """
+        nodes = macros.extract_macro_constants(tu, self.macro_definitions,
+                                               macro_files, container)
+        for node in nodes:
+            container.add_member(node)
+            self.record(id(node), node)
+
+    def record(self, key, node):
+        """ Registers `node` under `key`. When a cursor is parsed a
+        second time, the new node takes the place of the old one.
+
+        """
+        if key not in self.all and isinstance(node, self.result_types):
+            self.order.append(key)
+        self.all[key] = node
+
 
     def print_diag_info(self, diag):
         print 'category name:', diag.category_name
@@ -170,8 +247,8 @@ class ClangParser(object):
         if kind in self.simple_types:
             const = t.is_const_qualified()
             volatile = t.is_volatile_qualified()
-            fundtype = c_ast.FundamentalType(self.simple_types[kind])
-            return c_ast.CvQualifiedType(fundtype, const, volatile), None
+            fundtype = c_ast.FundamentalType.intern(self.simple_types[kind])
+            return c_ast.CvQualifiedType.intern(fundtype, const, volatile), None
 
         elif kind is TypeKind.CONSTANTARRAY:
             a, foo = self.type_to_c_ast_type(t.element_type, level+1)
@@ -180,8 +257,8 @@ class ClangParser(object):
         elif kind is TypeKind.TYPEDEF:
             const = t.is_const_qualified()
             volatile = t.is_volatile_qualified()
-            fundtype = c_ast.FundamentalType(t.get_declaration().spelling)
-            return c_ast.CvQualifiedType(fundtype, const, volatile), None
+            fundtype = c_ast.FundamentalType.intern(t.get_declaration().spelling)
+            return c_ast.CvQualifiedType.intern(fundtype, const, volatile), None
 
         elif kind is TypeKind.POINTER:
             const = t.is_const_qualified()
@@ -198,13 +275,14 @@ class ClangParser(object):
 
         elif kind is TypeKind.ENUM:
             #see if declaration already parsed
-            typ = self.all.get(t.get_declaration().hash)
+            decl = t.get_declaration()
+            typ = self.lookup_declaration(decl, level)
             if typ is not None:
-                return typ, t.get_declaration().hash
+                return typ, decl.hash
             else:
                 level.show('enum declaration not yet parsed')
-                typ = self.parse_element(t.get_declaration(), level) #TODO ????
-                return typ, t.get_declaration().hash
+                typ = self.parse_declaration(decl, level) #TODO ????
+                return typ, decl.hash
 
         elif kind is TypeKind.FUNCTIONPROTO:
             level.show('return type:')
@@ -222,7 +300,7 @@ class ClangParser(object):
         
         else:
             level.show('do not know to handle type kind, search for declaration')
-            typ = self.all.get(t.get_declaration().hash)
+            typ = self.lookup_declaration(t.get_declaration(), level)
 
             #print 'in type_to_c_ast_type:'
             #print 'parsed type', typ
@@ -233,22 +311,30 @@ class ClangParser(object):
             else:
                 level.show("can't find declaration for type, parse type declaration", kind, t.get_declaration().kind)
                 #print
-                typ = self.parse_element(t.get_declaration(), level+1)
+                typ = self.parse_declaration(t.get_declaration(), level+1)
                 if typ is not None:
                     return typ, t.get_declaration().hash
                 else:
                     #raise Exception 
                     if kind is TypeKind.UNEXPOSED:
-                        return c_ast.FundamentalType('unexposed_type'), None
+                        return c_ast.FundamentalType.intern('unexposed_type'), None
 
                     level.show('give up, unknown_type')
-                    return c_ast.FundamentalType('unknown_type'), None #TODO: fixme
+                    return c_ast.FundamentalType.intern('unknown_type'), None #TODO: fixme
                 
         
 
     def parse_element(self, cursor, level = Level()):
         
         #level.show('file:', repr(cursor.location.file))
+        # newer libclang versions report cursors, mostly attributes like
+        # the __aligned__ of max_align_t in gcc's stddef.h, whose kinds
+        # these bindings don't know. They don't declare anything.
+        try:
+            cursor.kind
+        except ValueError:
+            return
+
         # ignore builtin nodes
         if cursor.location.file is None and cursor.kind is not CursorKind.TRANSLATION_UNIT:
             return
@@ -266,9 +352,12 @@ class ClangParser(object):
         if result is not None:
             location = cursor.location
             if location.file is not None:
-                result.location = (location.file.name, location.line)
+                # presumed locations follow line markers, so that
+                # preprocessed input is attributed to the original files
+                fname, line, column = location.presumed
+                result.location = (fname, line)
 
-            self.all[cursor.hash] = result
+            self.record(cursor.hash, result)
 
         #debug output
         if result is not None:
@@ -291,25 +380,22 @@ class ClangParser(object):
             CursorKind.FUNCTION_TEMPLATE,
             CursorKind.FIELD_DECL,
             CursorKind.PARM_DECL,
-            CursorKind.CONSTRUCTOR,
-            CursorKind.CXX_METHOD,
             # Functions handle their children (arguments) themselves and
             # not using the standard way of parsing. This make sense as
             # it can quite complex for function pointers (where some
             # arguments belong to the function declaration, some to the
-            # function prototype).
+            # function prototype). Methods and constructors are parsed
+            # by the same visitor.
             #CursorKind.FUNCTION_DECL,
+            #CursorKind.CONSTRUCTOR,
+            #CursorKind.CXX_METHOD,
                            ]:
-            self.context.append(result)
-
-            for c in cursor.get_children():
-                child = self.parse_element(c, level+1)
-                if child is not None and hasattr(result, 'add_child'):
-                    result.add_child(child)
-                
-            # if this element has subelements, then it will have
-            # been push onto the stack and needs to be removed.
-            self.context.pop()
+            if result is not None and cursor.kind in self.lazy_kinds and \
+                    not self.expand_now(cursor):
+                # only record a stub, see expand_stub
+                self.stubs[cursor.hash] = cursor
+            else:
+                self.parse_children(cursor, result, level)
 
         self.cdata = None
         
@@ -322,7 +408,134 @@ class ClangParser(object):
         return result
 
 
-    
+
+    def parse_children(self, cursor, result, level):
+        self.context.append(result)
+
+        for c in cursor.get_children():
+            child = self.parse_element(c, level+1)
+            if child is not None and hasattr(result, 'add_child'):
+                result.add_child(child)
+
+        # if this element has subelements, then it will have
+        # been push onto the stack and needs to be removed.
+        self.context.pop()
+
+    #--------------------------------------------------------------------------
+    # Lazy expansion of C++ namespaces and classes
+    #--------------------------------------------------------------------------
+    # Descending into everything a C++ header includes would convert all
+    # of the standard library. Namespaces and classes from other files are
+    # recorded as stubs instead and expanded when they are referenced.
+    lazy_kinds = (CursorKind.NAMESPACE, CursorKind.CLASS_DECL,
+                  CursorKind.CLASS_TEMPLATE)
+
+    def expand_now(self, cursor):
+        """ Whether the namespace or class `cursor` is descended into
+        when it is visited.
+
+        """
+        fname = cursor.location.presumed[0]
+        if macros.file_selected(fname, self.main_files):
+            return True
+        parent = self.context[-1]
+        if cursor.kind is CursorKind.NAMESPACE:
+            name = self.qualified_name(cursor)
+            if self.namespace_allowed(name):
+                return True
+            # enclosing namespaces of allowed ones have to be searched
+            for allowed in self.namespaces:
+                if allowed.startswith(name + '::'):
+                    return True
+            return False
+        if isinstance(parent, c_ast.Namespace):
+            return self.namespace_allowed(
+                self.qualified_name(cursor.semantic_parent))
+        # nested classes are expanded along with their class
+        return not isinstance(parent, c_ast.File)
+
+    def namespace_allowed(self, name):
+        for allowed in self.namespaces:
+            if name == allowed or name.startswith(allowed + '::'):
+                return True
+        return False
+
+    def qualified_name(self, cursor):
+        names = []
+        while cursor is not None and \
+                cursor.kind is not CursorKind.TRANSLATION_UNIT:
+            names.append(cursor.spelling or '')
+            cursor = cursor.semantic_parent
+        return '::'.join(reversed(names))
+
+    def expand_stub(self, key, level):
+        """ Parses the children of the stub recorded for `key`.
+
+        """
+        cursor = self.stubs.pop(key)
+        level.show('expand stub', cursor.kind, repr(cursor.spelling))
+        self.parse_children(cursor, self.all[key], level)
+
+    def lookup_declaration(self, cursor, level):
+        """ Returns the node of an already parsed declaration, expanding
+        the body of a stubbed class that is referenced for the first time.
+
+        """
+        key = cursor.hash
+        node = self.all.get(key)
+        if key in self.stubs and cursor.kind is not CursorKind.NAMESPACE:
+            self.expand_stub(key, level)
+        return node
+
+    def parse_declaration(self, cursor, level):
+        """ Parses a declaration that is referenced before it has been
+        visited. A declaration inside a stub, e.g. of a namespace that
+        has not been expanded, is parsed in the context of that stub.
+
+        """
+        parent = self.stub_context(cursor.semantic_parent, level)
+        if parent is None:
+            return self.parse_element(cursor, level)
+        if cursor.hash in self.all:
+            # expanding a class stub may have parsed it already
+            return self.all[cursor.hash]
+        self.context.append(parent)
+        node = self.parse_element(cursor, level)
+        self.context.pop()
+        if node is not None and hasattr(parent, 'add_member'):
+            parent.add_member(node)
+        # a class is referenced here, so its body is needed
+        if cursor.hash in self.stubs and cursor.kind is not CursorKind.NAMESPACE:
+            self.expand_stub(cursor.hash, level)
+        return node
+
+    def stub_context(self, cursor, level):
+        """ Returns the stub node for the namespace or class `cursor`,
+        creating stubs for it and the enclosing namespaces as needed.
+        Returns None if `cursor` is not within a stub.
+
+        """
+        if cursor is None or cursor.kind not in self.lazy_kinds:
+            return None
+        key = cursor.hash
+        if key in self.stubs:
+            if cursor.kind is not CursorKind.NAMESPACE:
+                self.expand_stub(key, level)
+            return self.all[key]
+        if key in self.all:
+            # an expanded namespace or class
+            return None
+        parent = self.stub_context(cursor.semantic_parent, level)
+        if parent is None:
+            return None
+        # a namespace or class within a stub that was never visited
+        self.context.append(parent)
+        node = self.parse_element(cursor, level)
+        self.context.pop()
+        if node is not None and hasattr(parent, 'add_member'):
+            parent.add_member(node)
+        return node
+
     def unhandled_element(self, cursor, level):
         """ Handler for element nodes where a real handler is not
          found.
@@ -404,6 +617,19 @@ class ClangParser(object):
     #     name = attrs['name']
     #     self.cpp_data[name] = self.cdata = []
  
+    #--------------------------------------------------------------------------
+    # Preprocessing handlers
+    #--------------------------------------------------------------------------
+    def visit_MACRO_DEFINITION(self, cursor, level):
+        """ Macro definitions are collected and converted in bulk
+        after the translation unit has been traversed.
+
+        """
+        self.macro_definitions.append(cursor)
+
+    visit_MACRO_INSTANTIATION = lambda *args: None
+    visit_INCLUSION_DIRECTIVE = lambda *args: None
+
     #--------------------------------------------------------------------------
     # Node element handlers
     #--------------------------------------------------------------------------
@@ -422,8 +648,8 @@ class ClangParser(object):
             
             #special handling of typedef enum, struct, union
             if type(c_ast_type) in (c_ast.Enumeration, c_ast.Union, c_ast.Struct):
-                # If the underlying typedef type doesn't have a name, add a
-                # new field called `typedef_name` with the name of the typedef.
+                # If the underlying typedef type doesn't have a name, set
+                # its `typedef_name` to the name of the typedef.
                 # This happens e.g. when there's a struct that doesn't
                 # contain a tag name. Having a name is needed for proper
                 # flattening
@@ -433,9 +659,8 @@ class ClangParser(object):
                     #unnamed record -> remove declaration from self.all 
                     level.show('remove declaration', c_ast_type, self.all[id_])
                     try:
-                        idx = c_ast_type.context.members.index(c_ast_type)
-                        level.show('remove from parent, idx', idx)
-                        c_ast_type.context.members.pop(idx)
+                        c_ast_type.context.remove_member(c_ast_type)
+                        level.show('removed from parent', c_ast_type.context)
                     except ValueError:
                         level.show("not contained in parent", c_ast_type)
 
@@ -445,34 +670,55 @@ class ClangParser(object):
             
             return c_ast.Typedef(cursor.spelling, c_ast_type, None)
         
+    def type_layout(self, t):
+        #size and alignment of a type in bytes, None if not known (e.g.
+        #for incomplete or dependent types)
+        size = t.get_size()
+        align = t.get_align()
+        return (size if size >= 0 else None, align if align >= 0 else None)
+
     def visit_STRUCT_DECL(self, cursor, level):
         name = cursor.spelling
-        s = c_ast.Struct(name, context = self.context[-1], members = [])
+        size, align = self.type_layout(cursor.type)
+        s = c_ast.Struct(name, context = self.context[-1], members = [],
+                         size = size, align = align)
         return s
 
     def visit_UNION_DECL(self, cursor, level):
         name = cursor.spelling
-        return c_ast.Union(name, context = self.context[-1])
+        size, align = self.type_layout(cursor.type)
+        return c_ast.Union(name, context = self.context[-1], size = size,
+                           align = align)
 
     def visit_FIELD_DECL(self, cursor, level):
         # If a field has struct as a child, use the field name as the
         # structs name (in case it hasn't one). This way anonymous structs
-        # and unions get a proper mangled name for Cython.
-        children = list(cursor.get_children())
-        if len(children) == 1 and children[0].kind in \
-                [CursorKind.STRUCT_DECL, CursorKind.UNION_DECL]:
-            node = self.all[children[0].hash]
-            if not node.name:
+        # and unions get a proper mangled name for Cython. The struct
+        # need not be the only child: the size expression of an array
+        # of anonymous structs, `struct {...} arr[N]`, is a child too.
+        # A struct that wasn't recorded keeps its name.
+        decl = cursor.find_first([CursorKind.STRUCT_DECL,
+                                  CursorKind.UNION_DECL])
+        if decl is not None:
+            node = self.all.get(decl.hash)
+            if node is not None and not node.name:
                 node.name = cursor.spelling
         parent = self.context[-1]
         name = cursor.spelling
         c_ast_type, id_ = self.type_to_c_ast_type(cursor.type, level)
-        member = c_ast.Field(name, c_ast_type, context = parent)
+        offset = cursor.get_field_offsetof()
+        if offset < 0:
+            offset = None
+        bits = cursor.get_bitfield_width() if cursor.is_bitfield() else None
+        member = c_ast.Field(name, c_ast_type, context = parent, bits = bits,
+                             offset = offset)
         return member
             
     def visit_ENUM_DECL(self, cursor, level):
         name = cursor.spelling
-        return c_ast.Enumeration(name, self.context[-1])
+        size, align = self.type_layout(cursor.type)
+        signed = cursor.enum_type.kind not in UNSIGNED_TYPE_KINDS
+        return c_ast.Enumeration(name, self.context[-1], size, align, signed)
 
     def visit_ENUM_CONSTANT_DECL(self, cursor, level):
         name = cursor.spelling
@@ -515,13 +761,15 @@ class ClangParser(object):
         return arg
         
     def repair_type(self, obj, name):
-        #repair type of c_ast object
+        #repair type of c_ast object, returns the repaired object
+        #(fundamental types are interned and replaced, not modified)
         if isinstance(obj, c_ast.FundamentalType):
-            obj.name = name
+            return c_ast.FundamentalType.intern(name)
         elif isinstance(obj, (c_ast.Field, c_ast.PointerType, c_ast.ArrayType, c_ast.RefType, c_ast.Argument)):
-            self.repair_type(obj.typ, name)
+            obj.typ = self.repair_type(obj.typ, name)
         elif isinstance(obj, (c_ast.Function, c_ast.FunctionType, c_ast.OperatorFunction)):
-            self.repair_type(obj.returns, name)
+            obj.returns = self.repair_type(obj.returns, name)
+        return obj
 
     def visit_TYPE_REF(self, cursor, level):
         typ, id = self.type_to_c_ast_type(cursor.type, level)
@@ -775,60 +1023,14 @@ class ClangParser(object):
     #--------------------------------------------------------------------------
     # Post parsing helpers
     #--------------------------------------------------------------------------
-    def get_macros(self, text):
-        """ Attempts to extract the macros from a piece of text
-        and converts it to a Macro node containing the name,
-        args, and body.  
-
-        """
-        if text is None:
-            return
-        
-        # join and split so we can accept a list or  string. 
-        text = ''.join(text)
-        for m in text.splitlines():
-            name, body = m.split(None, 1)
-            name, args = name.split('(', 1)
-            args = '(%s' % args
-            self.all[name] = c_ast.Macro(name, args, body)
-
-    def get_aliases(self, text, namespace):
-        """ Attemps to extract defined aliases of the form
-        #define A B and store them in an Alias node.
-
-        """
-        if text is None:
-            return
-        
-        aliases = {}
-        text = ''.join(text)
-        for a in text.splitlines():
-            name, value = a.split(None, 1)
-            a = c_ast.Alias(name, value)
-            aliases[name] = a
-            self.all[name] = a
-
-        # The alias value will be located in the namespace,
-        # or the aliases. Otherwise, it's unfound.
-        for name, a in aliases.items():
-            value = a.value
-            if value in namespace:
-                a.typ = namespace[value]
-            elif value in aliases:
-                a.typ = aliases[value]
-            else:
-                pass
-
     def get_result(self):
         """ After parsing, call this method to retrieve the results
-        as a list of AST nodes. This list will contain *all* nodes
-        in the xml file which will include a bunch of builtin and 
-        internal stuff that you wont want.
+        as a list of AST nodes in parse order. This list will contain
+        *all* nodes in the translation unit which will include a bunch
+        of builtin and internal stuff that you wont want.
 
         """
-        
-        # Gather any macros.
-        self.get_macros(self.cpp_data.get('functions'))
+
 
         # Walk through all the items, hooking up the appropriate 
         # links by replacing the id tags with the actual objects
@@ -855,40 +1057,27 @@ class ClangParser(object):
         # for n in remove:
         #     del self.all[n]
                
-        # sub out any #define'd aliases and collect all the nodes 
-        # we're interested in. The interesting nodes are not necessarily
-        # all nodes, but rather the ones that may need to be modified
-        # by the transformations applied later on.
-        interesting = (c_ast.Typedef, c_ast.Struct, c_ast.Enumeration, 
-                       c_ast.Union, c_ast.Function, c_ast.Variable, 
-                       c_ast.Namespace, c_ast.File,
-                       c_ast.Class,
-                       )
-
-        result = []
-        namespace = {}
-        for node in self.all.values():
-        #for node in self.nodes: #traverse results in parse order
-            if not isinstance(node, interesting):
-                continue
-            name = getattr(node, 'name', None)
-            if name is not None:
-                namespace[name] = node
-            result.append(node)
-        self.get_aliases(self.cpp_data.get('aliases'), namespace)
-        
-        return result
+        # the interesting nodes were collected in parse order by `record`
+        return [self.all[key] for key in self.order]
 
 
 # `cfile` can be a 2-tuple with a virtual file name and the file contents.
 # The contents can either be a string or a file-like object (with a read()
 # method).
-def parse(cfile, include_dirs, language):
+#
+# `export_macros`, `main_files`, `index` and `namespaces` are passed to
+# ClangParser.parse.
+def parse(cfile, include_dirs, language, export_macros=False, main_files=None,
+          index=None, namespaces=None):
     parser = ClangParser()
     if isinstance(cfile, list):
-        parser.parse(cfile[0][0], include_dirs, language, unsaved_files=cfile)
+        parser.parse(cfile[0][0], include_dirs, language, unsaved_files=cfile,
+                     export_macros=export_macros, main_files=main_files,
+                     index=index, namespaces=namespaces)
     else:
-        parser.parse(cfile, include_dirs, language)
+        parser.parse(cfile, include_dirs, language,
+                     export_macros=export_macros, main_files=main_files,
+                     index=index, namespaces=namespaces)
 
     print 'all:'
     for a in parser.all:
@@ -0,0 +1,254 @@
+#------------------------------------------------------------------------------
+# NumPy dtypes for the structs and unions of a header
+#------------------------------------------------------------------------------
+# Generates the source of a companion module with a `numpy.dtype` for
+# every struct and union whose layout is known. The dtypes use the
+# offsets and sizes computed by libclang, padding included, so that C
+# arrays of these records can be viewed as NumPy record arrays without
+# copying. Fields are given as native type codes ('i' is a C int, 'l'
+# a C long, ...), which NumPy resolves for the platform at import time.
+import keyword
+
+from ... import version
+
+# Local package imports
+import c_ast
+import macros
+
+
+MODULE_HEADER = """\
+# This code was automatically generated by CWrap version %s
+#
+# NumPy dtypes with the memory layout of the structs and unions of
+# "%%s". Bitfields can't be represented and are left out; their bits
+# are part of the padding.
+
+import numpy
+
+""" % version.version()
+
+
+# type codes of the fundamental types
+FUNDAMENTAL_CODES = {
+    'bint': '?',
+    'char': 'S1',
+    'signed char': 'b',
+    'unsigned char': 'B',
+    'short': 'h',
+    'unsigned short': 'H',
+    'int': 'i',
+    'unsigned int': 'I',
+    'long': 'l',
+    'unsigned long': 'L',
+    'long long': 'q',
+    'unsigned long long': 'Q',
+    'float': 'f',
+    'double': 'd',
+    'long double': 'g',
+}
+
+# typedefs from the standard headers, which are usually not part of the
+# parsed items
+STANDARD_TYPEDEFS = {
+    'int8_t': 'i1', 'uint8_t': 'u1',
+    'int16_t': 'i2', 'uint16_t': 'u2',
+    'int32_t': 'i4', 'uint32_t': 'u4',
+    'int64_t': 'i8', 'uint64_t': 'u8',
+    'intptr_t': 'p', 'uintptr_t': 'P',
+    'ptrdiff_t': 'p', 'ssize_t': 'p', 'size_t': 'P',
+}
+
+
+# names that can't be assigned to in the generated module, besides the
+# keywords
+RESERVED_NAMES = set(['None', 'True', 'False', 'numpy'])
+
+
+def identifier(name):
+    """ Returns the name of the dtype of the C type `name` in the
+    generated module. Keywords and reserved names get a trailing
+    underscore.
+
+    """
+    if keyword.iskeyword(name) or name in RESERVED_NAMES:
+        return name + '_'
+    return name
+
+
+class UnknownLayout(Exception):
+    """ Raised for types that have no dtype equivalent or whose
+    layout is not known.
+
+    """
+    pass
+
+
+class DtypeGenerator(object):
+    """ Generates the dtype module for a list of toplevel c_ast items,
+    i.e. the items that are passed to the CAstTransformer.
+
+    """
+    def __init__(self, items):
+        self.items = items
+        self.typedefs = {}
+        for item in items:
+            if isinstance(item, c_ast.Typedef):
+                self.typedefs[item.name] = item.typ
+        # record node -> name of its dtype, None while being emitted
+        self.names = {}
+        self.lines = []
+
+    def generate(self, header_name):
+        # only the records of the header itself, and those they need,
+        # not everything it includes
+        items = [item for item in self.items if item.location is None or
+                 macros.file_selected(item.location[0], [header_name])]
+        for item in items:
+            # anonymous typedef'd records are only found through
+            # their typedef
+            if isinstance(item, c_ast.Typedef):
+                item = item.typ
+            if isinstance(item, (c_ast.Struct, c_ast.Union)):
+                self.emit_record(item)
+        for item in items:
+            if isinstance(item, c_ast.Typedef):
+                self.emit_alias(item)
+        return (MODULE_HEADER % header_name) + '\n'.join(self.lines) + '\n'
+
+    #--------------------------------------------------------------------------
+    # Records
+    #--------------------------------------------------------------------------
+    def record_name(self, record):
+        return identifier(record.name or record.typedef_name or '')
+
+    def emit_record(self, record):
+        """ Emits the dtype of `record` after the dtypes it depends on.
+        Returns the name of the dtype, or None if the record has no
+        known layout.
+
+        """
+        if record in self.names:
+            return self.names[record]
+        name = self.record_name(record)
+        if not name or record.size is None or not record.members:
+            self.names[record] = None
+            return None
+
+        self.names[record] = None
+        names = []
+        formats = []
+        offsets = []
+        skipped = []
+        try:
+            for field in record.members:
+                if not isinstance(field, c_ast.Field):
+                    continue
+                if field.bits is not None:
+                    skipped.append('%s: %d bits at bit %s' % (field.name,
+                                   field.bits, field.offset))
+                    continue
+                if field.offset is None or field.offset % 8:
+                    raise UnknownLayout('offset of %s' % field.name)
+                names.append(field.name)
+                formats.append(self.format(field.typ))
+                offsets.append(field.offset // 8)
+        except UnknownLayout, e:
+            self.lines.append('# %s: unknown layout (%s)\n' % (name, e))
+            return None
+
+        lines = self.lines
+        for info in skipped:
+            lines.append('# %s.%s' % (name, info))
+        lines.append('%s = numpy.dtype({' % name)
+        lines.append('    \'names\': [%s],' % ', '.join(repr(n) for n in names))
+        lines.append('    \'formats\': [%s],' % ', '.join(formats))
+        lines.append('    \'offsets\': [%s],' % ', '.join(str(o) for o in offsets))
+        lines.append('    \'itemsize\': %d,' % record.size)
+        lines.append('})')
+        lines.append('')
+        self.names[record] = name
+        return name
+
+    def emit_alias(self, typedef):
+        typ = typedef.typ
+        if isinstance(typ, (c_ast.Struct, c_ast.Union)):
+            name = self.names.get(typ)
+            alias = identifier(typedef.name)
+            if name is not None and name != alias:
+                self.lines.append('%s = %s' % (alias, name))
+
+    #--------------------------------------------------------------------------
+    # Field types
+    #--------------------------------------------------------------------------
+    def format(self, typ):
+        """ Returns the source of the dtype format of a field type.
+
+        """
+        if isinstance(typ, c_ast.ArrayType):
+            shape = []
+            while isinstance(typ, c_ast.ArrayType):
+                dim = typ.max - typ.min + 1
+                if dim <= 0:
+                    raise UnknownLayout('flexible array member')
+                shape.append(dim)
+                typ = self.resolve(typ.typ)
+            item = self.format(typ)
+            if item == repr('S1'):
+                # char arrays are strings
+                item = repr('S%d' % shape.pop())
+                if not shape:
+                    return item
+            return '(%s, %r)' % (item, tuple(shape))
+
+        typ = self.resolve(typ)
+        if isinstance(typ, c_ast.FundamentalType):
+            code = FUNDAMENTAL_CODES.get(typ.name)
+            if code is None:
+                code = STANDARD_TYPEDEFS.get(typ.name)
+            if code is None:
+                raise UnknownLayout('type %s' % typ.name)
+            return repr(code)
+        if isinstance(typ, (c_ast.PointerType, c_ast.FunctionType)):
+            return repr('P')
+        if isinstance(typ, c_ast.Enumeration):
+            if typ.signed is False:
+                if typ.size is None:
+                    return repr('I')
+                return repr('u%d' % typ.size)
+            if typ.size is None:
+                return repr('i')
+            return repr('i%d' % typ.size)
+        if isinstance(typ, (c_ast.Struct, c_ast.Union)):
+            name = self.emit_record(typ)
+            if name is None:
+                raise UnknownLayout('%s %s' % (typ.__class__.__name__.lower(),
+                                               self.record_name(typ)))
+            return name
+        raise UnknownLayout(typ.__class__.__name__)
+
+    def resolve(self, typ):
+        """ Strips qualifiers and typedefs. Typedef'd types are
+        referenced by name in the clang frontend, see
+        `ClangParser.type_to_c_ast_type`.
+
+        """
+        seen = set()
+        while True:
+            if isinstance(typ, c_ast.CvQualifiedType):
+                typ = typ.typ
+            elif isinstance(typ, c_ast.Typedef):
+                typ = typ.typ
+            elif isinstance(typ, c_ast.FundamentalType) and \
+                    typ.name in self.typedefs and typ.name not in seen:
+                seen.add(typ.name)
+                typ = self.typedefs[typ.name]
+            else:
+                return typ
+
+
+def generate_dtype_module(items, header_name):
+    """ Returns the source of a module with the NumPy dtypes of the
+    structs and unions among the toplevel c_ast `items`.
+
+    """
+    return DtypeGenerator(items).generate(header_name)
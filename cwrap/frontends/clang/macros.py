@@ -0,0 +1,560 @@
+#------------------------------------------------------------------------------
+# Extraction of object-like macro constants for the libclang frontend
+#------------------------------------------------------------------------------
+import os
+import re
+
+import c_ast
+
+from .clang.cindex import SourceRange, TokenGroup
+
+
+# Spellings of builtin types which may appear in a cast inside a
+# macro body, e.g. `#define FLAG ((unsigned long)1 << 3)`.
+CAST_KEYWORDS = set(['char', 'short', 'int', 'long', 'signed', 'unsigned',
+                     'float', 'double', 'const', 'volatile'])
+
+FLOAT_KEYWORDS = set(['float', 'double'])
+
+# Binary operators and their precedence, as in C.
+BINARY_OPERATORS = {'||': 1, '&&': 2, '|': 3, '^': 4, '&': 5,
+                    '==': 6, '!=': 6,
+                    '<': 7, '>': 7, '<=': 7, '>=': 7,
+                    '<<': 8, '>>': 8,
+                    '+': 9, '-': 9,
+                    '*': 10, '/': 10, '%': 10}
+
+STRING_PREFIX = re.compile(r'^(u8|u|U|L)?"')
+
+CHAR_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0', 'a': '\a',
+                'b': '\b', 'f': '\f', 'v': '\v', '\\': '\\', "'": "'",
+                '"': '"', '?': '?'}
+
+
+class MacroError(Exception):
+    """ Raised when a macro body is not a constant expression that
+    can be evaluated.
+
+    """
+    pass
+
+
+class Unsigned(long):
+    """ An integer of an unsigned C type that is `bits` wide. The value
+    wraps around like in C.
+
+    """
+    def __new__(cls, value, bits=32):
+        self = long.__new__(cls, value & ((1 << bits) - 1))
+        self.bits = bits
+        return self
+
+
+def unsigned_bits(*values):
+    """ Returns the width of the widest unsigned value, or 0 if none
+    of them is unsigned.
+
+    """
+    return max([value.bits for value in values
+                if isinstance(value, Unsigned)] or [0])
+
+
+class MacroConstant(object):
+    """ The classified value of an object-like macro. `kind` is one
+    of 'int', 'float' or 'str'.
+
+    """
+    def __init__(self, name, kind, value, location):
+        self.name = name
+        self.kind = kind
+        self.value = value
+        self.location = location
+
+
+def file_selected(filename, selected):
+    """ Returns True when `filename` is one of the `selected` paths.
+    A selected entry matches either the full path or a trailing part
+    of it, so that `foo/bar.h` selects `/usr/include/foo/bar.h`.
+
+    """
+    if filename is None:
+        return False
+    for path in selected:
+        if filename == path or filename.endswith(os.sep + path.lstrip(os.sep)):
+            return True
+    return False
+
+
+#------------------------------------------------------------------------------
+# Literal parsing
+#------------------------------------------------------------------------------
+def parse_char(text):
+    """ Converts a C character literal such as 'a' or '\\n' to its
+    integer value.
+
+    """
+    body = text[text.index("'") + 1:-1]
+    if body.startswith('\\'):
+        esc = body[1:]
+        if esc[:1] in ('x', 'X'):
+            return int(esc[1:], 16)
+        if esc[:1].isdigit():
+            return int(esc, 8)
+        if esc in CHAR_ESCAPES:
+            return ord(CHAR_ESCAPES[esc])
+        raise MacroError('unknown escape in %s' % text)
+    if len(body) != 1:
+        raise MacroError('multi-character constant %s' % text)
+    return ord(body)
+
+
+def parse_number(text):
+    """ Converts a C numeric literal (with optional suffixes) into a
+    Python int or float. Literals with a `u` suffix, and hex or octal
+    literals that only fit an unsigned type, are Unsigned.
+
+    """
+    lower = text.lower()
+    if lower.startswith('0x') and 'p' in lower:
+        return float.fromhex(lower.rstrip('fl'))
+    if not lower.startswith('0x') and ('.' in lower or 'e' in lower):
+        return float(lower.rstrip('fl'))
+    digits = lower.rstrip('ul')
+    suffix = lower[len(digits):]
+    if digits.startswith('0x'):
+        value, based = int(digits[2:], 16), True
+    elif digits.startswith('0b'):
+        value, based = int(digits[2:], 2), True
+    elif len(digits) > 1 and digits.startswith('0'):
+        value, based = int(digits, 8), True
+    else:
+        value, based = int(digits), False
+    bits = 64 if 'l' in suffix or value >= 2**32 else 32
+    if 'u' in suffix or (based and value >= 2**(bits - 1)):
+        return Unsigned(value, bits)
+    return value
+
+
+def c_div(a, b, op):
+    """ Division and modulo with C semantics (truncation toward zero
+    for integers).
+
+    """
+    if b == 0:
+        raise MacroError('division by zero')
+    if isinstance(a, float) or isinstance(b, float):
+        if op == '%':
+            raise MacroError('floating point modulo')
+        return a / b
+    q = abs(a) // abs(b)
+    if (a < 0) != (b < 0):
+        q = -q
+    if op == '/':
+        return q
+    return a - q * b
+
+
+#------------------------------------------------------------------------------
+# Expression evaluation
+#------------------------------------------------------------------------------
+class MacroEvaluator(object):
+    """ Evaluates the token list of a macro body. Identifiers are
+    resolved through `lookup`, a callable that returns the
+    MacroConstant of another macro or None.
+
+    """
+    def __init__(self, tokens, lookup):
+        # tokens is a list of (kind name, spelling) pairs, i.e. the
+        # tokens of `macro_tokens` without their offsets
+        self.tokens = tokens
+        self.pos = 0
+        self.lookup = lookup
+
+    def evaluate(self):
+        """ Returns a (kind, value) pair for the whole token list.
+
+        """
+        if not self.tokens:
+            raise MacroError('empty macro body')
+        if all(self.is_string(tok) for tok in self.tokens):
+            return self.evaluate_string()
+        value = self.conditional()
+        if self.pos != len(self.tokens):
+            raise MacroError('trailing tokens')
+        if isinstance(value, float):
+            return 'float', value
+        return 'int', value
+
+    def is_string(self, tok):
+        kind, spelling = tok
+        if kind == 'LITERAL':
+            return STRING_PREFIX.match(spelling) is not None
+        if kind == 'IDENTIFIER':
+            const = self.lookup(spelling)
+            return const is not None and const.kind == 'str'
+        return False
+
+    def evaluate_string(self):
+        # adjacent string literals (and string macros) are concatenated
+        parts = []
+        for kind, spelling in self.tokens:
+            if kind == 'IDENTIFIER':
+                parts.append(self.lookup(spelling).value)
+            else:
+                parts.append(spelling[spelling.index('"') + 1:-1])
+        return 'str', ''.join(parts)
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def next(self):
+        tok = self.peek()
+        if tok[0] is None:
+            raise MacroError('unexpected end of macro')
+        self.pos += 1
+        return tok
+
+    def expect(self, spelling):
+        if self.next()[1] != spelling:
+            raise MacroError('expected %r' % spelling)
+
+    def conditional(self):
+        cond = self.binary(1)
+        if self.peek()[1] == '?':
+            self.next()
+            true_value = self.conditional()
+            self.expect(':')
+            false_value = self.conditional()
+            if cond:
+                return true_value
+            return false_value
+        return cond
+
+    def binary(self, min_prec):
+        lhs = self.unary()
+        while True:
+            op = self.peek()[1]
+            prec = BINARY_OPERATORS.get(op)
+            if prec is None or prec < min_prec:
+                return lhs
+            self.next()
+            rhs = self.binary(prec + 1)
+            lhs = self.apply(op, lhs, rhs)
+
+    def apply(self, op, a, b):
+        if op in ('<<', '>>', '&', '|', '^') and \
+                (isinstance(a, float) or isinstance(b, float)):
+            raise MacroError('bitwise operation on float')
+        if op in ('<<', '>>'):
+            # the type of a shift is the type of its left operand
+            if b < 0:
+                raise MacroError('negative shift count')
+            if op == '<<':
+                value = a << b
+            else:
+                value = a >> b
+            if isinstance(a, Unsigned):
+                return Unsigned(value, a.bits)
+            return value
+        bits = unsigned_bits(a, b)
+        if not bits or isinstance(a, float) or isinstance(b, float):
+            return self.compute(op, a, b)
+        # the signed operand is converted to unsigned, as in C
+        value = self.compute(op, Unsigned(a, bits), Unsigned(b, bits))
+        if op in ('+', '-', '*', '/', '%', '&', '|', '^'):
+            return Unsigned(value, bits)
+        return value
+
+    def compute(self, op, a, b):
+        if op in ('/', '%'):
+            return c_div(a, b, op)
+        if op == '||':
+            return int(bool(a) or bool(b))
+        if op == '&&':
+            return int(bool(a) and bool(b))
+        if op == '+':
+            return a + b
+        if op == '-':
+            return a - b
+        if op == '*':
+            return a * b
+        if op == '&':
+            return a & b
+        if op == '|':
+            return a | b
+        if op == '^':
+            return a ^ b
+        if op == '==':
+            return int(a == b)
+        if op == '!=':
+            return int(a != b)
+        if op == '<':
+            return int(a < b)
+        if op == '>':
+            return int(a > b)
+        if op == '<=':
+            return int(a <= b)
+        return int(a >= b)
+
+    def unary(self):
+        kind, spelling = self.peek()
+        if spelling == '-':
+            self.next()
+            value = self.unary()
+            if isinstance(value, Unsigned):
+                return Unsigned(-value, value.bits)
+            return -value
+        if spelling == '+':
+            self.next()
+            return self.unary()
+        if spelling == '~':
+            self.next()
+            value = self.unary()
+            if isinstance(value, float):
+                raise MacroError('bitwise operation on float')
+            if isinstance(value, Unsigned):
+                return Unsigned(~value, value.bits)
+            return ~value
+        if spelling == '!':
+            self.next()
+            return int(not self.unary())
+        if spelling == '(':
+            cast = self.cast_keywords()
+            if cast is not None:
+                value = self.unary()
+                if cast & FLOAT_KEYWORDS:
+                    return float(value)
+                if 'unsigned' in cast:
+                    if 'long' in cast:
+                        return Unsigned(value, 64)
+                    if not cast & set(['char', 'short']):
+                        return Unsigned(value, 32)
+                return int(value)
+            self.next()
+            value = self.conditional()
+            self.expect(')')
+            return value
+        return self.primary()
+
+    def cast_keywords(self):
+        """ If the tokens at the current position form a cast to a
+        builtin type, consume them and return the set of keywords.
+
+        """
+        keywords = set()
+        pos = self.pos + 1
+        while pos < len(self.tokens):
+            kind, spelling = self.tokens[pos]
+            if kind == 'KEYWORD' and spelling in CAST_KEYWORDS:
+                keywords.add(spelling)
+                pos += 1
+            elif spelling == ')' and keywords:
+                self.pos = pos + 1
+                return keywords
+            else:
+                return None
+        return None
+
+    def primary(self):
+        kind, spelling = self.next()
+        if kind == 'LITERAL':
+            if spelling.startswith("'") or spelling[1:2] == "'":
+                return parse_char(spelling)
+            if STRING_PREFIX.match(spelling):
+                raise MacroError('string in arithmetic expression')
+            try:
+                return parse_number(spelling)
+            except ValueError:
+                raise MacroError('bad number %s' % spelling)
+        if kind == 'IDENTIFIER':
+            const = self.lookup(spelling)
+            if const is None or const.kind == 'str':
+                raise MacroError('unknown identifier %s' % spelling)
+            return const.value
+        raise MacroError('unexpected token %r' % spelling)
+
+
+#------------------------------------------------------------------------------
+# Token extraction
+#------------------------------------------------------------------------------
+def token_offset(token):
+    return token.location.offset
+
+
+def macro_tokens(tu, cursors):
+    """ Tokenises a list of MACRO_DEFINITION cursors from the same file
+    with a single call to clang_tokenize and distributes the tokens to
+    the macros by their offsets. Returns a list of token lists, one per
+    cursor, where every token is a (kind name, spelling, offset)
+    triple.
+
+    """
+    if not cursors:
+        return []
+    extents = [(c.extent.start.offset, c.extent.end.offset) for c in cursors]
+    order = sorted(range(len(cursors)), key=lambda i: extents[i][0])
+    first, last = cursors[order[0]], cursors[order[-1]]
+    extent = SourceRange.from_locations(first.extent.start, last.extent.end)
+
+    result = [[] for c in cursors]
+    idx = 0
+    for token in TokenGroup.get_tokens(tu, extent):
+        offset = token_offset(token)
+        # skip macros that end before this token
+        while idx < len(order) and extents[order[idx]][1] < offset:
+            idx += 1
+        if idx == len(order):
+            break
+        start, end = extents[order[idx]]
+        if start <= offset <= end:
+            result[order[idx]].append((token.kind.name, token.spelling,
+                                       offset))
+    return result
+
+
+def is_function_like(tokens):
+    """ A macro is function-like when its name is immediately followed
+    by an opening parenthesis.
+
+    """
+    if len(tokens) < 2:
+        return False
+    name_kind, name, name_offset = tokens[0]
+    kind, spelling, offset = tokens[1]
+    return spelling == '(' and offset == name_offset + len(name)
+
+
+class MacroTable(object):
+    """ Collects the MACRO_DEFINITION cursors of a translation unit and
+    classifies the object-like ones as integer, float or string
+    constants. Macros of unselected files are only tokenised when a
+    selected macro refers to them.
+
+    """
+    def __init__(self, tu, cursors, selected):
+        self.tu = tu
+        self.selected = selected
+        # by name, the last definition wins like in the preprocessor.
+        # `spelling` is None for preprocessing cursors, so the display
+        # name is used instead.
+        self.definitions = {}
+        for cursor in cursors:
+            self.definitions[cursor.displayname] = cursor
+        self.tokens = {}
+        self.constants = {}
+        self.evaluating = set()
+
+    def selected_cursors(self):
+        by_file = {}
+        files = []
+        for cursor in self.definitions.itervalues():
+            fname = cursor.location.presumed[0]
+            if file_selected(fname, self.selected):
+                if fname not in by_file:
+                    by_file[fname] = []
+                    files.append(fname)
+                by_file[fname].append(cursor)
+        for fname in sorted(files):
+            cursors = sorted(by_file[fname], key=lambda c: c.location.offset)
+            yield fname, cursors
+
+    def load_tokens(self, cursors):
+        for cursor, tokens in zip(cursors, macro_tokens(self.tu, cursors)):
+            self.tokens[cursor.displayname] = tokens
+
+    def lookup(self, name):
+        if name in self.constants:
+            return self.constants[name]
+        cursor = self.definitions.get(name)
+        if cursor is None or name in self.evaluating:
+            return None
+        if name not in self.tokens:
+            self.load_tokens([cursor])
+        self.evaluating.add(name)
+        try:
+            const = self.classify(cursor)
+        finally:
+            self.evaluating.discard(name)
+        self.constants[name] = const
+        return const
+
+    def classify(self, cursor):
+        tokens = self.tokens.get(cursor.displayname)
+        if not tokens or is_function_like(tokens):
+            return None
+        body = [(kind, spelling) for kind, spelling, offset in tokens[1:]
+                if kind != 'COMMENT']
+        try:
+            kind, value = MacroEvaluator(body, self.lookup).evaluate()
+        except (MacroError, ArithmeticError, ValueError):
+            return None
+        fname, line, column = cursor.location.presumed
+        location = (fname, line)
+        return MacroConstant(cursor.displayname, kind, value, location)
+
+    def iter_constants(self):
+        """ Yields (filename, [MacroConstant]) for each selected file,
+        in file name order, with the constants in definition order.
+
+        """
+        for fname, cursors in self.selected_cursors():
+            self.load_tokens(cursors)
+            consts = []
+            for cursor in cursors:
+                const = self.lookup(cursor.displayname)
+                if const is not None:
+                    consts.append(const)
+            yield fname, consts
+
+
+#------------------------------------------------------------------------------
+# Conversion to c_ast nodes
+#------------------------------------------------------------------------------
+def constants_to_c_ast(consts, context):
+    """ Converts the macro constants of one file into c_ast nodes:
+    integer constants become the values of an anonymous enumeration,
+    floats and strings become const variables.
+
+    """
+    nodes = []
+    enum = None
+    for const in consts:
+        if const.kind == 'int':
+            value = const.value
+            if not -2**63 <= value < 2**63:
+                continue
+            if enum is None:
+                enum = c_ast.Enumeration('', context)
+                enum.location = const.location
+                nodes.append(enum)
+            enum.add_value(c_ast.EnumValue(const.name, int(value)))
+        elif const.kind == 'float':
+            double = c_ast.FundamentalType.intern('double')
+            var = c_ast.Variable(const.name,
+                                 c_ast.CvQualifiedType.intern(double, True, False),
+                                 context, None)
+            var.location = const.location
+            nodes.append(var)
+        else:
+            char = c_ast.CvQualifiedType.intern(
+                c_ast.FundamentalType.intern('char'), True, False)
+            var = c_ast.Variable(const.name,
+                                 c_ast.PointerType(char, None, None),
+                                 context, None)
+            var.location = const.location
+            nodes.append(var)
+    return nodes
+
+
+def extract_macro_constants(tu, cursors, selected, context):
+    """ Returns the c_ast nodes for all object-like macro constants
+    defined in the `selected` files.
+
+    """
+    table = MacroTable(tu, cursors, selected)
+    nodes = []
+    for fname, consts in table.iter_constants():
+        nodes.extend(constants_to_c_ast(consts, context))
+    return nodes
@@ -0,0 +1,187 @@
+#------------------------------------------------------------------------------
+# Optional preprocessing stage for the libclang frontend
+#------------------------------------------------------------------------------
+# Headers that are mostly macro metaprogramming spend most of their parse
+# time in the preprocessor. This stage runs an external preprocessor once,
+# caches its output and hands the preprocessed text to libclang through
+# `unsaved_files`. The line markers of the output keep the original file
+# and line attribution, which libclang reports as presumed locations.
+import os
+import re
+import shlex
+import subprocess
+
+
+DEFAULT_PREPROCESSOR = ['clang', '-E']
+
+# `# 12 "foo.h" 1 3` (gcc/clang output) or `#line 12 "foo.h"`
+LINE_MARKER = re.compile(r'^#\s*(?:line\s+)?(\d+)\s+"((?:[^"\\]|\\.)*)"')
+
+DIRECTIVE = re.compile(r'^#\s*(define|undef)\s')
+
+# file names that preprocessors use for their predefined macros
+PSEUDO_FILES = set(['<built-in>', '<command-line>', '<command line>'])
+
+# bump when the format of the processed output changes
+FORMAT_VERSION = 1
+
+
+class PreprocessError(Exception):
+    """ Raised when the external preprocessor fails.
+
+    """
+    pass
+
+
+def preprocessor_command(command):
+    """ Normalizes the `preprocessor` option, which may be a string or
+    a list, into an argument list.
+
+    """
+    if not command:
+        return list(DEFAULT_PREPROCESSOR)
+    if isinstance(command, basestring):
+        return shlex.split(command)
+    return list(command)
+
+
+_versions = {}
+
+def preprocessor_version(command):
+    """ Returns the version banner of the preprocessor, which becomes
+    part of the cache key since it determines the predefined macros.
+
+    """
+    executable = command[0]
+    if executable not in _versions:
+        try:
+            proc = subprocess.Popen([executable, '--version'],
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            _versions[executable] = proc.communicate()[0]
+        except OSError:
+            _versions[executable] = ''
+    return _versions[executable]
+
+
+def run_preprocessor(header_path, include_dirs, language, command,
+                     keep_macros):
+    """ Runs `command` on the header and returns its output. With
+    `keep_macros` the macro definitions are kept in the output (-dD).
+
+    """
+    args = list(command)
+    args.extend('-I' + d for d in include_dirs)
+    if language:
+        args.extend(['-x', language])
+    if keep_macros:
+        args.append('-dD')
+    args.append(header_path)
+    try:
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    except OSError, e:
+        raise PreprocessError('Could not run %s: %s' % (args[0], e))
+    out, err = proc.communicate()
+    if proc.returncode != 0:
+        raise PreprocessError('%s failed on %s:\n%s' % (args[0], header_path,
+                                                        err))
+    return out
+
+
+def split_macros(text):
+    """ Moves the #define and #undef lines of preprocessed `text` to
+    the end, each behind a line marker for its original location.
+    Otherwise libclang would expand the macros a second time in the
+    already expanded code. Definitions of the preprocessor's own
+    predefined macros are dropped; libclang has its own.
+
+    Returns the new text and the set of files named in line markers.
+
+    """
+    lines = text.splitlines(True)
+    files = set()
+    directives = []
+    fname = None
+    lineno = 1
+    for i, line in enumerate(lines):
+        if line.startswith('#'):
+            marker = LINE_MARKER.match(line)
+            if marker is not None:
+                lineno = int(marker.group(1))
+                fname = marker.group(2)
+                files.add(fname)
+                continue
+            if DIRECTIVE.match(line):
+                if fname not in PSEUDO_FILES:
+                    directives.append('# %d "%s"\n' % (lineno, fname))
+                    directives.append(line)
+                # keep the line count of the code intact
+                lines[i] = '\n'
+        lineno += 1
+
+    if lines and not lines[-1].endswith('\n'):
+        lines.append('\n')
+    lines.extend(directives)
+    return ''.join(lines), files
+
+
+def source_files(marker_files):
+    """ Returns the real files among the names found in line markers,
+    i.e. the include closure of the header.
+
+    """
+    files = []
+    for fname in marker_files:
+        if fname in PSEUDO_FILES:
+            continue
+        fname = fname.decode('string_escape')
+        if os.path.isfile(fname):
+            files.append(os.path.abspath(fname))
+    return files
+
+
+def preprocessed_source(header_path, include_dirs, language, command=None,
+                        keep_macros=False, cache=None):
+    """ Returns the preprocessed text of the header, from `cache` if
+    the header and everything it includes are unchanged.
+
+    """
+    command = preprocessor_command(command)
+    key = ['clang-preprocess', FORMAT_VERSION, os.path.abspath(header_path),
+           list(include_dirs), language, command, bool(keep_macros),
+           preprocessor_version(command)]
+    if cache is not None:
+        text = cache.lookup(key)
+        if text is not None:
+            return text
+
+    text = run_preprocessor(header_path, include_dirs, language, command,
+                            keep_macros)
+    text, marker_files = split_macros(text)
+    if cache is not None:
+        cache.store(key, source_files(marker_files), text)
+    return text
+
+
+def unsaved_name(header_path, language):
+    """ The name under which the preprocessed text is passed to
+    libclang. An explicit language overrides the extension, see
+    preprocessed_language.
+
+    """
+    if language == 'c++':
+        return header_path + '.ii'
+    return header_path + '.i'
+
+
+def preprocessed_language(language):
+    """ The language to parse the preprocessed text as, so that
+    libclang treats it as preprocessed output. A plain `-x c++` would
+    override the extension of unsaved_name. The #define lines that
+    split_macros keeps are still read as macro definitions.
+
+    """
+    if not language or language == 'c':
+        return 'cpp-output'
+    return language + '-cpp-output'
@@ -0,0 +1,256 @@
+""" A pool of long-lived worker processes that run the clang parse
+stage out of process.
+
+A header that makes libclang hang, run out of memory or crash only
+takes down the worker that was parsing it. The worker is restarted
+and the header is reported as failed; the other headers of the batch
+are not affected.
+
+"""
+# Stdlib imports
+import os
+import select
+import sys
+import time
+import traceback
+import multiprocessing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class ParseResult(object):
+    """ The outcome of parsing a single header. `items` holds the
+    c_ast items on success; on failure it is None and `error`
+    describes what went wrong.
+
+    """
+    def __init__(self, path, items=None, error=None):
+        self.path = path
+        self.items = items
+        self.error = error
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+def _limit_memory(memory_limit):
+    """ Caps the address space of the current process at
+    `memory_limit` bytes.
+
+    """
+    if resource is None or not memory_limit:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        memory_limit = min(memory_limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+
+
+def _worker_main(conn, memory_limit):
+    """ Body of a worker process. libclang is loaded and an `Index`
+    is created once; then jobs are read from `conn` until None is
+    received or the parent goes away.
+
+    """
+    # imported here so that a broken libclang cannot prevent
+    # the parent from starting up
+    from . import clang
+    from . import gen_c_ast
+    from ...cache import Cache
+
+    # the parser is chatty, keep the parent's output readable
+    devnull = open(os.devnull, 'w')
+    sys.stdout = devnull
+
+    # load libclang before the limit is applied so that the budget
+    # only has to cover the parsing itself
+    index = clang.cindex.Index.create()
+    _limit_memory(memory_limit)
+
+    # preprocess caches by directory
+    caches = {}
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, IOError):
+            break
+        if job is None:
+            break
+        path, include_dirs, language, export_macros, preprocessor, \
+            cache_dir, namespaces = job
+        cache = None
+        if cache_dir is not None:
+            if cache_dir not in caches:
+                caches[cache_dir] = Cache(cache_dir, '.i')
+            cache = caches[cache_dir]
+        try:
+            items = gen_c_ast(path, include_dirs, language, export_macros,
+                              preprocessor, cache, index, namespaces)
+            conn.send(('ok', items))
+        except MemoryError:
+            # the heap may be in a bad state, let the parent
+            # start a fresh worker
+            conn.send(('fatal', 'memory limit exceeded'))
+            break
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+    conn.close()
+
+
+class _Worker(object):
+    """ The parent's handle on a single worker process.
+
+    """
+    def __init__(self, memory_limit):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main,
+                                               args=(child_conn, memory_limit))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.job = None
+        self.deadline = None
+
+    def submit(self, job_id, job, timeout):
+        self.conn.send(job)
+        self.job = job_id
+        if timeout:
+            self.deadline = time.time() + timeout
+        else:
+            self.deadline = None
+
+    def fileno(self):
+        return self.conn.fileno()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (IOError, OSError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class ParserPool(object):
+    """ Parses headers in `size` worker processes.
+
+    Each header may take at most `timeout` seconds of wall clock time
+    and each worker may use at most `memory_limit` bytes of address
+    space. None disables the respective limit.
+
+    """
+    def __init__(self, size=None, timeout=None, memory_limit=None):
+        self.size = size or multiprocessing.cpu_count()
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.workers = []
+        # number of workers that had to be replaced
+        self.restarts = 0
+
+    def start(self):
+        while len(self.workers) < self.size:
+            self.workers.append(_Worker(self.memory_limit))
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _restart(self, worker):
+        """ Replaces `worker` with a new one, which is returned.
+
+        """
+        worker.kill()
+        new_worker = _Worker(self.memory_limit)
+        self.workers[self.workers.index(worker)] = new_worker
+        self.restarts += 1
+        return new_worker
+
+    def parse(self, jobs):
+        """ Parses `jobs`, a list of tuples of gen_c_ast arguments:
+        (path, include_dirs, language, export_macros, preprocessor,
+        preprocess cache directory, namespaces). Returns a list of
+        ParseResult objects in the order of `jobs`.
+
+        """
+        self.start()
+        results = [None] * len(jobs)
+        pending = list(reversed(range(len(jobs))))
+        busy = []
+
+        while pending or busy:
+            # hand out work to the idle workers
+            for worker in list(self.workers):
+                if worker.job is None and pending:
+                    job_id = pending.pop()
+                    try:
+                        worker.submit(job_id, jobs[job_id], self.timeout)
+                    except (IOError, OSError):
+                        # the worker died while idle, the job goes to
+                        # the worker that replaces it
+                        worker = self._restart(worker)
+                        try:
+                            worker.submit(job_id, jobs[job_id], self.timeout)
+                        except (IOError, OSError):
+                            msg = 'worker died before the job was started'
+                            results[job_id] = ParseResult(jobs[job_id][0],
+                                                          error=msg)
+                            self._restart(worker)
+                            continue
+                    busy.append(worker)
+
+            # nothing to wait for when no job could be started
+            if not busy:
+                continue
+
+            wait = None
+            deadlines = [w.deadline for w in busy if w.deadline is not None]
+            if deadlines:
+                wait = max(0, min(deadlines) - time.time())
+            ready, _, _ = select.select(busy, [], [], wait)
+
+            for worker in ready:
+                job_id = worker.job
+                path = jobs[job_id][0]
+                try:
+                    status, payload = worker.conn.recv()
+                except (EOFError, IOError):
+                    worker.process.join(1)
+                    code = worker.process.exitcode
+                    status, payload = 'crashed', 'worker died (exit code %s)' % code
+                busy.remove(worker)
+                worker.job = None
+                if status == 'ok':
+                    results[job_id] = ParseResult(path, items=payload)
+                else:
+                    results[job_id] = ParseResult(path, error=payload)
+                    if status != 'error':
+                        self._restart(worker)
+
+            now = time.time()
+            for worker in list(busy):
+                if worker.deadline is not None and worker.deadline <= now:
+                    job_id = worker.job
+                    msg = 'timed out after %s seconds' % self.timeout
+                    results[job_id] = ParseResult(jobs[job_id][0], error=msg)
+                    busy.remove(worker)
+                    self._restart(worker)
+
+        return results
@@ -1,18 +1,27 @@
 # Stdlib imports
 import os
-import subprocess
 import tempfile
 
 # Local package imports
 from . import ast_transforms as transforms
-from . import gccxml_parser
 from . import c_ast
+from . import process_pool
+from . import xml_cache
+from ...backend import render_cache
+from ...cache import Cache
 
 
-def gen_c_ast(header_path, include_dirs):
-    """ Parse the given header file into a C style ast which can be
-    transformed into a CWrap ast. The include dirs are passed along to 
-    gccxml.
+class GCCXMLError(Exception):
+    """ Raised when gccxml fails on a header.
+
+    """
+    pass
+
+
+def gccxml_job(header_path, include_dirs, spill_nodes=None):
+    """ Returns the XMLJob that runs gccxml on the given header. The
+    include dirs are passed along to gccxml. See XMLJob for
+    `spill_nodes`.
 
     """
     # A temporary file to store the xml generated by gccxml
@@ -24,18 +33,45 @@ def gen_c_ast(header_path, include_dirs):
     for inc_dir in include_dirs:
         cmds.append('-I' + inc_dir)
     cmds.append(header_path)
-    cmds.append('-fxml=%s' % xml_file.name)
-   
-    # we pipe stdout so the preprocessing doesn't dump to the 
-    # shell. We really don't care about it.
-    p = subprocess.Popen(cmds, stdout=subprocess.PIPE)
-    cpp, _ = p.communicate()
-    
-    # Parse the xml into the ast then delete the temp file
-    c_ast = gccxml_parser.parse(xml_file.name)
-    os.remove(xml_file.name)
+    xml_arg = '-fxml=%s' % xml_file.name
+    cmds.append(xml_arg)
+
+    # the preprocessed source gccxml writes to stdout is discarded by
+    # the pool, we really don't care about it. Only what the header
+    # itself needs is kept of the included files.
+    key = xml_cache.cache_key(cmds, exclude=[xml_arg])
+    main_files = [os.path.split(header_path)[-1]]
+    return process_pool.XMLJob(header_path, cmds, xml_file.name, key,
+                               main_files, spill_nodes)
+
+
+def parse_headers(jobs, workers=None, cache=None):
+    """ Runs the gccxml jobs in a pool of `workers` processes and
+    returns their c_ast items, in the order of `jobs`. The xml is
+    taken from and stored in `cache`, if given.
+
+    """
+    try:
+        results = process_pool.ProcessPool(workers, cache).parse(jobs)
+    finally:
+        # delete the temp files
+        for job in jobs:
+            if os.path.exists(job.xml_path):
+                os.remove(job.xml_path)
+
+    for result in results:
+        if result.failed:
+            raise GCCXMLError(result.error)
+    return [result.items for result in results]
 
-    return c_ast
+
+def gen_c_ast(header_path, include_dirs):
+    """ Parse the given header file into a C style ast which can be
+    transformed into a CWrap ast. The include dirs are passed along to 
+    gccxml.
+
+    """
+    return parse_headers([gccxml_job(header_path, include_dirs)], 1)[0]
 
 
 def print_item(item, caption = '', level=0):
@@ -53,9 +89,31 @@ def print_item(item, caption = '', level=0):
 def generate_asts(config):
     """ Returns an iterable of ASTContainer objects.
 
+    With the `tree_shaking` option, only the declarations of a header
+    and those they refer to are emitted; `shake_roots` optionally
+    names the declarations to start from instead.
+
+    The `render_cache` options are those of cwrap.backend.render_cache.
+
     """
+    # gccxml runs for all headers at once, `parse_workers` at a time
+    include_dirs = config.metadata.get('include_dirs', [])
+    workers = config.metadata.get('parse_workers')
+    spill_nodes = config.metadata.get('spill_nodes')
+    cache = None
+    cache_dir = config.metadata.get('xml_cache')
+    if cache_dir is not None:
+        cache = Cache(cache_dir, xml_cache.SUFFIX)
+    paths = [header_file.path for header_file in config.files]
+    for path in paths:
+        print 'Parsing %s' % path
+    all_items = parse_headers([gccxml_job(path, include_dirs, spill_nodes)
+                               for path in paths], workers, cache)
+    if cache is not None and config.metadata.get('cache_stats'):
+        print 'XML cache: %s' % cache.stats
+
     c_ast_containers = []
-    for header_file in config.files:
+    for header_file, ast_items in zip(config.files, all_items):
         # read the header info and create the extern and implemenation
         # module names
         path = header_file.path
@@ -67,11 +125,6 @@ def generate_asts(config):
         if implementation_name is None:
             implementation_name = os.path.splitext(header_name)[0]
 
-        # generate the c_ast for the header 
-        include_dirs = config.metadata.get('include_dirs', [])
-        print 'Parsing %s' % path
-        ast_items = gen_c_ast(path, include_dirs) 
-
         print 'file parsed'
         print 'AST:'
         for item in ast_items:
@@ -87,6 +140,11 @@ def generate_asts(config):
 
         # Apply the transformations to the ast items 
         trans_items = transforms.apply_c_ast_transformations(ast_items)
+
+        # Drop what the declarations of the header don't need
+        if config.metadata.get('tree_shaking'):
+            trans_items = transforms.shake_tree(
+                trans_items, header_name, config.metadata.get('shake_roots'))
         
         # Create the CAstContainer for these items
         container = transforms.CAstContainer(trans_items, header_name, 
@@ -97,5 +155,6 @@ def generate_asts(config):
 
     # Now we can create an ast transformer and transform the list 
     # of containers into a generator that can be rendered into code
-    ast_transformer = transforms.CAstTransformer(c_ast_containers)
+    ast_transformer = transforms.CAstTransformer(
+        c_ast_containers, render_cache.from_config(config))
     return ast_transformer.transform()
@@ -1,6 +1,9 @@
 # CWrap imports
 from ...backend import cw_ast
+from ...c_ast_transforms import flatten_container, shake_tree
+from ... import c_ast_transforms
 from ...config import ASTContainer 
+from ...hashing import hash_cons
 
 # Local package imports
 import c_ast
@@ -24,66 +27,15 @@ def find_toplevel_items(items):
 
     
 def sort_toplevel_items(items):
-    """ Sorts the items first by their filename, then by lineno. Returns
-    a new list of items
+    """ Sorts the items first by their file, then by lineno. Returns
+    a new list of items. The encoded (file id, line) locations are
+    compared, so files are ordered by their id rather than their name.
 
     """
-    key = lambda node: node.location
+    key = lambda node: node._location
     return sorted(items, key=key)
 
 
-def _flatten_container(container, items=None, context_name=None):
-    """ Given a struct or union, replaces nested structs or unions
-    with toplevel struct/unions and a typdef'd member. This will 
-    recursively expand everything nested. The `items` and `context_name`
-    arguments are used internally. Returns a list of flattened nodes.
-
-    """
-    if items is None:
-        items = []
-
-    parent_context = container.context
-    parent_name = container.name
-
-    mod_context = []
-    for i, field in enumerate(container.members):
-        if isinstance(field, (c_ast.Struct, c_ast.Union)):
-            # Create the necessary mangled names
-            mangled_name = '__%s_%s' % (parent_name, field.name)
-            mangled_typename = mangled_name + '_t'
-            
-            # Change the name of the nested item to the mangled
-            # item the context to the parent context
-            field.name = mangled_name
-            field.context = parent_context
-            
-            # Expand any nested definitions for this container.
-            _flatten_container(field, items, parent_name)
-            
-            # Create a typedef for the mangled name with the parent_context
-            typedef = c_ast.Typedef(mangled_typename, field, parent_context)
-                
-            # Add the typedef to the list of items
-            items.append(typedef)
-
-            # Add the necessary information to the mod_context so 
-            # we can modify the list of members at the end.
-            mod_context.append((i, field, typedef))
-
-    # Use the mod_context to remove the nest definitions and replace 
-    # any fields that reference them with the typedefs.
-    for idx, field, typedef in reversed(mod_context):
-        container.members.pop(idx)
-        for member in container.members:
-            if isinstance(member, c_ast.Field):
-                if member.typ is field:
-                    member.typ = typedef
-
-    items.append(container)
-
-    return items
-
-
 def flatten_nested_containers(items):
     """ Searches for Struct/Union nodes with nested Struct/Union 
     definitions, when it finds them, it creates a similar definition
@@ -97,7 +49,7 @@ def flatten_nested_containers(items):
         if not isinstance(node, (c_ast.Struct, c_ast.Union)):
             res_items.append(node)
         else:
-            res_items.extend(_flatten_container(node))
+            res_items.extend(flatten_container(c_ast, node))
     return res_items
                     
            
@@ -140,15 +92,29 @@ def apply_c_ast_transformations(c_ast_items):
         2) sort the toplevel items into the order they appear
         3) extract and replace nested structs and unions
         4) get rid of any c_ast.Ignored nodes
+        5) order the items after the declarations they use
+        6) share one instance of the structurally identical types
 
     """
     items = find_toplevel_items(c_ast_items)
     items = sort_toplevel_items(items)
     items = flatten_nested_containers(items)
     items = filter_ignored(items)
+    items = order_declarations(items)
+    # after the passes that change nodes, hashes are cached on them
+    hash_cons(items)
     return items
 
 
+def order_declarations(items):
+    """ Orders the toplevel items after the declarations they use, see
+    cwrap.c_ast_transforms.order_declarations. The parser refers to
+    the declarations themselves. Returns a new list of items.
+
+    """
+    return c_ast_transforms.order_declarations(c_ast, items)
+
+
 class CAstContainer(object):
     """ A container object that holds a list of ast items, and the
     names of the modules they should be rendered to.
@@ -163,33 +129,42 @@ class CAstContainer(object):
 
 class CAstTransformer(object):
 
-    def __init__(self, ast_containers):
+    def __init__(self, ast_containers, render_cache=None):
         # XXX - work out the symbols
         self.ast_containers = ast_containers
         self.pxd_nodes = []
         self.modifier_stack = []
+        # a cwrap.backend.render_cache.RenderCache or None
+        self.render_cache = render_cache
 
     def transform(self):
         for container in self.ast_containers:
-            items = container.items
+            header_name = container.header_name
             self.pxd_nodes = []
             self.modifier_stack = []
-            header_name = container.header_name
 
-            for item in items:
-                # only transform items for this header (not #inlcude'd
-                # or other __builtin__ stuff)
-                if item.location is not None:
-                    if not item.location[0].endswith(header_name):
-                        continue
-                self.visit(item)
-       
-            extern = cw_ast.ExternFrom(container.header_name, self.pxd_nodes)
-            cdef_decl = cw_ast.CdefDecl([], extern)
-            mod = cw_ast.Module([cdef_decl])
-            
+            # only transform items for this header (not #inlcude'd
+            # or other __builtin__ stuff)
+            items = [item for item in container.items
+                     if item.location is None or
+                     item.location[0].endswith(header_name)]
+
+            def make_module(pxd_nodes):
+                extern = cw_ast.ExternFrom(header_name, pxd_nodes)
+                return cw_ast.Module([cw_ast.CdefDecl([], extern)])
+
+            if self.render_cache is None:
+                for item in items:
+                    self.visit(item)
+                mod = make_module(self.pxd_nodes)
+            else:
+                mod = self.render_cache.transform(self, items, __name__,
+                                                  make_module)
             yield ASTContainer(mod, container.extern_name + '.pxd')
 
+        if self.render_cache is not None:
+            self.render_cache.save()
+
     def visit(self, node):
         visitor_name = 'visit_' + node.__class__.__name__
         visitor = getattr(self, visitor_name, self.generic_visit)
@@ -224,6 +199,14 @@ class CAstTransformer(object):
         cdef = cw_ast.CdefDecl([], union_def)
         self.pxd_nodes.append(cdef)
 
+    def visit_ForwardDeclaration(self, forward):
+        if isinstance(forward.decl, c_ast.Union):
+            decl = cw_ast.UnionDecl(forward.name)
+        else:
+            decl = cw_ast.StructDecl(forward.name)
+        cdef = cw_ast.CdefDecl([], decl)
+        self.pxd_nodes.append(cdef)
+
     def visit_Enumeration(self, enum):
         name = enum.name
         body = []
@@ -1,36 +1,34 @@
+# the base class, the locations and the forward declarations are
+# shared by all frontends
+from ...c_ast_base import C_ASTNode, ForwardDeclaration
 
 
-class C_ASTNode(object):
-
-    def __init__(self, *args, **kwargs):
-        self.location = None
-        self.render_hints = {}
-        self.name = ''
-        self.init(*args, **kwargs)
-       
-    def init(self, *args, **kwargs):
-        pass
-  
-    
 class Typedef(C_ASTNode):
 
-    def init(self, name, typ, context):
-        self.name = name
+    __slots__ = ('typ', 'context')
+
+    def __init__(self, name, typ, context):
+        C_ASTNode.__init__(self, name)
         self.typ = typ
         self.context = context
 
 
 class FundamentalType(C_ASTNode):
 
-    def init(self, name, size, align):
-        self.name = name
+    __slots__ = ('size', 'align')
+
+    def __init__(self, name, size, align):
+        C_ASTNode.__init__(self, name)
         self.size = size
         self.align = align
 
 
 class CvQualifiedType(C_ASTNode):
 
-    def init(self, typ, const, volatile):
+    __slots__ = ('typ', 'const', 'volatile')
+
+    def __init__(self, typ, const, volatile):
+        C_ASTNode.__init__(self)
         self.typ = typ
         self.const = const
         self.volatile = volatile
@@ -38,8 +36,10 @@ class CvQualifiedType(C_ASTNode):
 
 class Ignored(C_ASTNode):
 
-    def init(self, name):
-        self.name = name
+    __slots__ = ('arguments',)
+
+    def __init__(self, name):
+        C_ASTNode.__init__(self, name)
         self.arguments = []
 
     def fixup_argtypes(self, typemap):
@@ -52,8 +52,10 @@ class Ignored(C_ASTNode):
 
 class Field(C_ASTNode):
     
-    def init(self, name, typ, context, bits, offset):
-        self.name = name
+    __slots__ = ('typ', 'context', 'bits', 'offset')
+
+    def __init__(self, name, typ, context, bits, offset):
+        C_ASTNode.__init__(self, name)
         self.typ = typ
         self.context = context
         self.bits = bits
@@ -62,8 +64,10 @@ class Field(C_ASTNode):
 
 class Struct(C_ASTNode):
     
-    def init(self, name, align, members, context, bases, size):
-        self.name = name
+    __slots__ = ('align', 'members', 'context', 'bases', 'size')
+
+    def __init__(self, name, align, members, context, bases, size):
+        C_ASTNode.__init__(self, name)
         self.align = align
         self.members = members
         self.context = context
@@ -77,8 +81,10 @@ class Struct(C_ASTNode):
 
 class Union(C_ASTNode):
     
-    def init(self, name, align, members, context, bases, size):
-        self.name = name
+    __slots__ = ('align', 'members', 'context', 'bases', 'size')
+
+    def __init__(self, name, align, members, context, bases, size):
+        C_ASTNode.__init__(self, name)
         self.align = align
         self.members = members
         self.context = context
@@ -92,15 +98,19 @@ class Union(C_ASTNode):
 
 class EnumValue(C_ASTNode):
 
-    def init(self, name, value):
-        self.name = name
+    __slots__ = ('value',)
+
+    def __init__(self, name, value):
+        C_ASTNode.__init__(self, name)
         self.value = value
     
 
 class Enumeration(C_ASTNode):
     
-    def init(self, name, size, align):
-        self.name = name
+    __slots__ = ('size', 'align', 'values')
+
+    def __init__(self, name, size, align):
+        C_ASTNode.__init__(self, name)
         self.size = size
         self.align = align
         self.values = []
@@ -115,7 +125,10 @@ class Enumeration(C_ASTNode):
 
 class PointerType(C_ASTNode):
 
-    def init(self, typ, size, align):
+    __slots__ = ('typ', 'size', 'align')
+
+    def __init__(self, typ, size, align):
+        C_ASTNode.__init__(self)
         self.typ = typ
         self.size = size
         self.align = align
@@ -127,7 +140,10 @@ class PointerType(C_ASTNode):
 
 class ArrayType(C_ASTNode):
 
-    def init(self, typ, min, max):
+    __slots__ = ('typ', 'min', 'max')
+
+    def __init__(self, typ, min, max):
+        C_ASTNode.__init__(self)
         self.typ = typ
         self.min = min
         self.max = max
@@ -135,15 +151,19 @@ class ArrayType(C_ASTNode):
 
 class Argument(C_ASTNode):
 
-    def init(self, typ, name):
+    __slots__ = ('typ',)
+
+    def __init__(self, typ, name):
+        C_ASTNode.__init__(self, name)
         self.typ = typ
-        self.name = name
 
 
 class Function(C_ASTNode):
 
-    def init(self, name, returns, context, attributes, extern):
-        self.name = name
+    __slots__ = ('returns', 'context', 'attributes', 'extern', 'arguments')
+
+    def __init__(self, name, returns, context, attributes, extern):
+        C_ASTNode.__init__(self, name)
         self.returns = returns
         self.context = context
         self.attributes = attributes
@@ -160,7 +180,10 @@ class Function(C_ASTNode):
 
 class FunctionType(C_ASTNode):
 
-    def init(self, returns, attributes):
+    __slots__ = ('returns', 'attributes', 'arguments')
+
+    def __init__(self, returns, attributes):
+        C_ASTNode.__init__(self)
         self.returns = returns
         self.attributes = attributes
         self.arguments = []
@@ -175,8 +198,10 @@ class FunctionType(C_ASTNode):
 
 class OperatorFunction(C_ASTNode):
 
-    def init(self, name, returns, context, attributes, extern):
-        self.name = name
+    __slots__ = ('returns', 'context', 'attributes', 'extern', 'arguments')
+
+    def __init__(self, name, returns, context, attributes, extern):
+        C_ASTNode.__init__(self, name)
         self.returns = returns
         self.context = context
         self.attributes = attributes
@@ -193,39 +218,47 @@ class OperatorFunction(C_ASTNode):
 
 class Macro(C_ASTNode):
 
-    def init(self, name, args, body):
-        self.name = name
+    __slots__ = ('args', 'body')
+
+    def __init__(self, name, args, body):
+        C_ASTNode.__init__(self, name)
         self.args = args
         self.body = body
 
 
 class Alias(C_ASTNode):
 
-    def init(self, name, value, typ=None):
-        self.name = name
+    __slots__ = ('value', 'typ')
+
+    def __init__(self, name, value, typ=None):
+        C_ASTNode.__init__(self, name)
         self.value = value
         self.typ = typ
     
 
 class File(C_ASTNode):
 
-    def init(self, name):
-        self.name = name
+    __slots__ = ()
+
+    def __init__(self, name):
+        C_ASTNode.__init__(self, name)
     
 
 class Namespace(C_ASTNode):
 
-    def init(self, name, members):
-        self.name = name
+    __slots__ = ('members',)
+
+    def __init__(self, name, members):
+        C_ASTNode.__init__(self, name)
         self.members = members
 
 
 class Variable(C_ASTNode):
 
-    def init(self, name, typ, context, init):
-        self.name = name
+    __slots__ = ('typ', 'context', 'init')
+
+    def __init__(self, name, typ, context, init):
+        C_ASTNode.__init__(self, name)
         self.typ = typ
         self.context = context
         self.init = init
-
-
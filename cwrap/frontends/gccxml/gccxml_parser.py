@@ -1,12 +1,14 @@
 #------------------------------------------------------------------------------
 # This file is adapted from ctypeslib.codegen.gccxmlparser
 #------------------------------------------------------------------------------
-from xml.etree import cElementTree
+from xml.parsers import expat
+from array import array
 import os
 import sys
 import re
 
 from . import c_ast
+from .node_store import NodeStore
 
 
 def MAKE_NAME(name):
@@ -46,7 +48,18 @@ class GCCXMLParser(object):
                            'OperatorFunction', 'Method', 'Constructor',
                            'Destructor', 'OperatorMethod'])
 
-    def __init__(self, *args):
+    def __init__(self, main_files=None, node_store=None):
+        # `main_files` are the names of the headers being wrapped. If
+        # given, the nodes located in other files are dropped unless a
+        # node from a main file refers to them, see `prune`. A file
+        # counts as a main file if its name ends with one of them,
+        # like in `CAstTransformer.transform`.
+        self.main_files = main_files
+
+        # `main_file_ids` are the xml ids of the main files, collected
+        # as the File elements arrive.
+        self.main_file_ids = set()
+
         # `context` acts like stack where parent nodes are pushed
         # before visiting children
         self.context = []
@@ -54,8 +67,21 @@ class GCCXMLParser(object):
         # `all` maps the unique ids from the xml to the c_ast
         # node that was generated by the element. This is used
         # after all nodes have been generated to go back and
-        # hook up dependent nodes.
-        self.all = {}
+        # hook up dependent nodes. The references on the nodes are
+        # the integer ids of the store until then, `ids` maps the
+        # xml id strings to them. A SpillingNodeStore can be passed
+        # for xml that doesn't fit in memory.
+        self.all = node_store if node_store is not None else NodeStore()
+        self.ids = self.all.ids
+
+        # Until `get_result`, the `_location` of a node is the
+        # (file id, line) from the xml, interned in `location_keys`.
+        # The file elements come last in the xml, so the file names
+        # are filled in by `get_result`.
+        self.location_keys = {}
+
+        # `xml_parser` is the expat parser that is reading the xml.
+        self.xml_parser = None
 
         # XXX - what does this do?
         self.cpp_data = {}
@@ -70,19 +96,49 @@ class GCCXMLParser(object):
     #--------------------------------------------------------------------------
     # Parsing entry points
     #--------------------------------------------------------------------------
+    def create_xml_parser(self):
+        """ Returns an expat parser that calls the element handlers
+        directly with the attribute dicts expat builds, no element
+        tree is built. Character data is only passed on inside the
+        elements that collect it, see `visit_CPP_DUMP`.
+
+        """
+        xml_parser = expat.ParserCreate()
+        # names and attributes as str, like cElementTree gave them
+        xml_parser.returns_unicode = False
+        xml_parser.buffer_text = True
+        xml_parser.StartElementHandler = self.start_element
+        xml_parser.EndElementHandler = self.end_element
+        return xml_parser
+
     def parse(self, xmlfile):
         """ Parsing entry point. `xmlfile` is a filename or a file
         object.
 
         """
-        for event, node in cElementTree.iterparse(xmlfile, events=('start', 'end')):
-            if event == 'start':
-                self.start_element(node.tag, dict(node.items()))
+        self.xml_parser = self.create_xml_parser()
+        try:
+            if isinstance(xmlfile, basestring):
+                with open(xmlfile, 'rb') as f:
+                    self.xml_parser.ParseFile(f)
             else:
-                if node.text:
-                    self.visit_Characters(node.text)
-                self.end_element(node.tag)
-                node.clear()
+                self.xml_parser.ParseFile(xmlfile)
+        finally:
+            self.xml_parser = None
+
+    def feed(self, data):
+        """ Incremental parsing entry point, for xml that arrives in
+        chunks, e.g. from a pipe. Call `close` after the last chunk.
+
+        """
+        if self.xml_parser is None:
+            self.xml_parser = self.create_xml_parser()
+        self.xml_parser.Parse(data, False)
+
+    def close(self):
+        if self.xml_parser is not None:
+            self.xml_parser.Parse('', True)
+            self.xml_parser = None
 
     def start_element(self, name, attrs):
         """ XML start element handler. Generates and calls the visitor 
@@ -90,6 +146,10 @@ class GCCXMLParser(object):
         sets the location on the node.
 
         """
+        # no node is being built between toplevel elements
+        if not self.context:
+            self.all.release()
+
         # find and call the handler for this element
         mth = getattr(self, 'visit_' + name, None)
         if mth is None:
@@ -103,12 +163,14 @@ class GCCXMLParser(object):
         if result is not None:
             location = attrs.get('location', None)
             if location is not None:
-                result.location = location
+                fil, line = location.split(':')
+                key = (self.ids[fil], int(line))
+                result._location = self.location_keys.setdefault(key, key)
             _id = attrs.get('id', None)
             if _id is not None:
-                self.all[_id] = result
+                self.all[self.ids[_id]] = result
             else:
-                self.all[id(result)] = result
+                self.all.add(result)
 
         # if this element has subelements, push it onto the context
         # since the next elements will be it's children.
@@ -123,7 +185,10 @@ class GCCXMLParser(object):
         # been push onto the stack and needs to be removed.
         if name in self.has_subelements:
             self.context.pop()
-        self.cdata = None
+        if self.cdata is not None:
+            self.cdata = None
+            if self.xml_parser is not None:
+                self.xml_parser.CharacterDataHandler = None
 
     def unhandled_element(self, name, attrs):
         """ Handler for element nodes where a real handler is not
@@ -197,30 +262,37 @@ class GCCXMLParser(object):
         # again at the end of each section.
         name = attrs['name']
         self.cpp_data[name] = self.cdata = []
+        if self.xml_parser is not None:
+            self.xml_parser.CharacterDataHandler = self.visit_Characters
  
     #--------------------------------------------------------------------------
     # Node element handlers
     #--------------------------------------------------------------------------
     def visit_Namespace(self, attrs):
         name = attrs['name']
-        members = attrs['members'].split()
+        members = self.all.ids_array(attrs['members'])
         return c_ast.Namespace(name, members)
     
     def visit_File(self, attrs):
         name = attrs['name']
+        if self.main_files is not None:
+            for main_file in self.main_files:
+                if name.endswith(main_file):
+                    self.main_file_ids.add(self.ids[attrs['id']])
+                    break
         return c_ast.File(name)
 
     def visit_Variable(self, attrs):
         name = attrs['name']
-        typ = attrs['type']
-        context = attrs['context']
+        typ = self.ids[attrs['type']]
+        context = self.ids[attrs['context']]
         init = attrs.get('init', None)
         return c_ast.Variable(name, typ, context, init)
 
     def visit_Typedef(self, attrs):
         name = attrs['name']
-        typ = attrs['type']
-        context = attrs['context']
+        typ = self.ids[attrs['type']]
+        context = self.ids[attrs['context']]
         return c_ast.Typedef(name, typ, context)
    
     def visit_FundamentalType(self, attrs):
@@ -233,7 +305,7 @@ class GCCXMLParser(object):
         return c_ast.FundamentalType(name, size, align)
 
     def visit_PointerType(self, attrs):
-        typ = attrs['type']
+        typ = self.ids[attrs['type']]
         size = attrs['size']
         align = attrs['align']
         return c_ast.PointerType(typ, size, align)
@@ -242,7 +314,7 @@ class GCCXMLParser(object):
    
     def visit_ArrayType(self, attrs):
         # min, max are the min and max array indices
-        typ = attrs['type']
+        typ = self.ids[attrs['type']]
         min = attrs['min']
         max = attrs['max']
         if max == 'ffffffffffffffff':
@@ -254,28 +326,28 @@ class GCCXMLParser(object):
         return c_ast.ArrayType(typ, min, max)
 
     def visit_CvQualifiedType(self, attrs):
-        typ = attrs['type']
+        typ = self.ids[attrs['type']]
         const = attrs.get('const', None)
         volatile = attrs.get('volatile', None)
         return c_ast.CvQualifiedType(typ, const, volatile)
  
     def visit_Function(self, attrs):
         name = attrs['name']
-        returns = attrs['returns']
-        context = attrs['context']
+        returns = self.ids[attrs['returns']]
+        context = self.ids[attrs['context']]
         attributes = attrs.get('attributes', '').split()
         extern = attrs.get('extern')
         return c_ast.Function(name, returns, context, attributes, extern)
 
     def visit_FunctionType(self, attrs):
-        returns = attrs['returns']
+        returns = self.ids[attrs['returns']]
         attributes = attrs.get('attributes', '').split()
         return c_ast.FunctionType(returns, attributes)
   
     def visit_OperatorFunction(self, attrs):
         name = attrs['name']
-        returns = attrs['returns']
-        context = attrs['context']
+        returns = self.ids[attrs['returns']]
+        context = self.ids[attrs['context']]
         attributes = attrs.get('attributes', '').split()
         extern = attrs.get('extern')
         #return c_ast.OperatorFunction(name, returns)
@@ -284,7 +356,7 @@ class GCCXMLParser(object):
     def visit_Argument(self, attrs):
         parent = self.context[-1]
         if parent is not None:
-            typ = attrs['type']
+            typ = self.ids[attrs['type']]
             name = attrs.get('name')
             arg = c_ast.Argument(typ, name)
             parent.add_argument(arg)
@@ -309,9 +381,9 @@ class GCCXMLParser(object):
         name = attrs.get('name')
         if name is None:
             name = MAKE_NAME(attrs['mangled'])
-        bases = attrs.get('bases', '').split()
-        members = attrs.get('members', '').split()
-        context = attrs['context']
+        bases = self.all.ids_array(attrs.get('bases', ''))
+        members = self.all.ids_array(attrs.get('members', ''))
+        context = self.ids[attrs['context']]
         align = attrs['align']
         size = attrs.get('size')
         return c_ast.Struct(name, align, members, context, bases, size)
@@ -320,11 +392,11 @@ class GCCXMLParser(object):
         name = attrs.get('name')
         if name is None:
             name = MAKE_NAME(attrs['mangled'])
-        bases = attrs.get('bases', '').split()
         #fix 'protected:_12345'
-        bases = [b.replace('protected:','') for b in bases]
-        members = attrs.get('members', '').split()
-        context = attrs['context']
+        bases = attrs.get('bases', '').replace('protected:', '')
+        bases = self.all.ids_array(bases)
+        members = self.all.ids_array(attrs.get('members', ''))
+        context = self.ids[attrs['context']]
         align = attrs['align']
         size = attrs.get('size')
         return c_ast.Struct(name, align, members, context, bases, size) #TODO: Class
@@ -334,17 +406,17 @@ class GCCXMLParser(object):
         name = attrs.get('name')
         if name is None:
             name = MAKE_NAME(attrs['mangled'])
-        bases = attrs.get('bases', '').split()
-        members = attrs.get('members', '').split()
-        context = attrs['context']
+        bases = self.all.ids_array(attrs.get('bases', ''))
+        members = self.all.ids_array(attrs.get('members', ''))
+        context = self.ids[attrs['context']]
         align = attrs['align']
         size = attrs.get('size')
         return c_ast.Union(name, align, members, context, bases, size)
 
     def visit_Field(self, attrs):
         name = attrs['name']
-        typ = attrs['type']
-        context = attrs['context']
+        typ = self.ids[attrs['type']]
+        context = self.ids[attrs['context']]
         bits = attrs.get('bits', None)
         offset = attrs.get('offset')
         return c_ast.Field(name, typ, context, bits, offset)
@@ -364,8 +436,7 @@ class GCCXMLParser(object):
     # handler that returns a node object.
     
     def _fixup_Namespace(self, ns):
-        for i, mbr in enumerate(ns.members):
-            ns.members[i] = self.all[mbr]
+        ns.members = [self.all[mbr] for mbr in ns.members]
 
     def _fixup_File(self, f): 
         pass
@@ -437,6 +508,70 @@ class GCCXMLParser(object):
     _fixup_Destructor = _fixup_Ignored
     _fixup_OperatorMethod = _fixup_Ignored
    
+    #--------------------------------------------------------------------------
+    # Pruning
+    #--------------------------------------------------------------------------
+
+    # The node attributes that hold the xml ids of other nodes before
+    # the fixups. Namespace members are not followed, namespaces only
+    # keep the members that are kept for other reasons.
+    _reference_attrs = {
+        c_ast.Typedef: ('typ', 'context'),
+        c_ast.Variable: ('typ', 'context'),
+        c_ast.Field: ('typ', 'context'),
+        c_ast.PointerType: ('typ',),
+        c_ast.ArrayType: ('typ',),
+        c_ast.CvQualifiedType: ('typ',),
+        c_ast.Function: ('returns', 'context'),
+        c_ast.OperatorFunction: ('returns', 'context'),
+        c_ast.FunctionType: ('returns',),
+    }
+
+    def _references(self, node):
+        refs = [getattr(node, attr) for attr in
+                self._reference_attrs.get(type(node), ())]
+        if isinstance(node, (c_ast.Struct, c_ast.Union)):
+            refs.extend(node.members)
+            refs.extend(node.bases)
+            refs.append(node.context)
+        elif isinstance(node, (c_ast.Function, c_ast.FunctionType,
+                               c_ast.OperatorFunction)):
+            refs.extend(arg.typ for arg in node.arguments)
+        return refs
+
+    def prune(self):
+        """ Drops the nodes that are not located in one of the main
+        files and are not referenced, directly or indirectly, by one
+        that is. This happens before the fixups, while the references
+        are still xml ids. Namespaces and files are always kept.
+
+        The File elements come last in the xml of gccxml and castxml,
+        so this can only be done once they have all arrived.
+
+        """
+        main_file_ids = self.main_file_ids
+        keep = set()
+        stack = []
+        for idx, node in self.all.scan():
+            if isinstance(node, (c_ast.Namespace, c_ast.File)) or \
+                    (node._location is not None and
+                     node._location[0] in main_file_ids):
+                keep.add(idx)
+                stack.append(idx)
+
+        while stack:
+            node = self.all[stack.pop()]
+            for ref in self._references(node):
+                if ref not in keep and ref in self.all:
+                    keep.add(ref)
+                    stack.append(ref)
+
+        self.all.retain(keep)
+        for node in self.all.itervalues():
+            if isinstance(node, c_ast.Namespace):
+                node.members = array('i', [m for m in node.members
+                                           if m in keep])
+
     #--------------------------------------------------------------------------
     # Post parsing helpers
     #--------------------------------------------------------------------------
@@ -455,7 +590,7 @@ class GCCXMLParser(object):
             name, body = m.split(None, 1)
             name, args = name.split('(', 1)
             args = '(%s' % args
-            self.all[name] = c_ast.Macro(name, args, body)
+            self.all.add(c_ast.Macro(name, args, body))
 
     def get_aliases(self, text, namespace):
         """ Attemps to extract defined aliases of the form
@@ -471,7 +606,7 @@ class GCCXMLParser(object):
             name, value = a.split(None, 1)
             a = c_ast.Alias(name, value)
             aliases[name] = a
-            self.all[name] = a
+            self.all.add(a)
 
         # The alias value will be located in the namespace,
         # or the aliases. Otherwise, it's unfound.
@@ -498,27 +633,30 @@ class GCCXMLParser(object):
         elif self.cvs_revision < (1, 114):
             warnings.warn('CVS Revision of GCCXML is %d.%d' % self.cvs_revision)
 
+        # Drop what the main files don't need before the fixups
+        if self.main_files is not None:
+            self.prune()
+
         # Gather any macros.
         self.get_macros(self.cpp_data.get('functions'))
 
         # Walk through all the items, hooking up the appropriate 
         # links by replacing the id tags with the actual objects
         remove = []
-        for name, node in self.all.items():
-            location = getattr(node, 'location', None)
-            if location is not None:
-                fil, line = location.split(':')
-                node.location = (self.all[fil].name, int(line))
+        for idx, node in self.all.iteritems():
+            if node._location is not None:
+                fil, line = node._location
+                node.location = (self.all[fil].name, line)
             method_name = '_fixup_' + node.__class__.__name__
             fixup_method = getattr(self, method_name, None)
             if fixup_method is not None:
                 fixup_method(node)
             else:
-                remove.append(node)
+                remove.append(idx)
         
         # remove any nodes don't have handler methods
-        for n in remove:
-            del self.all[n]
+        for idx in remove:
+            del self.all[idx]
                
         # sub out any #define'd aliases and collect all the nodes 
         # we're interested in. The interesting nodes are not necessarily
@@ -530,7 +668,7 @@ class GCCXMLParser(object):
 
         result = []
         namespace = {}
-        for node in self.all.values():
+        for node in self.all.itervalues():
             if not isinstance(node, interesting):
                 continue
             name = getattr(node, 'name', None)
@@ -538,13 +676,15 @@ class GCCXMLParser(object):
                 namespace[name] = node
             result.append(node)
         self.get_aliases(self.cpp_data.get('aliases'), namespace)
-        
+
+        self.all.close()
+        self.location_keys = {}
         return result
 
 
-def parse(xmlfile):
+def parse(xmlfile, main_files=None, node_store=None):
     # parse an XML file into a sequence of type descriptions
-    parser = GCCXMLParser()
+    parser = GCCXMLParser(main_files, node_store)
     parser.parse(xmlfile)
     items = parser.get_result()
     return items
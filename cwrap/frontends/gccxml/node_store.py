@@ -0,0 +1,267 @@
+#------------------------------------------------------------------------------
+# Node stores of the gccxml parser
+#------------------------------------------------------------------------------
+# The parser keeps the nodes of an xml file in a store indexed by dense
+# integer ids until `GCCXMLParser.get_result` hooks them up. NodeStore
+# keeps them in a list. SpillingNodeStore keeps only the most recently
+# read nodes in memory and writes the others to a SQLite database in a
+# temporary directory, for xml dumps that don't fit in memory.
+from array import array
+import cPickle
+import os
+import shutil
+import sqlite3
+import tempfile
+
+
+class _IdTable(dict):
+    """ Maps xml id strings to the integer ids of a node store. Unseen
+    ids get the next free id of the store.
+
+    """
+    def __init__(self, store):
+        dict.__init__(self)
+        self.store = store
+
+    def __missing__(self, xml_id):
+        idx = self[xml_id] = self.store.allocate()
+        return idx
+
+
+def ids_array(ids, xml_ids):
+    """ Returns the integer ids of a space separated list of xml ids
+    as an array.
+
+    """
+    return array('i', [ids[xml_id] for xml_id in xml_ids.split()])
+
+
+class NodeStore(list):
+    """ The nodes of a gccxml file in a list, indexed by dense integer
+    ids. The xml id strings (`_123`, `_123c`, `f3`, ...) are mapped to
+    integers by `ids` in the order they are first seen, so references
+    can be resolved before the node they refer to has been read. Ids
+    without a node hold None.
+
+    """
+    def __init__(self):
+        list.__init__(self)
+        self.ids = _IdTable(self)
+
+    def allocate(self):
+        self.append(None)
+        return len(self) - 1
+
+    def ids_array(self, xml_ids):
+        return ids_array(self.ids, xml_ids)
+
+    def add(self, node):
+        """ Stores a node that has no xml id and returns its id.
+
+        """
+        self.append(node)
+        return len(self) - 1
+
+    def __delitem__(self, idx):
+        self[idx] = None
+
+    def __contains__(self, idx):
+        return self[idx] is not None
+
+    def iteritems(self):
+        for idx, node in enumerate(self):
+            if node is not None:
+                yield idx, node
+
+    def itervalues(self):
+        for node in self:
+            if node is not None:
+                yield node
+
+    # all nodes are in memory anyway
+    scan = iteritems
+
+    def retain(self, keep):
+        """ Drops all nodes whose id is not in `keep`.
+
+        """
+        for idx in xrange(len(self)):
+            if idx not in keep:
+                self[idx] = None
+
+    def release(self):
+        """ Called by the parser between toplevel elements, when no node
+        is being built.
+
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class SpillingNodeStore(object):
+    """ A node store for xml dumps that don't fit in memory. While the
+    xml is read, at most `cache_size` nodes are held in memory; the
+    others are pickled into a SQLite database in a temporary directory
+    below `directory`.
+
+    Once the parser starts reading nodes back, everything is written
+    out. Nodes that are read with `[]` or `iteritems` are kept in
+    memory from then on, so that each id stays one node object. `scan`
+    streams over the nodes in id order without keeping them. With the
+    pruning of GCCXMLParser only the nodes the main files need are
+    ever read back, so memory is bounded by `cache_size` and the size
+    of the result, not by the size of the dump. The id table is still
+    kept in memory.
+
+    """
+    def __init__(self, cache_size=100000, directory=None):
+        self.ids = _IdTable(self)
+        self.cache_size = cache_size
+        self.size = 0
+        # nodes not written yet
+        self.pending = {}
+        # nodes read back, or added once reading started
+        self.loaded = {}
+        self.deleted = set()
+        self.keep = None
+        # ids below `written` are in the database
+        self.written = None
+
+        self.directory = tempfile.mkdtemp(prefix='cwrap-nodes-', dir=directory)
+        self.db = sqlite3.connect(os.path.join(self.directory, 'nodes.db'))
+        self.db.text_factory = str
+        self.db.execute('PRAGMA journal_mode = OFF')
+        self.db.execute('PRAGMA synchronous = OFF')
+        self.db.execute('CREATE TABLE nodes (id INTEGER PRIMARY KEY, '
+                        'data BLOB)')
+
+    #--------------------------------------------------------------------------
+    # Writing
+    #--------------------------------------------------------------------------
+    def allocate(self):
+        idx = self.size
+        self.size += 1
+        return idx
+
+    def ids_array(self, xml_ids):
+        return ids_array(self.ids, xml_ids)
+
+    def add(self, node):
+        idx = self.allocate()
+        self[idx] = node
+        return idx
+
+    def __setitem__(self, idx, node):
+        if self.written is None:
+            self.pending[idx] = node
+        else:
+            self.loaded[idx] = node
+            if self.keep is not None:
+                self.keep.add(idx)
+
+    def release(self):
+        if len(self.pending) >= self.cache_size:
+            self._write()
+
+    def _write(self):
+        rows = [(idx, self._dump(node))
+                for idx, node in self.pending.iteritems()]
+        self.db.executemany('INSERT INTO nodes VALUES (?, ?)', rows)
+        self.pending = {}
+
+    def _start_reading(self):
+        if self.written is None:
+            self._write()
+            self.db.commit()
+            self.written = self.size
+
+    # The parser keeps the (file id, line) of the xml in `_location`
+    # until `get_result`, which C_ASTNode.__getstate__ can't decode.
+    def _dump(self, node):
+        location = node._location
+        node._location = None
+        try:
+            return cPickle.dumps((node, location), 2)
+        finally:
+            node._location = location
+
+    def _load(self, data):
+        node, location = cPickle.loads(str(data))
+        node._location = location
+        return node
+
+    #--------------------------------------------------------------------------
+    # Reading
+    #--------------------------------------------------------------------------
+    def _absent(self, idx):
+        return idx in self.deleted or \
+            (self.keep is not None and idx not in self.keep)
+
+    def __getitem__(self, idx):
+        node = self.loaded.get(idx)
+        if node is not None:
+            return node
+        self._start_reading()
+        if idx >= self.written or self._absent(idx):
+            return None
+        row = self.db.execute('SELECT data FROM nodes WHERE id = ?',
+                              (idx,)).fetchone()
+        if row is None:
+            return None
+        node = self.loaded[idx] = self._load(row[0])
+        return node
+
+    def __delitem__(self, idx):
+        self.loaded.pop(idx, None)
+        self.deleted.add(idx)
+
+    def __contains__(self, idx):
+        return self[idx] is not None
+
+    def _iterate(self, memoize):
+        self._start_reading()
+        loaded = self.loaded
+        for idx, data in self.db.execute('SELECT id, data FROM nodes '
+                                         'ORDER BY id'):
+            node = loaded.get(idx)
+            if node is None:
+                if self._absent(idx):
+                    continue
+                node = self._load(data)
+                if memoize:
+                    loaded[idx] = node
+            yield idx, node
+        # the nodes added since reading started
+        for idx in sorted(loaded):
+            if idx >= self.written:
+                yield idx, loaded[idx]
+
+    def iteritems(self):
+        return self._iterate(True)
+
+    def itervalues(self):
+        for idx, node in self._iterate(True):
+            yield node
+
+    def scan(self):
+        return self._iterate(False)
+
+    def retain(self, keep):
+        self.keep = set(keep)
+        for idx in self.loaded.keys():
+            if idx not in self.keep:
+                del self.loaded[idx]
+
+    def close(self):
+        """ Deletes the database. The nodes read back stay valid.
+
+        """
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,268 @@
+""" Runs the xml generating compiler (gccxml or castxml) for many
+headers at once.
+
+Up to `size` compiler processes run at the same time. Their output is
+multiplexed with select() in the calling process: xml that arrives on
+a stdout pipe is fed to the GCCXMLParser of its header right away, so
+parsing overlaps with the compilers that are still running. Compilers
+that can only write the xml to a file are parsed when they exit.
+
+With a `cache` (see xml_cache.py), jobs that have a cache key are
+parsed from the cached xml if the header and its includes are
+unchanged, and the xml of the others is stored once they succeed.
+
+"""
+# Stdlib imports
+import collections
+import errno
+import multiprocessing
+import os
+import select
+import subprocess
+import sys
+import tempfile
+
+# Local package imports
+from . import gccxml_parser
+from . import node_store
+from . import xml_cache
+
+
+class XMLJob(object):
+    """ A compiler run for a single header. `command` writes the xml
+    to stdout, unless `xml_path` names the file it writes it to.
+    `cache_key` is the key of its xml in the pool's cache, if any.
+    `main_files` is passed on to the GCCXMLParser. If `spill_nodes` is
+    set, the parser keeps at most that many nodes in memory while
+    reading the xml, see SpillingNodeStore.
+
+    """
+    def __init__(self, path, command, xml_path=None, cache_key=None,
+                 main_files=None, spill_nodes=None):
+        self.path = path
+        self.command = command
+        self.xml_path = xml_path
+        self.cache_key = cache_key
+        self.main_files = main_files
+        self.spill_nodes = spill_nodes
+
+    def parser(self):
+        """ Returns a new GCCXMLParser for the xml of this job.
+
+        """
+        store = None
+        if self.spill_nodes:
+            store = node_store.SpillingNodeStore(self.spill_nodes)
+        return gccxml_parser.GCCXMLParser(self.main_files, store)
+
+
+class XMLResult(object):
+    """ The outcome of a job. `items` holds the c_ast items on success;
+    on failure it is None and `error` describes what went wrong.
+
+    """
+    def __init__(self, path, items=None, error=None):
+        self.path = path
+        self.items = items
+        self.error = error
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+class _Running(object):
+    """ A started job: the compiler process and the parser its output
+    is fed to.
+
+    """
+    def __init__(self, job_id, job, keep_xml=False):
+        self.job_id = job_id
+        self.job = job
+        # the xml is kept for the cache
+        self.keep_xml = keep_xml
+        self.chunks = []
+        self.xml = None
+        self.parser = None
+        # the parse error of a streamed job, as returned by exc_info
+        self.parse_error = None
+        # diagnostics are only read when the compiler fails; a file
+        # keeps it from blocking on a full stderr pipe
+        self.errors = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(job.command,
+                                            stdout=subprocess.PIPE,
+                                            stderr=self.errors)
+        except:
+            self.errors.close()
+            raise
+        self.fd = self.process.stdout.fileno()
+        # the node store of the parser may be a database on disk, it
+        # is only made once the compiler runs
+        try:
+            self.parser = job.parser()
+        except:
+            self.kill()
+            raise
+
+    def fileno(self):
+        return self.fd
+
+    @property
+    def streaming(self):
+        return self.job.xml_path is None
+
+    def feed(self, data):
+        if not self.streaming or self.parse_error is not None:
+            # gccxml writes the preprocessed source to stdout
+            return
+        if self.keep_xml:
+            self.chunks.append(data)
+        try:
+            self.parser.feed(data)
+        except Exception:
+            self.parse_error = sys.exc_info()
+
+    def close(self):
+        """ Closes the node store of the parser and the diagnostics.
+        The nodes of a finished parse stay valid.
+
+        """
+        if self.parser is not None:
+            self.parser.all.close()
+        self.errors.close()
+
+    def kill(self):
+        """ Stops the compiler if it is still running and closes
+        everything.
+
+        """
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.close()
+
+    def finish(self):
+        """ Waits for the compiler and returns the XMLResult.
+
+        """
+        self.process.stdout.close()
+        self.process.wait()
+        try:
+            return self._result()
+        finally:
+            self.close()
+
+    def _result(self):
+        path = self.job.path
+        if self.process.returncode != 0:
+            # compilers write incomplete xml for headers with errors,
+            # their diagnostics are more useful than the parse error
+            self.errors.seek(0)
+            error = '%s failed on %s:\n%s' % (self.job.command[0], path,
+                                              self.errors.read())
+            return XMLResult(path, error=error)
+        try:
+            if self.streaming:
+                if self.parse_error is not None:
+                    raise self.parse_error[0], self.parse_error[1], \
+                        self.parse_error[2]
+                self.parser.close()
+                if self.keep_xml:
+                    self.xml = ''.join(self.chunks)
+                    self.chunks = []
+            else:
+                self.parser.parse(self.job.xml_path)
+                if self.keep_xml:
+                    with open(self.job.xml_path, 'rb') as f:
+                        self.xml = f.read()
+            items = self.parser.get_result()
+        except Exception, e:
+            return XMLResult(path, error='Could not parse the xml of %s: %s'
+                             % (path, e))
+        return XMLResult(path, items=items)
+
+
+class ProcessPool(object):
+    """ Runs XMLJobs in up to `size` compiler processes at a time,
+    by default one per cpu. `cache` is an optional cwrap.cache.Cache
+    for the xml.
+
+    """
+    def __init__(self, size=None, cache=None):
+        self.size = size or multiprocessing.cpu_count()
+        self.cache = cache
+
+    def parse(self, jobs):
+        """ Runs `jobs`, a list of XMLJob, and returns a list of
+        XMLResult objects in the order of `jobs`.
+
+        """
+        results = [None] * len(jobs)
+        pending = collections.deque()
+        for job_id, job in enumerate(jobs):
+            result = self.lookup(job)
+            if result is not None:
+                results[job_id] = result
+            else:
+                pending.append((job_id, job))
+
+        running = []
+        try:
+            while pending or running:
+                while pending and len(running) < self.size:
+                    job_id, job = pending.popleft()
+                    try:
+                        keep_xml = self.cache is not None and \
+                            job.cache_key is not None
+                        running.append(_Running(job_id, job, keep_xml))
+                    except OSError, e:
+                        msg = 'Could not run %s: %s' % (job.command[0], e)
+                        results[job_id] = XMLResult(job.path, error=msg)
+
+                if not running:
+                    continue
+                try:
+                    ready, _, _ = select.select(running, [], [])
+                except select.error, e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+
+                for run in ready:
+                    data = os.read(run.fd, 1 << 16)
+                    if data:
+                        run.feed(data)
+                    else:
+                        running.remove(run)
+                        results[run.job_id] = self.finish(run)
+        finally:
+            for run in running:
+                run.kill()
+        return results
+
+    def lookup(self, job):
+        """ Returns the XMLResult of `job` from the cache, or None.
+
+        """
+        if self.cache is None or job.cache_key is None:
+            return None
+        data = self.cache.lookup(job.cache_key)
+        if data is None:
+            return None
+        try:
+            items = xml_cache.parse_cached(data, job.parser())
+        except Exception:
+            # a corrupt entry is just a miss
+            return None
+        return XMLResult(job.path, items=items)
+
+    def finish(self, run):
+        result = run.finish()
+        if run.xml is not None and not result.failed:
+            self.cache.store(run.job.cache_key,
+                             xml_cache.source_files(result.items),
+                             xml_cache.compress(run.xml))
+            run.xml = None
+        return result
@@ -0,0 +1,85 @@
+#------------------------------------------------------------------------------
+# Cache of the xml written by gccxml and castxml
+#------------------------------------------------------------------------------
+# Running the compiler is by far the most expensive step of the xml
+# frontends. Its output is kept gzipped in a `cwrap.cache.Cache`, keyed
+# on the command line (header, include dirs, emulated compiler) and the
+# version banner of the tool. The files named in the <File> elements of
+# the xml are the include closure of the header; the cache only reuses
+# the xml while all of them are unchanged.
+import cStringIO
+import gzip
+import os
+import subprocess
+
+# Local package imports
+from . import c_ast
+
+
+# bump when the way the xml is produced or stored changes
+FORMAT_VERSION = 1
+
+SUFFIX = '.xml.gz'
+
+
+_versions = {}
+
+def tool_version(command):
+    """ Returns the version banner of the xml generating tool.
+
+    """
+    executable = command[0]
+    if executable not in _versions:
+        try:
+            proc = subprocess.Popen([executable, '--version'],
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT)
+            _versions[executable] = proc.communicate()[0]
+        except OSError:
+            _versions[executable] = ''
+    return _versions[executable]
+
+
+def cache_key(command, exclude=()):
+    """ Returns the cache key for running `command`. Arguments in
+    `exclude` are left out, e.g. the name of a temporary output file.
+
+    """
+    args = [arg for arg in command if arg not in exclude]
+    return ['xml', FORMAT_VERSION, args, tool_version(command)]
+
+
+def compress(xml):
+    out = cStringIO.StringIO()
+    f = gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6)
+    try:
+        f.write(xml)
+    finally:
+        f.close()
+    return out.getvalue()
+
+
+def parse_cached(data, parser):
+    """ Returns the c_ast items of the gzipped xml `data`, as parsed by
+    the GCCXMLParser `parser`.
+
+    """
+    xml = gzip.GzipFile(fileobj=cStringIO.StringIO(data), mode='rb')
+    try:
+        parser.parse(xml)
+        return parser.get_result()
+    except:
+        parser.all.close()
+        raise
+
+
+def source_files(items):
+    """ Returns the real files among the File items, i.e. the include
+    closure of the header.
+
+    """
+    files = []
+    for item in items:
+        if isinstance(item, c_ast.File) and os.path.isfile(item.name):
+            files.append(os.path.abspath(item.name))
+    return files
@@ -0,0 +1,185 @@
+""" Structural hashes of c_ast trees, for the c_ast modules of all the
+frontends.
+
+The structural hash of a node covers its kind, its name and its other
+plain attributes, and the hashes of the nodes it is made of: the types
+of fields and arguments, return types, typedef targets, members and
+bases. Named structs, unions, enumerations and typedefs that a node
+refers to count by kind and name only, as in C, so recursive types can
+be hashed and a declaration's hash only changes with the declaration
+itself. Neither the location nor the context of a node is part of its
+hash, so identical anonymous structs or function pointer types in
+different places hash the same.
+
+Hashes are sha1 hex digests that are stable across runs, so they can
+be used as keys of on-disk caches. A node's hash is computed once and
+cached on the node, so nodes must not be changed after they have been
+hashed, i.e. hash after the c_ast transformations.
+
+"""
+import hashlib
+
+
+# attributes that refer to other nodes
+_child_attrs = ('typ', 'returns', 'arguments', 'members', 'values',
+                'bases', 'decl')
+
+# plain attributes, which need a stable repr
+_value_attrs = ('name', 'typedef_name', 'size', 'align', 'const',
+                'volatile', 'min', 'max', 'bits', 'offset', 'value',
+                'init', 'attributes', 'extern', 'args', 'body')
+
+# declarations that are referred to by name
+_nominal_kinds = frozenset(['Struct', 'Union', 'Enumeration', 'Typedef',
+                            'Class', 'ClassTemplate', 'Namespace', 'File'])
+
+# nodes that make up types rather than declare something
+_type_kinds = frozenset(['FundamentalType', 'CvQualifiedType',
+                         'PointerType', 'ArrayType', 'FunctionType',
+                         'RefType'])
+
+_class_attrs = {}
+
+
+def _attrs(cls):
+    """ Returns the plain and the child attributes that nodes of class
+    `cls` have.
+
+    """
+    attrs = _class_attrs.get(cls)
+    if attrs is None:
+        attrs = _class_attrs[cls] = (
+            [attr for attr in _value_attrs if hasattr(cls, attr)],
+            [attr for attr in _child_attrs if hasattr(cls, attr)])
+    return attrs
+
+
+def _nominal(node):
+    """ Returns how `node` counts in the hash of a node that refers to
+    it, if it is a named declaration, else None.
+
+    """
+    kind = node.__class__.__name__
+    if kind in _nominal_kinds and node.name:
+        return '%s %s' % (kind, node.name)
+    return None
+
+
+def _children(node):
+    for attr in _attrs(node.__class__)[1]:
+        value = getattr(node, attr, None)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            for child in value:
+                yield child
+        else:
+            yield value
+
+
+def _reference(node):
+    ref = _nominal(node)
+    if ref is None:
+        ref = getattr(node, '_hash', None)
+        if ref is None:
+            # only unnamed nodes that contain themselves get here
+            ref = 'cycle %s' % node.__class__.__name__
+    return ref
+
+
+def _digest(node):
+    value_attrs, child_attrs = _attrs(node.__class__)
+    parts = [node.__class__.__name__]
+    for attr in value_attrs:
+        parts.append('%s=%r' % (attr, getattr(node, attr, None)))
+    for attr in child_attrs:
+        value = getattr(node, attr, None)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            refs = [_reference(child) for child in value]
+            parts.append('%s=[%s]' % (attr, ','.join(refs)))
+        else:
+            parts.append('%s=%s' % (attr, _reference(value)))
+    return hashlib.sha1('\n'.join(parts)).hexdigest()
+
+
+def structural_hash(node):
+    """ Returns the structural hash of the c_ast `node`. The hashes of
+    the nodes it is made of are computed first, bottom-up, and cached
+    on them as well.
+
+    """
+    digest = getattr(node, '_hash', None)
+    if digest is not None:
+        return digest
+
+    stack = [node]
+    expanded = set()
+    while stack:
+        current = stack[-1]
+        if getattr(current, '_hash', None) is not None:
+            stack.pop()
+            continue
+        if id(current) not in expanded:
+            expanded.add(id(current))
+            pending = [child for child in _children(current)
+                       if _nominal(child) is None and
+                       getattr(child, '_hash', None) is None and
+                       id(child) not in expanded]
+            if pending:
+                stack.extend(pending)
+                continue
+        # interned nodes are immutable, but the hash is derived
+        object.__setattr__(current, '_hash', _digest(current))
+        stack.pop()
+    return node._hash
+
+
+class HashConsTable(object):
+    """ The canonical instance of every type subtree by structural
+    hash. The first instance of a hash that is seen becomes the
+    canonical one.
+
+    """
+    def __init__(self):
+        self.nodes = {}
+
+    def canonical(self, node):
+        return self.nodes.setdefault(structural_hash(node), node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def hash_cons(items, table=None):
+    """ Replaces the type subtrees in the c_ast `items` (e.g. the type
+    of a field or argument, or a return type) by the canonical instance
+    of their structural hash in `table`, so that structurally identical
+    types share one instance. Returns the table.
+
+    """
+    if table is None:
+        table = HashConsTable()
+    stack = list(items)
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        # interned nodes only refer to interned nodes already
+        frozen = getattr(node, '_frozen', False)
+        for attr in _attrs(node.__class__)[1]:
+            value = getattr(node, attr, None)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                stack.extend(value)
+                continue
+            if attr in ('typ', 'returns') and not frozen and \
+                    value.__class__.__name__ in _type_kinds:
+                value = table.canonical(value)
+                setattr(node, attr, value)
+            stack.append(value)
+    return table
@@ -1,8 +1,9 @@
 # inspired by http://eli.thegreenplace.net/2011/07/03/parsing-c-in-python-with-clang/
 
 import sys, os
-import clang.cindex
-from clang.cindex import TypeKind, CursorKind
+# the bundled bindings, which provide the cursor search API
+from cwrap.frontends.clang import clang
+from cwrap.frontends.clang.clang.cindex import TypeKind, CursorKind
 
 def verbose(*args, **kwargs):
     '''filter predicate for show_ast: show all'''
@@ -60,55 +61,55 @@ def show_comment(comment, level):
     
 
 def show_ast(cursor, filter_pred=verbose, level=Level()):
-    '''pretty print cursor AST'''
-    if filter_pred(cursor, level):
-        print
-        level.show(cursor.kind, 
-                   repr(cursor.spelling), 
-                   repr(cursor.displayname), 
-                   #cursor.location,
-                   #cursor.extent,
-                   )
-        #T = ' '.join([t.spelling for t in cursor.get_tokens()][:-1]) #one token too much?
-        #level.show('token: ', T)
-
-        if cursor.get_brief_comment_text() is not None:
-            level.show('#', cursor.get_brief_comment_text())
-        if cursor.get_raw_comment_text():
-            #level.show('##', cursor.get_raw_comment_text())
-            comment = cursor.get_parsed_comment()
-            show_comment(comment, level)
-            
-        if cursor.kind.is_preprocessing():
-            print "PREPROCESSING"
-            print cursor.location
-            T = '|'.join([t.spelling for t in cursor.get_tokens()][:-1]) #one token too much?
-            level.show('token: ', T)
-
-
-        if is_valid_type(cursor.type):
-            show_type(cursor.type, level+1, 'type:')
-            #show_type(cursor.type.get_canonical(), level+1, 'canonical type:')
-
-        if cursor.kind is CursorKind.ENUM_CONSTANT_DECL:
-            level.show('value:', cursor.enum_value)
-
-        if cursor.kind is CursorKind.INTEGER_LITERAL:
-            level.show([t.spelling for t in cursor.get_tokens()][:-1])
-
-        if cursor.kind is CursorKind.FUNCTION_DECL:
-            show_type(cursor.result_type, level+1, 'result type:')
-            t = cursor.type
-            for k, arg in enumerate(t.argument_types()):
-                show_type(arg, level+1, 'argument %d'%k)
-
-        if cursor.kind is CursorKind.TYPEDEF_DECL:
-            show_type(cursor.underlying_typedef_type, level+1, 'typedef type')
-            (level+1).show('typedef type declaration:', cursor.underlying_typedef_type.get_declaration().spelling, )
-
-
-        for c in cursor.get_children():
-            show_ast(c, filter_pred, level+1)
+    '''pretty print cursor AST, descending into the children accepted by filter_pred'''
+    print
+    level.show(cursor.kind, 
+               repr(cursor.spelling), 
+               repr(cursor.displayname), 
+               #cursor.location,
+               #cursor.extent,
+               )
+    #T = ' '.join([t.spelling for t in cursor.get_tokens()][:-1]) #one token too much?
+    #level.show('token: ', T)
+
+    if cursor.get_brief_comment_text() is not None:
+        level.show('#', cursor.get_brief_comment_text())
+    if cursor.get_raw_comment_text():
+        #level.show('##', cursor.get_raw_comment_text())
+        comment = cursor.get_parsed_comment()
+        show_comment(comment, level)
+        
+    if cursor.kind.is_preprocessing():
+        print "PREPROCESSING"
+        print cursor.location
+        T = '|'.join([t.spelling for t in cursor.get_tokens()][:-1]) #one token too much?
+        level.show('token: ', T)
+
+
+    if is_valid_type(cursor.type):
+        show_type(cursor.type, level+1, 'type:')
+        #show_type(cursor.type.get_canonical(), level+1, 'canonical type:')
+
+    if cursor.kind is CursorKind.ENUM_CONSTANT_DECL:
+        level.show('value:', cursor.enum_value)
+
+    if cursor.kind is CursorKind.INTEGER_LITERAL:
+        level.show([t.spelling for t in cursor.get_tokens()][:-1])
+
+    if cursor.kind is CursorKind.FUNCTION_DECL:
+        show_type(cursor.result_type, level+1, 'result type:')
+        t = cursor.type
+        for k, arg in enumerate(t.argument_types()):
+            show_type(arg, level+1, 'argument %d'%k)
+
+    if cursor.kind is CursorKind.TYPEDEF_DECL:
+        show_type(cursor.underlying_typedef_type, level+1, 'typedef type')
+        (level+1).show('typedef type declaration:', cursor.underlying_typedef_type.get_declaration().spelling, )
+
+
+    children = cursor.find_all(lambda c: filter_pred(c, level+1))
+    for c in children:
+        show_ast(c, filter_pred, level+1)
 
 def print_diag_info(diag):
     print 'location:', diag.location
@@ -42,7 +42,8 @@ if __name__ == '__main__':
 
     inputfile = '#include <' + headername + '>'
 
-    ast_items = clang_parser.parse([('input.h', inputfile)], include_dirs, '')
+    ast_items = clang_parser.parse([('input.h', inputfile)], include_dirs, '',
+                                   main_files=[headername])
     trans_items = ast_transforms.apply_c_ast_transformations(ast_items)
     container = ast_transforms.CAstContainer(trans_items, headername,
                                              outfile, None)
@@ -2,14 +2,24 @@ from cwrap.config import Config, File
 import sys
 
 print sys.argv
-if len(sys.argv) > 1:
-    files = [File(f) for f in sys.argv[1:]]
+args = sys.argv[1:]
+# --cache-stats reports the hit rates of the xml cache
+cache_stats = '--cache-stats' in args
+args = [arg for arg in args if arg != '--cache-stats']
+if args:
+    files = [File(f) for f in args]
 else:
     files = [File('test.h')]
 
 if __name__ == '__main__':
     #config = Config('gccxml', files=files, save_dir = 'tests/result_gccxml')
     #config.generate()
+
+    #config = Config('castxml', files=files, save_dir = 'tests/result_castxml',
+    #                castxml_cc = ('gnu', 'gcc'),
+    #                xml_cache = '.cwrap_cache', cache_stats = cache_stats,
+    #                spill_nodes = 100000)
+    #config.generate()
     
     print '------------------------'
     print
@@ -20,5 +30,17 @@ if __name__ == '__main__':
                           #extern_name = '',
                           #implementation_name = '',
                           #language = 'c++',
+                          #namespaces = ['mylib'],
+                          #parse_workers = 4,
+                          #parse_timeout = 60,
+                          #parse_memory_limit = 2 * 1024**3,
+                          #preprocessor = 'clang -E',
+                          #preprocess_cache = '.cwrap_cache',
+                          #numpy_dtypes = True,
+                          #tree_shaking = True,
+                          #shake_roots = ['my_func'],
+                          #share_declarations = True,
+                          #render_cache = '.cwrap_cache/render',
+                          #verify_render_cache = True,
                           )
     config_clang.generate()
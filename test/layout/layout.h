@@ -0,0 +1,28 @@
+typedef unsigned int flags_t;
+
+enum color { RED, GREEN, BLUE };
+
+struct point {
+    char tag;
+    double x;
+    double y;
+};
+
+typedef struct {
+    struct point corners[2];
+    enum color color;
+    flags_t flags;
+    char label[12];
+    short grid[2][3];
+    void *user;
+    unsigned int dirty : 1;
+    unsigned int level : 4;
+} shape_t;
+
+union value {
+    int i;
+    double d;
+    char bytes[8];
+};
+
+struct incomplete;
@@ -0,0 +1,32 @@
+# This code was automatically generated by CWrap version 0.0.0
+#
+# NumPy dtypes with the memory layout of the structs and unions of
+# "layout.h". Bitfields can't be represented and are left out; their bits
+# are part of the padding.
+
+import numpy
+
+point = numpy.dtype({
+    'names': ['tag', 'x', 'y'],
+    'formats': ['S1', 'd', 'd'],
+    'offsets': [0, 8, 16],
+    'itemsize': 24,
+})
+
+# shape_t.dirty: 1 bits at bit 704
+# shape_t.level: 4 bits at bit 705
+shape_t = numpy.dtype({
+    'names': ['corners', 'color', 'flags', 'label', 'grid', 'user'],
+    'formats': [(point, (2,)), 'u4', 'I', 'S12', ('h', (2, 3)), 'P'],
+    'offsets': [0, 48, 52, 56, 68, 80],
+    'itemsize': 96,
+})
+
+value = numpy.dtype({
+    'names': ['i', 'd', 'bytes'],
+    'formats': ['i', 'd', 'S8'],
+    'offsets': [0, 0, 0],
+    'itemsize': 8,
+})
+
+
@@ -0,0 +1,16 @@
+namespace detail {
+
+struct Used {
+    int a;
+};
+
+struct Unused {
+    int b;
+};
+
+class Helper {
+public:
+    int help(int x);
+};
+
+}
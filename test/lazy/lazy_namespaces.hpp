@@ -0,0 +1,12 @@
+#include "lazy_detail.hpp"
+
+namespace lib {
+
+int process(detail::Used *used);
+
+class Engine {
+public:
+    int run(detail::Helper *helper);
+};
+
+}
@@ -0,0 +1,19 @@
+# This code was automatically generated by CWrap version 0.0.0
+
+cdef extern from "lazy_namespaces.hpp":
+
+    cdef struct Used:
+        int a
+
+    cdef cppclass Helper:
+        int help(int x)
+
+
+    int process(Used *used)
+
+    cdef cppclass Engine:
+        int run(Helper *helper)
+
+
+
+
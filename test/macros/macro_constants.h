@@ -0,0 +1,25 @@
+#include <stddef.h>
+
+#define MACRO_H_INCLUDED
+
+#define ANSWER 42
+#define HEX_MASK 0xFFu
+#define SHIFTED (1 << 4)
+#define COMBINED (ANSWER + SHIFTED * 2)
+#define NEGATIVE -7
+#define CAST_FLAG ((unsigned long)1 << 3)
+#define CHAR_CONST 'A'
+#define ALL_BITS (~0u)
+#define WRAPPED (0u - 1 > 0)
+#define BAD_SHIFT (1 << -1)
+
+#define PI 3.14159
+#define HALF_PI (PI / 2)
+
+#define GREETING "hello"
+#define GREETING_WORLD GREETING " world"
+
+#define MAX(a, b) ((a) > (b) ? (a) : (b))
+#define NOT_A_CONSTANT size_t
+
+int use_answer(int x);
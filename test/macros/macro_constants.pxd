@@ -0,0 +1,21 @@
+# This code was automatically generated by CWrap version 0.0.0
+
+cdef extern from "macro_constants.h":
+
+    int use_answer(int x)
+
+    cdef enum:
+        ANSWER = 42
+        HEX_MASK = 255
+        SHIFTED = 16
+        COMBINED = 74
+        NEGATIVE = -7
+        CAST_FLAG = 8
+        CHAR_CONST = 65
+        ALL_BITS = 4294967295
+        WRAPPED = 1
+
+    const double PI
+    const double HALF_PI
+    const char *GREETING
+    const char *GREETING_WORLD
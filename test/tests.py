@@ -1,5 +1,13 @@
 import os
+import shutil
+import tempfile
 import unittest
+from distutils.spawn import find_executable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from cwrap import frontends
 from cwrap.backend import renderer
@@ -15,14 +23,16 @@ def create_test(filename):
     return do_test_file
 
 
-class TestFiles(unittest.TestCase):
+class ConverterTestCase(unittest.TestCase):
+
+    frontend_name = 'clang'
 
     def setUp(self):
-        self.frontend = frontends.get_frontend('clang')
+        self.frontend = frontends.get_frontend(self.frontend_name)
 
-    def convert(self, filename):
+    def convert(self, filename, **metadata):
         files = [File(filename)]
-        config = Config('clang', files=files)
+        config = Config(self.frontend_name, files=files, **metadata)
         asts = self.frontend.generate_asts(config)
         print '\n\n\nvmx: asts:\n', asts, '\n\n\n\n\n'
         ast_renderer = renderer.ASTRenderer()
@@ -46,6 +56,696 @@ class TestFiles(unittest.TestCase):
         return output
 
 
+class TestFiles(ConverterTestCase):
+
+    def test_macro_constants(self):
+        filename = os.path.join(curdir, 'macros', 'macro_constants')
+        result = self.convert(filename + '.h', export_macros=True)
+        expected = self.read_expected(filename + '.pxd')
+        self.assertEqual(expected, result)
+
+    def test_parse_workers(self):
+        filename = os.path.join(curdir, 'macros', 'macro_constants')
+        result = self.convert(filename + '.h', export_macros=True,
+                              parse_workers=2, parse_timeout=60)
+        expected = self.read_expected(filename + '.pxd')
+        self.assertEqual(expected, result)
+
+    def parse_failing(self, preprocessor, **limits):
+        # the first job fails in the worker, the restarted worker
+        # parses the second one
+        from cwrap.frontends.clang import worker_pool
+        path = os.path.join(curdir, 'macros', 'macro_constants.h')
+        jobs = [(path, [], '', True, preprocessor, None, None),
+                (path, [], '', True, None, None, None)]
+        with worker_pool.ParserPool(1, **limits) as pool:
+            failed, parsed = pool.parse(jobs)
+            self.assertEqual(pool.restarts, 1)
+        self.assertTrue(failed.failed)
+        self.assertFalse(parsed.failed)
+        self.assertIn('ANSWER', [value.name for item in parsed.items
+                                 for value in getattr(item, 'values', [])])
+        return failed.error
+
+    def test_parse_worker_timeout(self):
+        error = self.parse_failing(['sh', '-c', 'sleep 30', 'sh'], timeout=1)
+        self.assertIn('timed out', error)
+
+    def test_parse_worker_crash(self):
+        error = self.parse_failing(['sh', '-c', 'kill -9 $PPID', 'sh'])
+        self.assertIn('worker died', error)
+
+    def test_parse_worker_idle_death(self):
+        # a worker that died between two jobs is replaced before the
+        # next job is handed out
+        import signal
+        from cwrap.frontends.clang import worker_pool
+        path = os.path.join(curdir, 'macros', 'macro_constants.h')
+        job = (path, [], '', True, None, None, None)
+        with worker_pool.ParserPool(1, timeout=60) as pool:
+            first, = pool.parse([job])
+            worker = pool.workers[0]
+            os.kill(worker.process.pid, signal.SIGKILL)
+            worker.process.join()
+            second, = pool.parse([job])
+            self.assertEqual(pool.restarts, 1)
+        self.assertFalse(first.failed)
+        self.assertFalse(second.failed)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/status'), 'needs /proc')
+    def test_parse_worker_memory_limit(self):
+        # the worker is forked from this process, it may map 256 MB more
+        # than this process does, the preprocessor writes 1 GB
+        with open('/proc/self/status') as f:
+            vm_size = [int(line.split()[1]) * 1024 for line in f
+                       if line.startswith('VmSize:')][0]
+        error = self.parse_failing(
+            ['sh', '-c', 'head -c 1000000000 /dev/zero', 'sh'],
+            memory_limit=vm_size + 256 * 1024**2)
+        self.assertIn('memory limit exceeded', error)
+
+    def test_lazy_namespaces(self):
+        # only the declarations of lazy_detail.hpp that are referenced
+        # from lazy_namespaces.hpp are converted
+        filename = os.path.join(curdir, 'lazy', 'lazy_namespaces')
+        result = self.convert(filename + '.hpp', language='c++')
+        expected = self.read_expected(filename + '.pxd')
+        self.assertEqual(expected, result)
+
+    def test_numpy_dtypes(self):
+        filename = os.path.join(curdir, 'layout', 'layout')
+        expected = self.read_expected(filename + '_dtypes.py')
+        save_dir = tempfile.mkdtemp()
+        try:
+            self.convert(filename + '.h', numpy_dtypes=True,
+                         save_dir=save_dir)
+            module_path = os.path.join(save_dir, 'layout_dtypes.py')
+            result = self.read_expected(module_path)
+            self.assertEqual(expected, result)
+            if numpy is not None:
+                namespace = {}
+                execfile(module_path, namespace)
+                shape = namespace['shape_t']
+                self.assertEqual(96, shape.itemsize)
+                self.assertEqual(48, shape.fields['color'][1])
+                self.assertEqual((2, 3), shape.fields['grid'][0].shape)
+                self.assertEqual(8, namespace['value'].itemsize)
+        finally:
+            shutil.rmtree(save_dir)
+
+    def test_numpy_dtypes_selection(self):
+        save_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(save_dir, 'inc.h'), 'w') as f:
+                f.write('struct other { int a; };\n'
+                        'struct part { int b; };\n')
+            header = os.path.join(save_dir, 'sel.h')
+            with open(header, 'w') as f:
+                f.write('#include "inc.h"\n'
+                        'enum neg { MINUS = -1 };\n'
+                        'enum pos { ZERO, ONE };\n'
+                        'struct lambda { struct part p; enum neg n; '
+                        'enum pos u; };\n'
+                        'typedef struct lambda print;\n')
+            self.convert(header, numpy_dtypes=True, save_dir=save_dir)
+            with open(os.path.join(save_dir, 'sel_dtypes.py')) as f:
+                source = f.read()
+            # records of included files only where the header needs them
+            self.assertNotIn('other', source)
+            self.assertIn('part = numpy.dtype', source)
+            self.assertIn('lambda_ = numpy.dtype', source)
+            self.assertIn('print_ = lambda_', source)
+            self.assertIn("'formats': [part, 'i4', 'u4']", source)
+            compile(source, 'sel_dtypes.py', 'exec')
+        finally:
+            shutil.rmtree(save_dir)
+
+    @unittest.skipUnless(find_executable('cpp'), 'needs a preprocessor')
+    def test_preprocess_cache(self):
+        filename = os.path.join(curdir, 'macros', 'macro_constants')
+        expected = self.read_expected(filename + '.pxd')
+        cache_dir = tempfile.mkdtemp()
+        try:
+            # the first run fills the cache, the second one reads it.
+            # cpp finds the system stddef.h even where libclang doesn't,
+            # tree shaking leaves the declarations of the header itself
+            for i in range(2):
+                result = self.convert(filename + '.h', export_macros=True,
+                                      preprocessor='cpp',
+                                      preprocess_cache=cache_dir,
+                                      tree_shaking=True)
+                self.assertEqual(expected, result)
+                self.assertTrue(os.listdir(cache_dir))
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+    def test_tree_shaking(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmpdir, 'inc.h'), 'w') as f:
+                f.write('struct used { int a; };\n'
+                        'typedef struct used used_t;\n'
+                        'struct unused { int b; };\n'
+                        'int unused_func(struct unused *u);\n')
+            header = os.path.join(tmpdir, 'main.h')
+            with open(header, 'w') as f:
+                f.write('#include "inc.h"\n'
+                        'int f(used_t *u);\n'
+                        'int g(int x);\n')
+
+            result = '\n'.join(self.convert(header, tree_shaking=True))
+            self.assertIn('f(used_t', result)
+            self.assertIn('used_t', result)
+            self.assertIn('struct used', result)
+            self.assertNotIn('unused', result)
+
+            # only what the named declarations need is kept
+            result = '\n'.join(self.convert(header, tree_shaking=True,
+                                             shake_roots=['g']))
+            self.assertIn('g(int', result)
+            self.assertNotIn('used', result)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_declaration_order(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            header = os.path.join(tmpdir, 'cycle.h')
+            with open(header, 'w') as f:
+                f.write('struct list;\n'
+                        'typedef struct list list_t;\n'
+                        'struct node { list_t *owner; struct node *next; };\n'
+                        'struct list { struct node head; int len; };\n')
+            result = self.convert(header)
+            # the declaration of list in the header is its forward
+            # declaration, node has to be defined before list uses it
+            # by value
+            self.assertEqual(result[1:4], ['cdef struct list',
+                                           'ctypedef list list_t',
+                                           'cdef struct node:'])
+            self.assertTrue(result.index('cdef struct node:') <
+                            result.index('cdef struct list:'))
+            self.assertEqual(result.count('cdef struct list'), 1)
+            self.assertNotIn('pass', result)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_render_cache(self):
+        from cwrap.backend import render_cache
+        tmpdir = tempfile.mkdtemp()
+        try:
+            header = os.path.join(tmpdir, 'cached.h')
+            cache_dir = os.path.join(tmpdir, 'render')
+
+            def render(arguments, **metadata):
+                with open(header, 'w') as f:
+                    f.write('struct point { int x; int y; };\n'
+                            'typedef struct point point_t;\n'
+                            'enum color { RED, GREEN };\n'
+                            'int move(%s);\n'
+                            'double norm(point_t *p);\n' % arguments)
+                config = Config('clang', files=[File(header)], **metadata)
+                return [renderer.ASTRenderer().render(ast.module)
+                        for ast in self.frontend.generate_asts(config)]
+
+            full = render('point_t *p, int dx')
+            # the cold and the warm cache give the code of a full run
+            cold = render('point_t *p, int dx', render_cache=cache_dir)
+            self.assertEqual(cold, full)
+            cache = render_cache.RenderCache(cache_dir)
+            self.assertEqual(len(cache.entries), 5)
+            warm = render('point_t *p, int dx', render_cache=cache_dir)
+            self.assertEqual(warm, full)
+
+            # after a change the verified cache gives the new code
+            changed = render('point_t *p, int dx, int dy')
+            self.assertNotEqual(changed, full)
+            verified = render('point_t *p, int dx, int dy',
+                              render_cache=cache_dir, verify_render_cache=True)
+            self.assertEqual(verified, changed)
+            cache = render_cache.RenderCache(cache_dir)
+            self.assertEqual(len(cache.entries), 5)
+            self.assertIn('dy', ''.join(cache.entries.values()))
+
+            # a stale entry is spliced in, and caught by verification
+            key = [key for key, code in cache.entries.iteritems()
+                   if 'norm' in code][0]
+            cache.entries[key] = '    stale\n'
+            cache.used = cache.entries
+            cache.save()
+            code, = render('point_t *p, int dx, int dy',
+                           render_cache=cache_dir)
+            self.assertIn('    stale\n', code)
+            self.assertNotIn('norm', code)
+            self.assertRaises(render_cache.RenderCacheError, render,
+                              'point_t *p, int dx, int dy',
+                              render_cache=cache_dir, verify_render_cache=True)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+    def test_share_declarations(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmpdir, 'common.h'), 'w') as f:
+                f.write('struct point { int x; int y; };\n'
+                        'typedef struct point point_t;\n')
+            headers = []
+            for name in ('a', 'b'):
+                header = os.path.join(tmpdir, name + '.h')
+                with open(header, 'w') as f:
+                    f.write('#include "common.h"\n'
+                            'int %s_move(point_t *p);\n' % name)
+                headers.append(header)
+
+            files = [File(header) for header in headers]
+            config = Config('clang', files=files, share_declarations=True)
+            ast_renderer = renderer.ASTRenderer()
+            code = [ast_renderer.render(container.module)
+                    for container in self.frontend.generate_asts(config)]
+            # the first module emits the shared declarations, the
+            # second one cimports them
+            self.assertIn('cdef struct point:', code[0])
+            self.assertIn('a_move', code[0])
+            self.assertNotIn('cdef struct point:', code[1])
+            self.assertNotIn('ctypedef point point_t', code[1])
+            self.assertIn('from _a cimport point, point_t', code[1])
+            self.assertIn('b_move', code[1])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+@unittest.skipUnless(find_executable('castxml'), 'needs castxml')
+class TestCastXML(ConverterTestCase):
+
+    frontend_name = 'castxml'
+
+    def test_castxml_error(self):
+        filename = os.path.join(curdir, 'data', 'const_argument.h')
+        self.assertRaises(self.frontend.CastXMLError, self.convert, filename)
+
+    def test_castxml_pool_order(self):
+        # headers parsed in parallel come back in the order given
+        names = castxml_testfiles + ['const_argument']
+        paths = [os.path.join(curdir, 'data', name + '.h') for name in names]
+        jobs = [self.frontend.castxml_job(path, []) for path in paths[:-1]]
+        all_items = self.frontend.parse_headers(jobs, 3)
+        self.assertEqual(len(all_items), len(jobs))
+        for path, items in zip(paths, all_items):
+            files = [item.location[0] for item in items
+                     if item.location is not None]
+            self.assertIn(path, files)
+
+        # the failing header is reported, not the ones around it
+        jobs = [self.frontend.castxml_job(path, []) for path in paths]
+        try:
+            self.frontend.parse_headers(jobs, 3)
+        except self.frontend.CastXMLError, e:
+            self.assertIn('const_argument.h', str(e))
+        else:
+            self.fail('CastXMLError not raised')
+
+    def test_castxml_xml_cache(self):
+        from cwrap.cache import Cache
+        from cwrap.frontends.gccxml import c_ast, xml_cache
+        tmpdir = tempfile.mkdtemp()
+        try:
+            inc = os.path.join(tmpdir, 'inc.h')
+            header = os.path.join(tmpdir, 'main.h')
+            with open(inc, 'w') as f:
+                f.write('typedef int inc_t;\n')
+            with open(header, 'w') as f:
+                f.write('#include "inc.h"\nstruct s { inc_t a; };\n')
+            cache = Cache(os.path.join(tmpdir, 'cache'), xml_cache.SUFFIX)
+
+            def parse():
+                job = self.frontend.castxml_job(header, [])
+                items = self.frontend.parse_headers([job], 1, cache)[0]
+                return dict((item.name, item.typ.name) for item in items
+                            if isinstance(item, c_ast.Typedef))
+
+            first = parse()
+            self.assertEqual((cache.stats.hits, cache.stats.stores), (0, 1))
+            self.assertEqual(parse(), first)
+            self.assertEqual(cache.stats.hits, 1)
+
+            # a change to an included file is a miss
+            with open(inc, 'w') as f:
+                f.write('typedef long inc_t;\n')
+            self.assertEqual(parse()['inc_t'], 'long int')
+            self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 2))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_castxml_pruning(self):
+        from cwrap.frontends.gccxml import c_ast
+        tmpdir = tempfile.mkdtemp()
+        try:
+            inc = os.path.join(tmpdir, 'inc.h')
+            header = os.path.join(tmpdir, 'main.h')
+            with open(inc, 'w') as f:
+                f.write('struct used { int a; };\n'
+                        'typedef struct used used_t;\n'
+                        'struct unused { int b; };\n'
+                        'int unused_func(struct unused *u);\n')
+            with open(header, 'w') as f:
+                f.write('#include "inc.h"\nint f(used_t *u);\n')
+
+            # only the header and what it refers to are kept
+            job = self.frontend.castxml_job(header, [])
+            items = self.frontend.parse_headers([job], 1)[0]
+            names = set(item.name for item in items)
+            self.assertIn('f', names)
+            self.assertIn('used_t', names)
+            self.assertIn('used', names)
+            self.assertNotIn('unused', names)
+            self.assertNotIn('unused_func', names)
+            # the include closure is still known
+            files = [item.name for item in items
+                     if isinstance(item, c_ast.File)]
+            self.assertIn(inc, files)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_castxml_spill_nodes(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            header = os.path.join(tmpdir, 'spill.h')
+            with open(header, 'w') as f:
+                for i in range(20):
+                    f.write('struct s%d { int a; struct s%d *next; };\n'
+                            'typedef struct s%d s%d_t;\n'
+                            'int f%d(s%d_t *s);\n' % ((i,) * 6))
+
+            # the nodes are written to disk every few elements, the
+            # result is the same as with all of them in memory
+            jobs = [self.frontend.castxml_job(header, []),
+                    self.frontend.castxml_job(header, [], spill_nodes=5)]
+            in_memory, spilled = self.frontend.parse_headers(jobs, 1)
+            self.assertEqual([(type(item), item.name) for item in in_memory],
+                             [(type(item), item.name) for item in spilled])
+            self.assertEqual([item.location for item in in_memory],
+                             [item.location for item in spilled])
+            # and the spilled nodes are removed
+            stores = [name for name in os.listdir(tempfile.gettempdir())
+                      if name.startswith('cwrap-nodes-')]
+            self.assertEqual(stores, [])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_castxml_spill_nodes_cleanup(self):
+        from cwrap.frontends.gccxml import process_pool
+
+        class FailingCache(object):
+            def lookup(self, key):
+                return None
+
+            def store(self, key, depends, data):
+                raise RuntimeError('cache is broken')
+
+        def stores():
+            return [name for name in os.listdir(tempfile.gettempdir())
+                    if name.startswith('cwrap-nodes-')]
+
+        header = os.path.join(curdir, 'data', 'struct_separate_typedef.h')
+        failing = os.path.join(curdir, 'data', 'const_argument.h')
+        # a compiler that can't be started and one that fails
+        jobs = [process_pool.XMLJob(header, ['/nonexistent/castxml'],
+                                    spill_nodes=5),
+                self.frontend.castxml_job(failing, [], spill_nodes=5)]
+        results = process_pool.ProcessPool(2).parse(jobs)
+        self.assertTrue(all(result.failed for result in results))
+        self.assertEqual(stores(), [])
+
+        # the jobs that still run when the pool gives up are killed
+        jobs = [self.frontend.castxml_job(header, [], spill_nodes=5),
+                process_pool.XMLJob(header, ['sh', '-c', 'sleep 30'],
+                                    spill_nodes=5)]
+        pool = process_pool.ProcessPool(2, FailingCache())
+        self.assertRaises(RuntimeError, pool.parse, jobs)
+        self.assertEqual(stores(), [])
+
+    def test_castxml_declaration_order(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            header = os.path.join(tmpdir, 'cycle.h')
+            with open(header, 'w') as f:
+                f.write('struct list;\n'
+                        'typedef struct list list_t;\n'
+                        'struct node { list_t *owner; struct node *next; };\n'
+                        'struct list { struct node head; int len; };\n')
+            result = self.convert(header)
+            # the cycle through list_t needs a forward declaration of
+            # list, node has to be defined before list uses it by value
+            self.assertEqual(result[1:4], ['cdef struct list',
+                                           'ctypedef list list_t',
+                                           'cdef struct node:'])
+            self.assertTrue(result.index('cdef struct node:') <
+                            result.index('cdef struct list:'))
+            self.assertEqual(result.count('cdef struct list'), 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_castxml_parse_paths(self):
+        import subprocess
+        from cwrap.frontends.gccxml import gccxml_parser
+        filename = os.path.join(curdir, 'data', 'struct_with_functionpointer.h')
+        tmpdir = tempfile.mkdtemp()
+        try:
+            xml = os.path.join(tmpdir, 'out.xml')
+            subprocess.check_call(['castxml', '--castxml-gccxml', '-o', xml,
+                                   filename])
+            # a file and the same xml fed in small chunks give the same
+            # items
+            parsed = gccxml_parser.parse(xml)
+            parser = gccxml_parser.GCCXMLParser()
+            with open(xml, 'rb') as f:
+                for chunk in iter(lambda: f.read(7), ''):
+                    parser.feed(chunk)
+            parser.close()
+            fed = parser.get_result()
+            self.assertEqual([(type(item), item.name, item.location)
+                              for item in parsed],
+                             [(type(item), item.name, item.location)
+                              for item in fed])
+        finally:
+            shutil.rmtree(tmpdir)
+
+        # only the character data of CPP_DUMP elements is collected
+        parser = gccxml_parser.GCCXMLParser()
+        parser.feed('<GCC_XML cvs_revision="1.1"> ignored\n'
+                    '<CPP_DUMP name="functions">a &amp; b</CPP_DUMP>\n')
+        parser.feed('<CPP_DUMP name="aliases">c</CPP_DUMP> </GCC_XML>')
+        parser.close()
+        self.assertEqual(parser.cpp_data, {'functions': ['a & b'],
+                                           'aliases': ['c']})
+
+    def test_castxml_render_cache(self):
+        from cwrap.backend import render_cache
+        tmpdir = tempfile.mkdtemp()
+        try:
+            header = os.path.join(tmpdir, 'cached.h')
+            cache_dir = os.path.join(tmpdir, 'render')
+
+            def render(signature, **metadata):
+                with open(header, 'w') as f:
+                    f.write('struct point { int x; int y; };\n'
+                            'typedef struct point point_t;\n'
+                            'enum color { RED, GREEN };\n'
+                            '%s;\n'
+                            'double norm(point_t *p);\n' % signature)
+                config = Config(self.frontend_name, files=[File(header)],
+                                **metadata)
+                asts = self.frontend.generate_asts(config)
+                return [renderer.ASTRenderer().render(ast.module)
+                        for ast in asts]
+
+            full = render('int move(point_t *p, int dx)')
+            # a cold and a warm cache give the code of a full run
+            for i in range(2):
+                self.assertEqual(render('int move(point_t *p, int dx)',
+                                        render_cache=cache_dir), full)
+            cache = render_cache.RenderCache(cache_dir)
+            self.assertEqual(len(cache.entries), 5)
+
+            # only the changed declaration is rendered again
+            changed = render('int move(point_t *p, int dx, int dy)')
+            self.assertNotEqual(changed, full)
+            self.assertEqual(render('int move(point_t *p, int dx, int dy)',
+                                    render_cache=cache_dir,
+                                    verify_render_cache=True), changed)
+            cache = render_cache.RenderCache(cache_dir)
+            self.assertEqual(len(cache.entries), 5)
+
+            # verification catches cached code that went stale
+            for key in cache.entries:
+                cache.entries[key] = '    stale\n'
+            cache.used = cache.entries
+            cache.save()
+            code, = render('int move(point_t *p, int dx, int dy)',
+                           render_cache=cache_dir)
+            self.assertTrue(code.endswith('\n\n' + '    stale\n' * 5 + '\n'))
+            self.assertRaises(render_cache.RenderCacheError, render,
+                              'int move(point_t *p, int dx, int dy)',
+                              render_cache=cache_dir,
+                              verify_render_cache=True)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestUnsavedFiles(unittest.TestCase):
+
+    def test_unsaved_files_array(self):
+        import mmap
+        from cwrap.frontends.clang.clang import cindex
+        with tempfile.TemporaryFile() as f:
+            f.write('/* skipped */int y;')
+            f.flush()
+            f.seek(len('/* skipped */'))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            unsaved, keepalive = cindex._unsaved_files_array([
+                ('a.h', 'int x;'),
+                ('b.h', u'int \xe9;'),
+                ('c.h', mapped),
+                ('d.h', f),
+                ('e.h', bytearray())])
+            contents = [(entry.contents, entry.length) for entry in unsaved]
+            mapped.close()
+        self.assertEqual(contents, [('int x;', 6),
+                                    ('int \xc3\xa9;', 7),
+                                    ('/* skipped */int y;', 19),
+                                    ('int y;', 6),
+                                    ('', 0)])
+        self.assertEqual(len(keepalive), 3)
+
+
+class TestFlatten(unittest.TestCase):
+
+    def check_deep_nesting(self, c_ast, transforms, make_container):
+        # a union in a struct in a union ..., far deeper than the
+        # recursion limit
+        depth = 5000
+        top = container = make_container(c_ast.Struct, 'top', None)
+        for i in range(depth):
+            cls = c_ast.Union if i % 2 == 0 else c_ast.Struct
+            nested = make_container(cls, 'n', container)
+            container.members.append(nested)
+            container.members.append(c_ast.Field('f', nested, container,
+                                                 None, 0))
+            container = nested
+
+        items = transforms.flatten_nested_containers([top])
+        names = [item.name for item in items]
+        self.assertEqual(len(items), 2 * depth + 1)
+        self.assertEqual(len(set(names)), len(names))
+        self.assertTrue(max(len(name) for name in names) < 100)
+        # short names are mangled as before
+        self.assertEqual(names[-3:], ['__top_n', '__top_n_t', 'top'])
+        self.assertEqual(top.members[0].typ.name, '__top_n_t')
+
+    def test_flatten_gccxml(self):
+        from cwrap.frontends.gccxml import c_ast, ast_transforms
+        def make_container(cls, name, context):
+            return cls(name, 32, [], context, [], 32)
+        self.check_deep_nesting(c_ast, ast_transforms, make_container)
+
+    def test_flatten_clang(self):
+        from cwrap.frontends.clang import c_ast, ast_transforms
+        def make_container(cls, name, context):
+            return cls(name, members=[], context=context)
+        self.check_deep_nesting(c_ast, ast_transforms, make_container)
+
+
+class TestHashing(unittest.TestCase):
+
+    def test_hashing_gccxml(self):
+        from cwrap import hashing
+        from cwrap.frontends.gccxml import ast_transforms, c_ast
+        int_t = c_ast.FundamentalType('int', 32, 32)
+        structs = []
+        for field_name, location in (('a', ('a.h', 1)), ('a', ('b.h', 7)),
+                                     ('b', ('a.h', 2))):
+            struct = c_ast.Struct('', 32, [], None, [], 64)
+            callback = c_ast.FunctionType(int_t, None)
+            pointer = c_ast.PointerType(callback, 64, 64)
+            struct.members.append(c_ast.Field(field_name, int_t, struct,
+                                              None, 0))
+            struct.members.append(c_ast.Field('cb', pointer, struct,
+                                              None, 32))
+            struct.location = location
+            structs.append(struct)
+        first, second, third = structs
+
+        # identical anonymous structs hash the same, wherever they are
+        self.assertEqual(hashing.structural_hash(first),
+                         hashing.structural_hash(second))
+        self.assertNotEqual(hashing.structural_hash(first),
+                            hashing.structural_hash(third))
+
+        # structs refer to themselves by name
+        node = c_ast.Struct('node', 32, [], None, [], 64)
+        pointer = c_ast.PointerType(node, 64, 64)
+        node.members.append(c_ast.Field('next', pointer, node, None, 0))
+        self.assertEqual(len(hashing.structural_hash(node)), 40)
+
+        # the transformations share one instance of identical types
+        self.assertIsNot(first.members[1].typ, second.members[1].typ)
+        items = ast_transforms.apply_c_ast_transformations(
+            [c_ast.Namespace('::', structs)])
+        self.assertEqual(len(items), 3)
+        self.assertIs(first.members[1].typ, second.members[1].typ)
+        self.assertIs(first.members[1].typ, third.members[1].typ)
+
+    def test_hashing_clang(self):
+        from cwrap import hashing
+        from cwrap.frontends.clang import ast_transforms, c_ast
+        int_t = c_ast.CvQualifiedType.intern(
+            c_ast.FundamentalType.intern('int'), False, False)
+        structs = []
+        for field_name, location in (('a', ('a.h', 1)), ('a', ('b.h', 7)),
+                                     ('b', ('a.h', 2))):
+            struct = c_ast.Struct('', [], None)
+            callback = c_ast.FunctionType(int_t, None)
+            pointer = c_ast.PointerType(callback, 64, 64)
+            struct.members.append(c_ast.Field(field_name, int_t, struct,
+                                              None, 0))
+            struct.members.append(c_ast.Field('cb', pointer, struct,
+                                              None, 32))
+            struct.location = location
+            structs.append(struct)
+        first, second, third = structs
+
+        # identical anonymous structs hash the same, wherever they are
+        self.assertEqual(hashing.structural_hash(first),
+                         hashing.structural_hash(second))
+        self.assertNotEqual(hashing.structural_hash(first),
+                            hashing.structural_hash(third))
+
+        # structs refer to themselves by name
+        node = c_ast.Struct('node', [], None)
+        pointer = c_ast.PointerType(node, 64, 64)
+        node.members.append(c_ast.Field('next', pointer, node, None, 0))
+        self.assertEqual(len(hashing.structural_hash(node)), 40)
+
+        # the transformations share one instance of identical types
+        self.assertIsNot(first.members[1].typ, second.members[1].typ)
+        items = ast_transforms.apply_c_ast_transformations(
+            [c_ast.File('a.h', structs)])
+        self.assertEqual(len(items), 3)
+        self.assertIs(first.members[1].typ, second.members[1].typ)
+        self.assertIs(first.members[1].typ, third.members[1].typ)
+
+
+# headers of test/data for which the gccxml transformations give the
+# same output as the clang frontend
+castxml_testfiles = ['char_fixed_size', 'functionpointer_in_struct',
+                     'struct_different_tag_and_typedef',
+                     'struct_separate_typedef',
+                     'struct_separate_typedef_with_pointer',
+                     'struct_with_functionpointer']
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -61,3 +761,7 @@ for testfile in testfiles:
     test_method = create_test(testfile)
     test_method.__name__ = 'test_' + os.path.basename(testfile)
     setattr(TestFiles, test_method.__name__, test_method)
+for testfile in castxml_testfiles:
+    test_method = create_test(os.path.join(curdir, 'data', testfile))
+    test_method.__name__ = 'test_' + testfile
+    setattr(TestCastXML, test_method.__name__, test_method)